@@ -2,13 +2,13 @@ import datetime
 import math
 from typing import List, Optional, Tuple
 from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 import httpx
 
 from . import models, database
-
-# Create all database tables
-models.Base.metadata.create_all(bind=database.engine)
+from .geo import within_radius
 
 app = FastAPI(
     title="Safe Route API",
@@ -16,6 +16,10 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Schema is managed by safe-route-app/migrations.py, not created on startup. The
+# tables used here (users, friendships, panic_alerts, notifications) have no
+# migration yet: add one alongside the models module this file imports.
+
 # CORS configuration remains the same
 
 # --- Pydantic Models ---
@@ -28,22 +32,29 @@ class RouteRequest(BaseModel):
     # ... (existing RouteRequest model)
 
 # --- Helper Functions ---
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in kilometers."""
-    R = 6371  # Radius of Earth in kilometers
-    dLat = math.radians(lat2 - lat1)
-    dLon = math.radians(lon2 - lon1)
-    a = math.sin(dLat / 2) * math.sin(dLat / 2) + \
-        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
-        math.sin(dLon / 2) * math.sin(dLon / 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+def friends_within_radius(friends, lat, lon, radius_km):
+    """Return the friends whose last known position is within radius_km."""
+    located = [f for f in friends if f.last_known_lat and f.last_known_lon]
+    if not located:
+        return []
+    idx, _ = within_radius(
+        lat, lon,
+        [f.last_known_lat for f in located],
+        [f.last_known_lon for f in located],
+        radius_km,
+    )
+    return [located[i] for i in idx]
 
 # --- New Endpoints for Panic Mode ---
 
 @app.post("/panic")
-async def trigger_panic_mode(request: PanicRequest, db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.id == request.user_id).first()
+async def trigger_panic_mode(request: PanicRequest, db: AsyncSession = Depends(database.get_db)):
+    # Async sessions cannot lazy-load, so fetch friends and friends of friends up front
+    user = (await db.execute(
+        select(models.User)
+        .options(selectinload(models.User.friends).selectinload(models.User.friends))
+        .where(models.User.id == request.user_id)
+    )).scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -54,17 +65,12 @@ async def trigger_panic_mode(request: PanicRequest, db: Session = Depends(databa
         longitude=request.lon
     )
     db.add(new_alert)
-    db.commit()
+    await db.commit()
 
     # Find nearby friends (1st degree)
-    nearby_friends = []
     alert_radius_km = 5.0 # Notify friends within 5km
 
-    for friend in user.friends:
-        if friend.last_known_lat and friend.last_known_lon:
-            distance = haversine_distance(request.lat, request.lon, friend.last_known_lat, friend.last_known_lon)
-            if distance <= alert_radius_km:
-                nearby_friends.append(friend)
+    nearby_friends = friends_within_radius(user.friends, request.lat, request.lon, alert_radius_km)
 
     # If friends are nearby, notify them
     notified_users = set()
@@ -77,33 +83,33 @@ async def trigger_panic_mode(request: PanicRequest, db: Session = Depends(databa
     else:
         # If no friends nearby, check friends of friends (2nd degree)
         for friend in user.friends:
-            for friend_of_friend in friend.friends:
-                # Avoid notifying the original user or already notified users
-                if friend_of_friend.id == user.id or friend_of_friend.id in notified_users:
-                    continue
-                
-                if friend_of_friend.last_known_lat and friend_of_friend.last_known_lon:
-                    distance = haversine_distance(request.lat, request.lon, friend_of_friend.last_known_lat, friend_of_friend.last_known_lon)
-                    if distance <= alert_radius_km:
-                        message = f"PANIC ALERT: {user.username} (friend of {friend.username}) is in distress near you!"
-                        notification = models.Notification(user_id=friend_of_friend.id, message=message)
-                        db.add(notification)
-                        notified_users.add(friend_of_friend.id)
-
-    db.commit()
+            # Avoid notifying the original user or already notified users
+            candidates = [
+                fof for fof in friend.friends
+                if fof.id != user.id and fof.id not in notified_users
+            ]
+            for friend_of_friend in friends_within_radius(candidates, request.lat, request.lon, alert_radius_km):
+                message = f"PANIC ALERT: {user.username} (friend of {friend.username}) is in distress near you!"
+                notification = models.Notification(user_id=friend_of_friend.id, message=message)
+                db.add(notification)
+                notified_users.add(friend_of_friend.id)
+
+    await db.commit()
     return {"message": "Panic alert sent!", "notified_count": len(notified_users)}
 
 @app.get("/notifications/{user_id}")
-async def get_notifications(user_id: int, db: Session = Depends(database.get_db)):
-    notifications = db.query(models.Notification).filter(
-        models.Notification.user_id == user_id,
-        models.Notification.is_read == False
-    ).order_by(models.Notification.timestamp.desc()).all()
+async def get_notifications(user_id: int, db: AsyncSession = Depends(database.get_db)):
+    notifications = (await db.execute(
+        select(models.Notification).where(
+            models.Notification.user_id == user_id,
+            models.Notification.is_read == False
+        ).order_by(models.Notification.timestamp.desc())
+    )).scalars().all()
     
     # Mark them as read after fetching
     for notif in notifications:
         notif.is_read = True
-    db.commit()
+    await db.commit()
     
     return [{"id": n.id, "message": n.message, "time": n.timestamp.isoformat()} for n in notifications]
 
@@ -1,16 +1,42 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, HTTPException, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import datetime
+from operator import attrgetter
 from models import *
+import case_status
+import change_feed
+import crime_stats
 from database import get_db
+from serialization import FastJSONResponse
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_select, split_page
 
-app = FastAPI(title="My Safety Admin API", version="1.0.0")
+app = FastAPI(title="My Safety Admin API", version="1.0.0", default_response_class=FastJSONResponse)
+
+async def fetch_page(db, stmt, timestamp_column, id_column, cursor, limit):
+    """Run a keyset-paginated select and return the page with its next cursor"""
+    try:
+        stmt = keyset_select(stmt, timestamp_column, id_column, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(stmt)).scalars().all()
+    items, next_cursor = split_page(rows, limit, attrgetter(timestamp_column.key, id_column.key))
+    return {"items": items, "next_cursor": next_cursor}
+
+def date_range(column, date_from, date_to):
+    """Inclusive-start, exclusive-end range conditions on column"""
+    conditions = []
+    if date_from:
+        conditions.append(column >= date_from)
+    if date_to:
+        conditions.append(column < date_to)
+    return conditions
 
 # ==================== CRIME MANAGEMENT ====================
 
 @app.post("/api/crimes")
-async def create_crime(crime_data: dict, db: Session = Depends(get_db)):
+async def create_crime(crime_data: dict, db: AsyncSession = Depends(get_db)):
     """Create a new crime with all related information"""
     try:
         # Create location first
@@ -23,7 +49,7 @@ async def create_crime(crime_data: dict, db: Session = Depends(get_db)):
             created_at=datetime.datetime.utcnow()
         )
         db.add(location)
-        db.flush()  # Get the location_id
+        await db.flush()  # Get the location_id
         
         # Create crime
         crime = Crime(
@@ -35,7 +61,7 @@ async def create_crime(crime_data: dict, db: Session = Depends(get_db)):
             created_at=datetime.datetime.utcnow()
         )
         db.add(crime)
-        db.flush()  # Get the crime_id
+        await db.flush()  # Get the crime_id
         
         # Create victim if provided
         if crime_data.get("victim", {}).get("full_name"):
@@ -50,7 +76,7 @@ async def create_crime(crime_data: dict, db: Session = Depends(get_db)):
                 created_at=datetime.datetime.utcnow()
             )
             db.add(victim)
-            db.flush()
+            await db.flush()
             
             # Create crime-victim relationship
             crime_victim = CrimeVictim(
@@ -73,7 +99,7 @@ async def create_crime(crime_data: dict, db: Session = Depends(get_db)):
                 created_at=datetime.datetime.utcnow()
             )
             db.add(criminal)
-            db.flush()
+            await db.flush()
             
             # Create crime-criminal relationship
             crime_criminal = CrimeCriminal(
@@ -93,7 +119,7 @@ async def create_crime(crime_data: dict, db: Session = Depends(get_db)):
                 created_at=datetime.datetime.utcnow()
             )
             db.add(weapon)
-            db.flush()
+            await db.flush()
             
             # Create crime-weapon relationship
             crime_weapon = CrimeWeapon(
@@ -111,7 +137,7 @@ async def create_crime(crime_data: dict, db: Session = Depends(get_db)):
                 protection_flag=crime_data["witness"].get("protection_flag", False)
             )
             db.add(witness)
-            db.flush()
+            await db.flush()
             
             # Create crime-witness relationship
             crime_witness = CrimeWitness(
@@ -121,23 +147,44 @@ async def create_crime(crime_data: dict, db: Session = Depends(get_db)):
             )
             db.add(crime_witness)
         
-        db.commit()
+        conn = await db.connection()
+        await change_feed.record_change(conn, "crime", crime.crime_id, "insert")
+        await crime_stats.apply_deltas(conn, [
+            ((crime.date_time, location.district_id, crime.crime_type, crime.status), 1)
+        ])
+        await db.commit()
         return {"message": "Crime created successfully", "crime_id": crime.crime_id}
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/crimes")
-async def get_crimes(db: Session = Depends(get_db)):
-    """Get all crimes with related information"""
-    crimes = db.query(Crime).all()
-    return crimes
+async def get_crimes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    district_id: Optional[int] = None,
+    crime_type: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime.datetime] = None,
+    date_to: Optional[datetime.datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get crimes newest first, one keyset page at a time"""
+    stmt = select(Crime)
+    if district_id is not None:
+        stmt = stmt.join(Location, Crime.location_id == Location.location_id).where(Location.district_id == district_id)
+    if crime_type:
+        stmt = stmt.where(Crime.crime_type == crime_type)
+    if status:
+        stmt = stmt.where(Crime.status == status)
+    stmt = stmt.where(*date_range(Crime.created_at, date_from, date_to))
+    return await fetch_page(db, stmt, Crime.created_at, Crime.crime_id, cursor, limit)
 
 @app.get("/api/crimes/{crime_id}")
-async def get_crime(crime_id: int, db: Session = Depends(get_db)):
+async def get_crime(crime_id: int, db: AsyncSession = Depends(get_db)):
     """Get a specific crime by ID"""
-    crime = db.query(Crime).filter(Crime.crime_id == crime_id).first()
+    crime = (await db.execute(select(Crime).where(Crime.crime_id == crime_id))).scalars().first()
     if not crime:
         raise HTTPException(status_code=404, detail="Crime not found")
     return crime
@@ -145,37 +192,49 @@ async def get_crime(crime_id: int, db: Session = Depends(get_db)):
 # ==================== COMPLAINT MANAGEMENT ====================
 
 @app.get("/api/complaints")
-async def get_complaints(db: Session = Depends(get_db)):
-    """Get all complaints"""
-    complaints = db.query(Complaint).all()
-    return complaints
+async def get_complaints(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime.datetime] = None,
+    date_to: Optional[datetime.datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get complaints newest first, one keyset page at a time"""
+    stmt = select(Complaint)
+    if status:
+        stmt = stmt.where(Complaint.status == status)
+    stmt = stmt.where(*date_range(Complaint.reported_at, date_from, date_to))
+    return await fetch_page(db, stmt, Complaint.reported_at, Complaint.complaint_id, cursor, limit)
 
 @app.post("/api/complaints/{complaint_id}/verify")
-async def verify_complaint(complaint_id: int, db: Session = Depends(get_db)):
+async def verify_complaint(complaint_id: int, db: AsyncSession = Depends(get_db)):
     """Verify a complaint"""
-    complaint = db.query(Complaint).filter(Complaint.complaint_id == complaint_id).first()
+    complaint = (await db.execute(select(Complaint).where(Complaint.complaint_id == complaint_id))).scalars().first()
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
     
     complaint.status = "verified"
-    db.commit()
+    await change_feed.record_change(await db.connection(), "complaint", complaint_id)
+    await db.commit()
     return {"message": "Complaint verified successfully"}
 
 @app.post("/api/complaints/{complaint_id}/reject")
-async def reject_complaint(complaint_id: int, db: Session = Depends(get_db)):
+async def reject_complaint(complaint_id: int, db: AsyncSession = Depends(get_db)):
     """Reject a complaint"""
-    complaint = db.query(Complaint).filter(Complaint.complaint_id == complaint_id).first()
+    complaint = (await db.execute(select(Complaint).where(Complaint.complaint_id == complaint_id))).scalars().first()
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
     
     complaint.status = "rejected"
-    db.commit()
+    await change_feed.record_change(await db.connection(), "complaint", complaint_id)
+    await db.commit()
     return {"message": "Complaint rejected successfully"}
 
 @app.post("/api/complaints/{complaint_id}/escalate")
-async def escalate_complaint_to_crime(complaint_id: int, crime_data: dict, db: Session = Depends(get_db)):
+async def escalate_complaint_to_crime(complaint_id: int, crime_data: dict, db: AsyncSession = Depends(get_db)):
     """Escalate a complaint to a crime report"""
-    complaint = db.query(Complaint).filter(Complaint.complaint_id == complaint_id).first()
+    complaint = (await db.execute(select(Complaint).where(Complaint.complaint_id == complaint_id))).scalars().first()
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
     
@@ -188,24 +247,39 @@ async def escalate_complaint_to_crime(complaint_id: int, crime_data: dict, db: S
         created_at=datetime.datetime.utcnow()
     )
     db.add(crime)
-    db.commit()
+    await db.flush()
     
     # Update complaint status
     complaint.status = "escalated"
-    db.commit()
+    conn = await db.connection()
+    await change_feed.record_change(conn, "crime", crime.crime_id, "insert")
+    await change_feed.record_change(conn, "complaint", complaint_id)
+    # No location yet, so it counts under district 0 like any crime without one
+    await crime_stats.apply_deltas(conn, [((crime.date_time, None, crime.crime_type, crime.status), 1)])
+    await db.commit()
     
     return {"message": "Complaint escalated to crime successfully", "crime_id": crime.crime_id}
 
 # ==================== CASE ASSIGNMENT MANAGEMENT ====================
 
 @app.get("/api/case-assignments")
-async def get_case_assignments(db: Session = Depends(get_db)):
-    """Get all case assignments"""
-    assignments = db.query(CaseAssignment).all()
-    return assignments
+async def get_case_assignments(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: Optional[int] = None,
+    date_from: Optional[datetime.datetime] = None,
+    date_to: Optional[datetime.datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get case assignments newest first, one keyset page at a time"""
+    stmt = select(CaseAssignment)
+    if user_id is not None:
+        stmt = stmt.where(CaseAssignment.user_id == user_id)
+    stmt = stmt.where(*date_range(CaseAssignment.assigned_at, date_from, date_to))
+    return await fetch_page(db, stmt, CaseAssignment.assigned_at, CaseAssignment.assignment_id, cursor, limit)
 
 @app.post("/api/case-assignments")
-async def create_case_assignment(assignment_data: dict, db: Session = Depends(get_db)):
+async def create_case_assignment(assignment_data: dict, db: AsyncSession = Depends(get_db)):
     """Create a new case assignment"""
     assignment = CaseAssignment(
         user_id=assignment_data["user_id"],
@@ -214,57 +288,63 @@ async def create_case_assignment(assignment_data: dict, db: Session = Depends(ge
         assigned_at=datetime.datetime.utcnow()
     )
     db.add(assignment)
-    db.commit()
+    await db.flush()
+    await change_feed.record_change(await db.connection(), "case_assignment", assignment.assignment_id, "insert")
+    await db.commit()
     return {"message": "Case assigned successfully", "assignment_id": assignment.assignment_id}
 
 @app.put("/api/case-assignments/{assignment_id}")
-async def update_case_assignment(assignment_id: int, assignment_data: dict, db: Session = Depends(get_db)):
+async def update_case_assignment(assignment_id: int, assignment_data: dict, db: AsyncSession = Depends(get_db)):
     """Update a case assignment"""
-    assignment = db.query(CaseAssignment).filter(CaseAssignment.assignment_id == assignment_id).first()
+    assignment = (await db.execute(select(CaseAssignment).where(CaseAssignment.assignment_id == assignment_id))).scalars().first()
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     assignment.duty_role = assignment_data.get("duty_role", assignment.duty_role)
     assignment.released_at = assignment_data.get("released_at")
-    db.commit()
+    await change_feed.record_change(await db.connection(), "case_assignment", assignment_id)
+    await db.commit()
     return {"message": "Assignment updated successfully"}
 
 # ==================== CASE STATUS HISTORY ====================
 
 @app.get("/api/crimes/{crime_id}/status-history")
-async def get_status_history(crime_id: int, db: Session = Depends(get_db)):
+async def get_status_history(crime_id: int, db: AsyncSession = Depends(get_db)):
     """Get status history for a crime"""
-    history = db.query(CaseStatusHistory).filter(CaseStatusHistory.crime_id == crime_id).all()
+    history = (await db.execute(select(CaseStatusHistory).where(CaseStatusHistory.crime_id == crime_id))).scalars().all()
     return history
 
 @app.post("/api/crimes/{crime_id}/status")
-async def update_crime_status(crime_id: int, status_data: dict, db: Session = Depends(get_db)):
-    """Update crime status and add to history"""
-    crime = db.query(Crime).filter(Crime.crime_id == crime_id).first()
-    if not crime:
-        raise HTTPException(status_code=404, detail="Crime not found")
-    
-    # Update crime status
-    old_status = crime.status
-    crime.status = status_data["new_status"]
-    
-    # Add to status history
-    status_history = CaseStatusHistory(
-        crime_id=crime_id,
-        status=status_data["new_status"],
-        notes=status_data.get("notes", ""),
-        changed_at=datetime.datetime.utcnow(),
-        changed_by=status_data["changed_by"]
+async def update_crime_status(crime_id: int, status_data: dict, db: AsyncSession = Depends(get_db)):
+    """Update crime status and add to history, with the same transition rules as the batch endpoint"""
+    conn = await db.connection()
+    result, = await case_status.apply_batch(
+        conn, [(crime_id, status_data["new_status"], status_data.get("notes", ""))],
+        status_data["changed_by"], datetime.datetime.utcnow()
     )
-    db.add(status_history)
-    db.commit()
+    if not result["success"]:
+        await db.rollback()
+        raise HTTPException(status_code=404 if result["error"] == "Crime not found" else 409, detail=result["error"])
+    await db.commit()
     
-    return {"message": f"Status updated from {old_status} to {status_data['new_status']}"}
+    return {"message": f"Status updated from {result['old_status']} to {result['new_status']}"}
+
+@app.post("/api/crimes/status/batch")
+async def update_crime_statuses(batch_data: dict, db: AsyncSession = Depends(get_db)):
+    """Apply many status changes in one transaction, with a result per item"""
+    updates = batch_data.get("updates") or []
+    if len(updates) > case_status.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {case_status.MAX_BATCH_SIZE} updates per batch")
+    items = [(u["crime_id"], u["new_status"], u.get("notes", "")) for u in updates]
+    conn = await db.connection()
+    results = await case_status.apply_batch(conn, items, batch_data["changed_by"], datetime.datetime.utcnow())
+    await db.commit()
+    return {"results": results}
 
 # ==================== EVIDENCE MANAGEMENT ====================
 
 @app.post("/api/crimes/{crime_id}/evidence")
-async def add_evidence(crime_id: int, evidence_data: dict, db: Session = Depends(get_db)):
+async def add_evidence(crime_id: int, evidence_data: dict, db: AsyncSession = Depends(get_db)):
     """Add evidence to a crime"""
     evidence = Evidence(
         crime_id=crime_id,
@@ -275,19 +355,19 @@ async def add_evidence(crime_id: int, evidence_data: dict, db: Session = Depends
         collected_by=evidence_data["collected_by"]
     )
     db.add(evidence)
-    db.commit()
+    await db.commit()
     return {"message": "Evidence added successfully", "evidence_id": evidence.evidence_id}
 
 @app.get("/api/crimes/{crime_id}/evidence")
-async def get_evidence(crime_id: int, db: Session = Depends(get_db)):
+async def get_evidence(crime_id: int, db: AsyncSession = Depends(get_db)):
     """Get all evidence for a crime"""
-    evidence = db.query(Evidence).filter(Evidence.crime_id == crime_id).all()
+    evidence = (await db.execute(select(Evidence).where(Evidence.crime_id == crime_id))).scalars().all()
     return evidence
 
 # ==================== ARREST MANAGEMENT ====================
 
 @app.post("/api/arrests")
-async def create_arrest(arrest_data: dict, db: Session = Depends(get_db)):
+async def create_arrest(arrest_data: dict, db: AsyncSession = Depends(get_db)):
     """Create a new arrest record"""
     arrest = Arrest(
         criminal_id=arrest_data["criminal_id"],
@@ -296,7 +376,7 @@ async def create_arrest(arrest_data: dict, db: Session = Depends(get_db)):
         location_detail=arrest_data.get("location_detail")
     )
     db.add(arrest)
-    db.flush()
+    await db.flush()
     
     # Add charges if provided
     if arrest_data.get("charges"):
@@ -309,21 +389,31 @@ async def create_arrest(arrest_data: dict, db: Session = Depends(get_db)):
             )
             db.add(charge)
     
-    db.commit()
+    await db.commit()
     return {"message": "Arrest created successfully", "arrest_id": arrest.arrest_id}
 
 # ==================== USER MANAGEMENT ====================
 
 @app.get("/api/users")
-async def get_users(db: Session = Depends(get_db)):
-    """Get all users"""
-    users = db.query(AppUser).all()
-    return users
+async def get_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    station_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get users newest first, one keyset page at a time"""
+    stmt = select(AppUser)
+    if status:
+        stmt = stmt.where(AppUser.status == status)
+    if station_id is not None:
+        stmt = stmt.where(AppUser.station_id == station_id)
+    return await fetch_page(db, stmt, AppUser.created_at, AppUser.user_id, cursor, limit)
 
 @app.get("/api/users/{user_id}")
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
     """Get a specific user"""
-    user = db.query(AppUser).filter(AppUser.user_id == user_id).first()
+    user = (await db.execute(select(AppUser).where(AppUser.user_id == user_id))).scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -331,41 +421,41 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
 # ==================== LOCATION MANAGEMENT ====================
 
 @app.get("/api/locations")
-async def get_locations(db: Session = Depends(get_db)):
+async def get_locations(db: AsyncSession = Depends(get_db)):
     """Get all locations"""
-    locations = db.query(Location).all()
+    locations = (await db.execute(select(Location))).scalars().all()
     return locations
 
 @app.get("/api/districts")
-async def get_districts(db: Session = Depends(get_db)):
+async def get_districts(db: AsyncSession = Depends(get_db)):
     """Get all districts"""
-    districts = db.query(District).all()
+    districts = (await db.execute(select(District))).scalars().all()
     return districts
 
 # ==================== POLICE STATION MANAGEMENT ====================
 
 @app.get("/api/police-stations")
-async def get_police_stations(db: Session = Depends(get_db)):
+async def get_police_stations(db: AsyncSession = Depends(get_db)):
     """Get all police stations"""
-    stations = db.query(PoliceStation).all()
+    stations = (await db.execute(select(PoliceStation))).scalars().all()
     return stations
 
 @app.get("/api/police-stations/{station_id}/staff")
-async def get_station_staff(station_id: int, db: Session = Depends(get_db)):
+async def get_station_staff(station_id: int, db: AsyncSession = Depends(get_db)):
     """Get staff for a specific police station"""
-    staff = db.query(StationStaff).filter(StationStaff.station_id == station_id).all()
+    staff = (await db.execute(select(StationStaff).where(StationStaff.station_id == station_id))).scalars().all()
     return staff
 
 # ==================== PANIC EVENT MANAGEMENT ====================
 
 @app.get("/api/panic-events")
-async def get_panic_events(db: Session = Depends(get_db)):
+async def get_panic_events(db: AsyncSession = Depends(get_db)):
     """Get all panic events"""
-    events = db.query(PanicEvent).all()
+    events = (await db.execute(select(PanicEvent))).scalars().all()
     return events
 
 @app.post("/api/panic-events/{panic_id}/notify")
-async def send_panic_notification(panic_id: int, notification_data: dict, db: Session = Depends(get_db)):
+async def send_panic_notification(panic_id: int, notification_data: dict, db: AsyncSession = Depends(get_db)):
     """Send notification for a panic event"""
     notification = PanicNotification(
         panic_id=panic_id,
@@ -375,7 +465,7 @@ async def send_panic_notification(panic_id: int, notification_data: dict, db: Se
         delivered=False
     )
     db.add(notification)
-    db.commit()
+    await db.commit()
     return {"message": "Notification sent successfully"}
 
 if __name__ == "__main__":
@@ -1,35 +1,69 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, g
 import mysql.connector
 from mysql.connector import Error
 import datetime
 import json
+import os
+
+import case_status
+import crime_insert_sql
+from db_pool import ConnectionPool
 
 app = Flask(__name__)
 
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'mysafety'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', 'your_password_here'),  # Update with your actual password
+}
+
+# Shared by every request thread; connections are opened lazily on first use
+db_pool = ConnectionPool(
+    size=int(os.environ.get('DB_POOL_SIZE', '10')),
+    wait_timeout=float(os.environ.get('DB_POOL_WAIT_TIMEOUT', '10')),
+    recycle_seconds=int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+    **DB_CONFIG
+)
+
 class CrimeDatabaseManager:
-    def __init__(self, host='localhost', database='mysafety', user='root', password=''):
-        """Initialize database connection"""
+    def __init__(self, host='localhost', database='mysafety', user='root', password='', pool=None):
+        """Borrow a connection from the pool, or open a dedicated one when no pool is given"""
         self.connection = None
         self.cursor = None
+        self.pool = pool
+        self._pooled = None
         try:
-            self.connection = mysql.connector.connect(
-                host=host,
-                database=database,
-                user=user,
-                password=password
-            )
-            if self.connection.is_connected():
+            if pool is not None:
+                # The pool health-checks on checkout, so skip the extra ping here
+                self._pooled = pool.acquire()
+                self.connection = self._pooled.connection
                 self.cursor = self.connection.cursor()
-                print("Successfully connected to MySQL database")
+            else:
+                self.connection = mysql.connector.connect(
+                    host=host,
+                    database=database,
+                    user=user,
+                    password=password
+                )
+                if self.connection.is_connected():
+                    self.cursor = self.connection.cursor()
         except Error as e:
             print(f"Error connecting to MySQL: {e}")
 
     def close_connection(self):
-        """Close database connection"""
-        if self.connection.is_connected():
+        """Return the connection to the pool, or close it if it is not pooled; safe to call twice"""
+        if self.cursor is not None:
             self.cursor.close()
+            self.cursor = None
+        if self._pooled is not None:
+            self.pool.release(self._pooled)
+            self._pooled = None
+        elif self.connection is not None and self.connection.is_connected():
             self.connection.close()
             print("MySQL connection closed")
+        # Once released, the connection belongs to the pool (and maybe another request)
+        self.connection = None
 
     def insert_crime_data(self, crime_data):
         """Insert complete crime data using hardcoded SQL queries"""
@@ -42,7 +76,7 @@ class CrimeDatabaseManager:
             print(f"Location inserted with ID: {location_id}")
             
             # Step 2: Insert Crime
-            crime_id = self._insert_crime(crime_data['crime'], location_id)
+            crime_id = self._insert_crime(crime_data['crime'], location_id, crime_data['location']['district_id'])
             print(f"Crime inserted with ID: {crime_id}")
             
             # Step 3: Insert Victim (if provided)
@@ -105,6 +139,10 @@ class CrimeDatabaseManager:
             print(f"Error inserting crime data: {e}")
             return {'success': False, 'error': str(e)}
 
+    # Shared with the standalone manager; it only needs self.connection and self.cursor
+    update_crime_statuses = crime_insert_sql.CrimeDatabaseManager.update_crime_statuses
+    _insert_crime = crime_insert_sql.CrimeDatabaseManager._insert_crime
+
     def _insert_location(self, location_data):
         """Insert location data using hardcoded SQL"""
         sql = """
@@ -124,24 +162,6 @@ class CrimeDatabaseManager:
         self.cursor.execute(sql, values)
         return self.cursor.lastrowid
 
-    def _insert_crime(self, crime_data, location_id):
-        """Insert crime data using hardcoded SQL"""
-        sql = """
-        INSERT INTO crime (crime_type, description, date_time, location_id, status, created_at)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        values = (
-            crime_data['crime_type'],
-            crime_data['description'],
-            crime_data['date_time'],
-            location_id,
-            crime_data['status'],
-            datetime.datetime.now()
-        )
-        
-        self.cursor.execute(sql, values)
-        return self.cursor.lastrowid
 
     def _insert_victim(self, victim_data):
         """Insert victim data using hardcoded SQL"""
@@ -273,6 +293,19 @@ class CrimeDatabaseManager:
         
         self.cursor.execute(sql, values)
 
+def get_db_manager():
+    """Pooled database manager for the current request"""
+    db_manager = CrimeDatabaseManager(pool=db_pool)
+    g.db_manager = db_manager
+    return db_manager
+
+@app.teardown_request
+def release_db_manager(exc):
+    """Hand the connection back even when a route raised before closing it"""
+    db_manager = g.pop('db_manager', None)
+    if db_manager is not None:
+        db_manager.close_connection()
+
 # Flask Routes
 @app.route('/')
 def index():
@@ -287,14 +320,9 @@ def create_crime():
         crime_data = request.get_json()
         
         # Initialize database manager
-        db_manager = CrimeDatabaseManager(
-            host='localhost',
-            database='mysafety',
-            user='root',
-            password='your_password_here'  # Update with your actual password
-        )
+        db_manager = get_db_manager()
         
-        if not db_manager.connection or not db_manager.connection.is_connected():
+        if db_manager.cursor is None:
             return jsonify({'success': False, 'error': 'Database connection failed'}), 500
         
         # Insert the crime data
@@ -322,14 +350,9 @@ def create_crime():
 def get_crimes():
     """Get all crimes"""
     try:
-        db_manager = CrimeDatabaseManager(
-            host='localhost',
-            database='mysafety',
-            user='root',
-            password='your_password_here'  # Update with your actual password
-        )
+        db_manager = get_db_manager()
         
-        if not db_manager.connection or not db_manager.connection.is_connected():
+        if db_manager.cursor is None:
             return jsonify({'success': False, 'error': 'Database connection failed'}), 500
         
         # Get all crimes using hardcoded SQL
@@ -378,14 +401,9 @@ def get_crimes():
 def get_complaints():
     """Get all complaints"""
     try:
-        db_manager = CrimeDatabaseManager(
-            host='localhost',
-            database='mysafety',
-            user='root',
-            password='your_password_here'  # Update with your actual password
-        )
+        db_manager = get_db_manager()
         
-        if not db_manager.connection or not db_manager.connection.is_connected():
+        if db_manager.cursor is None:
             return jsonify({'success': False, 'error': 'Database connection failed'}), 500
         
         # Get all complaints using hardcoded SQL
@@ -425,14 +443,9 @@ def get_complaints():
 def verify_complaint(complaint_id):
     """Verify a complaint"""
     try:
-        db_manager = CrimeDatabaseManager(
-            host='localhost',
-            database='mysafety',
-            user='root',
-            password='your_password_here'  # Update with your actual password
-        )
+        db_manager = get_db_manager()
         
-        if not db_manager.connection or not db_manager.connection.is_connected():
+        if db_manager.cursor is None:
             return jsonify({'success': False, 'error': 'Database connection failed'}), 500
         
         # Update complaint status using hardcoded SQL
@@ -456,14 +469,9 @@ def assign_case():
     try:
         assignment_data = request.get_json()
         
-        db_manager = CrimeDatabaseManager(
-            host='localhost',
-            database='mysafety',
-            user='root',
-            password='your_password_here'  # Update with your actual password
-        )
+        db_manager = get_db_manager()
         
-        if not db_manager.connection or not db_manager.connection.is_connected():
+        if db_manager.cursor is None:
             return jsonify({'success': False, 'error': 'Database connection failed'}), 500
         
         # Insert case assignment using hardcoded SQL
@@ -494,5 +502,32 @@ def assign_case():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/crimes/status/batch', methods=['POST'])
+def update_crime_statuses():
+    """Apply many crime status changes in one transaction"""
+    try:
+        batch = request.get_json()
+        updates = [(u['crime_id'], u['new_status'], u.get('notes', '')) for u in batch.get('updates', [])]
+        if not updates or len(updates) > case_status.MAX_BATCH_SIZE:
+            return jsonify({'success': False, 'error': f'Send 1 to {case_status.MAX_BATCH_SIZE} updates'}), 400
+        
+        db_manager = get_db_manager()
+        
+        if db_manager.cursor is None:
+            return jsonify({'success': False, 'error': 'Database connection failed'}), 500
+        
+        result = db_manager.update_crime_statuses(updates, batch['changed_by'])
+        db_manager.close_connection()
+        
+        return jsonify(result), 200 if result['success'] else 500
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/pool-stats', methods=['GET'])
+def pool_stats():
+    """Connection pool utilization and wait times"""
+    return jsonify({'success': True, 'pool': db_pool.stats()}), 200
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,241 @@
+"""
+Load-aware automatic case assignment.
+
+AssignmentEngine keeps, per process, the number of open assignments
+(case_assignment rows with released_at IS NULL) for every officer, and a
+min-heap of (open cases, user_id) per police station built from current
+station_staff rows. Heaps use lazy invalidation: a load change pushes a fresh
+entry, and stale entries are dropped when they surface at the top. Picking
+the least-loaded officer at a station is therefore O(log n) amortised.
+
+A crime is assigned to the least-loaded officer at its own station or at
+one of the ASSIGN_NEARBY_STATIONS closest stations within
+ASSIGN_RADIUS_KM. Ties go to the crime's own station, then the nearer one.
+
+assign() runs under an asyncio.Lock and a MySQL named lock, so concurrent
+assignments in this or any other worker are serialised. Before committing it
+re-counts the chosen officer's open cases in the database. If another
+worker changed that count, the engine corrects its copy and picks again.
+"""
+
+import asyncio
+import heapq
+import os
+from datetime import datetime
+
+from sqlalchemy import text
+
+import change_feed
+from geo import haversine_distance
+
+ASSIGN_RADIUS_KM = float(os.environ.get("ASSIGN_RADIUS_KM", 15))
+ASSIGN_NEARBY_STATIONS = int(os.environ.get("ASSIGN_NEARBY_STATIONS", 3))
+LOCK_NAME = "case_assignment:auto"
+LOCK_TIMEOUT_SECONDS = 5
+
+LOAD_QUERIES = {
+    # Current postings of active officers
+    "staff": """
+        SELECT s.user_id, s.station_id
+        FROM station_staff s
+        JOIN appuser u ON u.user_id = s.user_id
+        WHERE (s.end_date IS NULL OR s.end_date >= CURRENT_DATE) AND LOWER(u.status) = 'active'
+    """,
+    "open": "SELECT user_id, COUNT(*) FROM case_assignment WHERE released_at IS NULL GROUP BY user_id",
+    "stations": """
+        SELECT p.station_id, l.latitude, l.longitude
+        FROM policestation p LEFT JOIN location l ON p.location_id = l.location_id
+    """,
+}
+
+
+class AssignmentError(Exception):
+    """A crime that cannot be auto-assigned (unknown, no station, nobody eligible)"""
+
+
+class AssignmentEngine:
+    """Open-case counts per officer and a lazily invalidated min-heap per station"""
+
+    def __init__(self):
+        self._load = {}           # user_id -> open assignments
+        self._stations_of = {}    # user_id -> set of station_ids
+        self._members = {}        # station_id -> set of user_ids
+        self._heaps = {}          # station_id -> [(open assignments, user_id)], may hold stale entries
+        self._nearby = {}         # station_id -> [station_id, ...] nearest first, itself included
+        self._lock = asyncio.Lock()
+        self.loaded = False
+
+    async def load(self, engine):
+        async with engine.connect() as conn:
+            staff = (await conn.execute(text(LOAD_QUERIES["staff"]))).fetchall()
+            open_counts = (await conn.execute(text(LOAD_QUERIES["open"]))).fetchall()
+            stations = (await conn.execute(text(LOAD_QUERIES["stations"]))).fetchall()
+
+        load = {user_id: int(count) for user_id, count in open_counts}
+        stations_of, members = {}, {}
+        for user_id, station_id in staff:
+            stations_of.setdefault(user_id, set()).add(station_id)
+            members.setdefault(station_id, set()).add(user_id)
+        self._load = load
+        self._stations_of = stations_of
+        self._members = members
+        self._heaps = {station_id: self._fresh_heap(station_id) for station_id in members}
+        self._nearby = _nearby_stations(stations)
+        self.loaded = True
+
+    async def ensure_loaded(self, engine):
+        if self.loaded:
+            return
+        async with self._lock:
+            if not self.loaded:
+                await self.load(engine)
+
+    def _fresh_heap(self, station_id):
+        heap = [(self._load.get(user_id, 0), user_id) for user_id in self._members[station_id]]
+        heapq.heapify(heap)
+        return heap
+
+    def _set_load(self, user_id, count):
+        """Record a new open-case count and push it to every station heap the officer is in"""
+        self._load[user_id] = count
+        for station_id in self._stations_of.get(user_id, ()):
+            heap = self._heaps[station_id]
+            heapq.heappush(heap, (count, user_id))
+            # Stale entries pile up when loads change often; rebuild instead of letting them grow
+            if len(heap) > 4 * len(self._members[station_id]) + 16:
+                self._heaps[station_id] = self._fresh_heap(station_id)
+
+    def adjust(self, user_id, change):
+        """Apply an assignment (+1) or release (-1) made outside assign()"""
+        self._set_load(user_id, max(0, self._load.get(user_id, 0) + change))
+
+    def _least_loaded(self, station_id, exclude):
+        """Valid (load, user_id) top of a station heap, skipping excluded officers, or None"""
+        heap = self._heaps.get(station_id)
+        if not heap:
+            return None
+        skipped, best = [], None
+        while heap:
+            count, user_id = heap[0]
+            if self._load.get(user_id, 0) != count:
+                heapq.heappop(heap)          # stale
+            elif user_id in exclude:
+                skipped.append(heapq.heappop(heap))
+            else:
+                best = (count, user_id)
+                break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return best
+
+    def choose(self, station_id, exclude=()):
+        """(user_id, station_id) of the least-loaded eligible officer near station_id, or None"""
+        best = None
+        for rank, candidate in enumerate(self._nearby.get(station_id, [station_id])):
+            top = self._least_loaded(candidate, exclude)
+            if top is not None and (best is None or (top[0], rank) < best[0]):
+                best = ((top[0], rank), top[1], candidate)
+        return (best[1], best[2]) if best else None
+
+    def workload(self, station_id=None):
+        """Open-case counts per officer, least loaded first"""
+        users = self._members.get(station_id, set()) if station_id is not None else self._stations_of.keys()
+        return sorted(
+            ({"user_id": user_id, "open_cases": self._load.get(user_id, 0),
+              "station_ids": sorted(self._stations_of.get(user_id, ()))} for user_id in users),
+            key=lambda item: (item["open_cases"], item["user_id"])
+        )
+
+    async def assign(self, engine, crime_id, duty_role):
+        """Assign a crime to the least-loaded nearby officer; returns the new assignment as a dict"""
+        await self.ensure_loaded(engine)
+        async with self._lock:
+            async with engine.connect() as conn:
+                locked = (await conn.execute(
+                    text("SELECT GET_LOCK(:name, :timeout)"), {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT_SECONDS}
+                )).scalar()
+                if locked != 1:
+                    raise TimeoutError("Timed out waiting for the case assignment lock")
+                # End the transaction SELECT GET_LOCK autobegan; the named lock is
+                # held by the session, not the transaction, so _assign_locked can begin its own
+                await conn.commit()
+                try:
+                    return await self._assign_locked(conn, crime_id, duty_role)
+                finally:
+                    await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+    async def _assign_locked(self, conn, crime_id, duty_role):
+        trans = await conn.begin()
+        try:
+            row = (await conn.execute(
+                text("SELECT station_id FROM crime WHERE crime_id = :crime_id"), {"crime_id": crime_id}
+            )).fetchone()
+            if row is None:
+                raise AssignmentError(f"Crime not found: {crime_id}")
+            if row[0] is None:
+                raise AssignmentError(f"Crime {crime_id} has no police station")
+            already = {user_id for (user_id,) in (await conn.execute(
+                text("SELECT user_id FROM case_assignment WHERE crime_id = :crime_id AND released_at IS NULL"),
+                {"crime_id": crime_id}
+            )).fetchall()}
+
+            while True:
+                choice = self.choose(row[0], exclude=already)
+                if choice is None:
+                    raise AssignmentError(f"No eligible officer near station {row[0]}")
+                user_id, station_id = choice
+                # Other workers assign too; trust the database over our copy before committing
+                actual = (await conn.execute(
+                    text("SELECT COUNT(*) FROM case_assignment WHERE user_id = :user_id AND released_at IS NULL"),
+                    {"user_id": user_id}
+                )).scalar()
+                if actual == self._load.get(user_id, 0):
+                    break
+                self._set_load(user_id, int(actual))
+
+            assigned_at = datetime.utcnow()
+            result = await conn.execute(
+                text("""
+                    INSERT INTO case_assignment (user_id, crime_id, duty_role, assigned_at)
+                    VALUES (:user_id, :crime_id, :duty_role, :assigned_at)
+                """),
+                {"user_id": user_id, "crime_id": crime_id, "duty_role": duty_role, "assigned_at": assigned_at}
+            )
+            await change_feed.record_change(conn, "case_assignment", result.lastrowid, "insert")
+            await trans.commit()
+        except BaseException:
+            await trans.rollback()
+            raise
+
+        self._set_load(user_id, self._load.get(user_id, 0) + 1)
+        return {
+            "assignment_id": result.lastrowid,
+            "crime_id": crime_id,
+            "user_id": user_id,
+            "station_id": station_id,
+            "duty_role": duty_role,
+            "assigned_at": assigned_at,
+            "open_cases": self._load[user_id],
+        }
+
+
+def _nearby_stations(stations):
+    """station_id -> itself followed by the closest stations within ASSIGN_RADIUS_KM"""
+    coords = {station_id: (float(lat), float(lon)) for station_id, lat, lon in stations
+              if lat is not None and lon is not None}
+    nearby = {}
+    for station_id, *_ in stations:
+        here = coords.get(station_id)
+        others = []
+        if here is not None:
+            others = sorted(
+                (haversine_distance(here[0], here[1], lat, lon), other)
+                for other, (lat, lon) in coords.items() if other != station_id
+            )
+        nearby[station_id] = [station_id] + [
+            other for km, other in others[:ASSIGN_NEARBY_STATIONS] if km <= ASSIGN_RADIUS_KM
+        ]
+    return nearby
+
+
+assignment_engine = AssignmentEngine()
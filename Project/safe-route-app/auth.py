@@ -0,0 +1,209 @@
+"""
+Password hashing and session tokens for the FastAPI app.
+
+Passwords are hashed with scrypt (hashlib, no extra dependency) on a small
+dedicated thread pool: each hash costs ~16 MB and tens of milliseconds of
+CPU, which must stay off the event loop and be bounded in parallelism.
+OpenSSL's scrypt releases the GIL, so the pool hashes in parallel.
+
+Legacy unsalted SHA-256 hashes still verify; callers rehash them with
+scrypt on the next successful login.
+
+Sessions are random bearer tokens. Only their SHA-256 is stored (in
+user_session), and validated sessions are kept in an in-memory TTL cache,
+so authenticated requests normally skip the database. The cache TTL is
+short, which bounds how long a logout in another worker goes unnoticed.
+Unknown tokens are cached too, for SESSION_NEGATIVE_TTL seconds, so a
+client replaying a bogus token costs one lookup, not one per request.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+SCRYPT_N = int(os.environ.get("SCRYPT_N", 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SESSION_TTL = timedelta(hours=int(os.environ.get("SESSION_TTL_HOURS", 12)))
+SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", 60))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+SESSION_NEGATIVE_TTL = float(os.environ.get("SESSION_NEGATIVE_TTL", 5))
+
+_hash_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("HASH_WORKERS", min(4, os.cpu_count() or 1))),
+    thread_name_prefix="password-hash",
+)
+
+
+# -------------------
+#  Password hashing
+# -------------------
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * r * n + 2 ** 20, dklen=64)
+
+
+def hash_password(password):
+    """Return 'scrypt$n$r$p$salt$hash' for password"""
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, stored):
+    """Return (matches, needs_rehash) for a scrypt or legacy SHA-256 hash"""
+    if stored.startswith("scrypt$"):
+        _, n, r, p, salt, digest = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        candidate = _scrypt(password, bytes.fromhex(salt), n, r, p)
+        matches = hmac.compare_digest(candidate, bytes.fromhex(digest))
+        return matches, matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    matches = hmac.compare_digest(legacy, stored)
+    return matches, matches
+
+
+async def hash_password_async(password):
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, hash_password, password)
+
+
+async def verify_password_async(password, stored):
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, verify_password, password, stored)
+
+
+# -------------------
+#  Sessions
+# -------------------
+def _token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionCache:
+    """
+    LRU of validated sessions keyed by token hash, each entry trusted for
+    SESSION_CACHE_TTL seconds, plus an LRU of token hashes known not to be
+    valid, trusted for SESSION_NEGATIVE_TTL seconds.
+    """
+
+    def __init__(self, ttl=SESSION_CACHE_TTL, max_size=SESSION_CACHE_SIZE, negative_ttl=SESSION_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._missing = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        session, cached_until = entry
+        if cached_until < time.monotonic() or session["expires_at"] < datetime.utcnow():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return session
+
+    def put(self, key, session):
+        self._missing.pop(key, None)
+        self._entries[key] = (session, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def is_missing(self, key):
+        cached_until = self._missing.get(key)
+        if cached_until is None:
+            return False
+        if cached_until < time.monotonic():
+            del self._missing[key]
+            return False
+        return True
+
+    def put_missing(self, key):
+        self._missing[key] = time.monotonic() + self.negative_ttl
+        self._missing.move_to_end(key)
+        while len(self._missing) > self.max_size:
+            self._missing.popitem(last=False)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+
+session_cache = SessionCache()
+
+
+async def create_session(conn, user):
+    """
+    Store a new session for user (a mapping with user_id etc.); returns (token, session).
+
+    Call remember_session() once the caller's transaction has committed.
+    """
+    token = secrets.token_urlsafe(32)
+    key = _token_key(token)
+    now = datetime.utcnow()
+    session = {
+        "user_id": user["user_id"],
+        "email": user["email"],
+        "username": user["username"],
+        "role_hint": user["role_hint"],
+        "station_id": user["station_id"],
+        "expires_at": now + SESSION_TTL,
+    }
+    await conn.execute(
+        text("""
+            INSERT INTO user_session (token_hash, user_id, created_at, expires_at)
+            VALUES (:token_hash, :user_id, :created_at, :expires_at)
+        """),
+        {"token_hash": key, "user_id": user["user_id"], "created_at": now, "expires_at": session["expires_at"]}
+    )
+    return token, session
+
+
+def remember_session(token, session):
+    """Cache a session from create_session() after its INSERT has committed"""
+    session_cache.put(_token_key(token), session)
+
+
+def cached_session(token):
+    """The session for token if it is in the cache, else None; never queries the database"""
+    return session_cache.get(_token_key(token))
+
+
+async def get_session(engine, token):
+    """Return the session for token, from the cache or the database, or None"""
+    key = _token_key(token)
+    session = session_cache.get(key)
+    if session is not None:
+        return session
+    if session_cache.is_missing(key):
+        return None
+    async with engine.connect() as conn:
+        row = (await conn.execute(
+            text("""
+                SELECT s.user_id, u.email, u.username, u.role_hint, u.station_id, s.expires_at
+                FROM user_session s
+                JOIN appuser u ON s.user_id = u.user_id
+                WHERE s.token_hash = :token_hash AND s.expires_at > :now
+            """),
+            {"token_hash": key, "now": datetime.utcnow()}
+        )).mappings().fetchone()
+    if row is None:
+        session_cache.put_missing(key)
+        return None
+    session = dict(row)
+    session_cache.put(key, session)
+    return session
+
+
+async def delete_session(conn, token):
+    """Revoke a session token"""
+    key = _token_key(token)
+    session_cache.discard(key)
+    await conn.execute(text("DELETE FROM user_session WHERE token_hash = :token_hash"), {"token_hash": key})
@@ -0,0 +1,279 @@
+"""
+Bulk crime import with one multi-row INSERT per entity table per chunk.
+
+The per-record path in create_crime costs up to ten round trips per crime.
+Here a chunk of N crimes costs a fixed handful of statements, plus a
+lookup and insert per location that is not known yet, and the generated IDs
+are resolved from LAST_INSERT_ID() instead of being read back row by row.
+
+ID resolution relies on InnoDB handing out consecutive auto-increment values
+to a single multi-row INSERT ... VALUES. That holds for every
+innodb_autoinc_lock_mode because the row count of such a "simple insert" is
+known up front; the step between values is @@auto_increment_increment.
+
+Locations go through the LocationResolver like single creates, so a known
+place (a LocationCache hit) costs no statement at all and a new one is not
+inserted twice. The caller releases the resolutions once its transaction
+has ended.
+"""
+
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+import change_feed
+import crime_stats
+
+DEFAULT_CHUNK_SIZE = 500
+
+REQUIRED_FIELDS = {
+    "location": ("district_id", "area_name", "city", "latitude", "longitude"),
+    "crime": ("crime_type", "description", "date_time", "status"),
+}
+
+
+class BulkImportError(Exception):
+    """A record failed validation or its chunk could not be written"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+def validate_record(record):
+    """Return a list of problems with a crime record (empty when valid)"""
+    problems = []
+    for section, fields in REQUIRED_FIELDS.items():
+        values = record.get(section) or {}
+        missing = [field for field in fields if values.get(field) in (None, "")]
+        if missing:
+            problems.append(f"{section} is missing {', '.join(missing)}")
+    return problems
+
+
+async def insert_rows(conn, table, columns, rows, id_step=1):
+    """
+    Insert rows with one multi-row INSERT and return their generated IDs.
+
+    Returns an empty list when there is nothing to insert, and no IDs for
+    tables without an auto-increment key (pass id_step=None).
+    """
+    if not rows:
+        return []
+    placeholders = []
+    params = {}
+    for i, row in enumerate(rows):
+        names = []
+        for column in columns:
+            name = f"{column}_{i}"
+            params[name] = row[column]
+            names.append(f":{name}")
+        placeholders.append(f"({', '.join(names)})")
+    result = await conn.execute(
+        text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join(placeholders)}"),
+        params
+    )
+    if id_step is None:
+        return []
+    first_id = result.lastrowid
+    return list(range(first_id, first_id + len(rows) * id_step, id_step))
+
+
+async def _insert_related(conn, records, crime_ids, section, name_field, table, columns, to_row,
+                          link_table, link_columns, link_value, id_step, now):
+    """Insert the optional entity for every record that has it, then the link rows"""
+    present = [
+        i for i, record in enumerate(records)
+        if (record.get(section) or {}).get(name_field)
+    ]
+    ids = await insert_rows(
+        conn, table, columns,
+        [to_row(records[i][section], now) for i in present],
+        id_step
+    )
+    links = [
+        dict(zip(link_columns, (crime_ids[i], entity_id, link_value)))
+        for i, entity_id in zip(present, ids)
+    ]
+    await insert_rows(conn, link_table, link_columns, links, id_step=None)
+    entity_ids = [None] * len(records)
+    for i, entity_id in zip(present, ids):
+        entity_ids[i] = entity_id
+    return entity_ids
+
+
+async def insert_chunk(conn, records, resolver, resolutions, id_step=1):
+    """
+    Write a chunk of crime records with one INSERT per table.
+
+    Column names follow create_crime in main.py. Each location resolution
+    is appended to resolutions. Returns one dict of generated IDs per
+    record, in input order.
+    """
+    now = datetime.utcnow()
+
+    location_ids = []
+    for r in records:
+        resolution = await resolver.resolve(conn, r["location"])
+        resolutions.append(resolution)
+        location_ids.append(resolution.location_id)
+    crime_ids = await insert_rows(
+        conn, "crime",
+        ["crime_type", "description", "date_time", "location_id", "station_id", "case_status", "created_at"],
+        [
+            {
+                "crime_type": r["crime"]["crime_type"],
+                "description": r["crime"]["description"],
+                "date_time": r["crime"]["date_time"],
+                "location_id": location_id,
+                "station_id": r["crime"].get("station_id", 1),  # Default to station 1
+                "case_status": r["crime"]["status"],
+                "created_at": now,
+            }
+            for r, location_id in zip(records, location_ids)
+        ],
+        id_step
+    )
+    await crime_stats.apply_deltas(conn, [
+        ((r["crime"]["date_time"], r["location"]["district_id"], r["crime"]["crime_type"], r["crime"]["status"]), 1)
+        for r in records
+    ])
+    await change_feed.record_changes(conn, "crime", crime_ids, "insert")
+
+    victim_ids = await _insert_related(
+        conn, records, crime_ids, "victim", "full_name", "victim",
+        ["full_name", "dob", "gender", "address", "phone_number", "injury_details", "created_at"],
+        lambda v, now: {
+            "full_name": v["full_name"], "dob": v.get("dob"), "gender": v.get("gender"),
+            "address": v.get("address"), "phone_number": v.get("phone_number"),
+            "injury_details": v.get("injury_details"), "created_at": now,
+        },
+        "crime_victim", ["crime_id", "victim_id", "harm_level"], "minor", id_step, now
+    )
+    criminal_ids = await _insert_related(
+        conn, records, crime_ids, "criminal", "full_name", "criminal",
+        ["full_name", "alias_name", "dob", "gender", "address", "marital_status", "past_record", "created_at"],
+        lambda c, now: {
+            "full_name": c["full_name"], "alias_name": c.get("alias_name"), "dob": c.get("dob"),
+            "gender": c.get("gender"), "address": c.get("address"),
+            "marital_status": c.get("marital_status"), "past_record": c.get("previous_crimes"),
+            "created_at": now,
+        },
+        "crime_criminal", ["crime_id", "criminal_id", "role"], "Suspect", id_step, now
+    )
+    weapon_ids = await _insert_related(
+        conn, records, crime_ids, "weapon", "weapon_name", "weapon",
+        ["weapon_name", "weapon_type", "description", "serial_number", "created_at"],
+        lambda w, now: {
+            "weapon_name": w["weapon_name"], "weapon_type": w.get("weapon_type"),
+            "description": w.get("description"), "serial_number": w.get("serial_number"),
+            "created_at": now,
+        },
+        "crime_weapon", ["crime_id", "weapon_id", "usage_desc"], "Used in crime", id_step, now
+    )
+    witness_ids = await _insert_related(
+        conn, records, crime_ids, "witness", "full_name", "witness",
+        ["full_name", "phone_number", "protection_flag"],
+        lambda w, now: {
+            "full_name": w["full_name"], "phone_number": w.get("phone_number"),
+            "protection_flag": w.get("protection_flag", False),
+        },
+        "crime_witness", ["crime_id", "witness_id", "statement_status"], "pending", id_step, now
+    )
+
+    return [
+        {
+            "crime_id": crime_ids[i],
+            "location_id": location_ids[i],
+            "victim_id": victim_ids[i],
+            "criminal_id": criminal_ids[i],
+            "weapon_id": weapon_ids[i],
+            "witness_id": witness_ids[i],
+        }
+        for i in range(len(records))
+    ]
+
+
+async def _discard_resolutions(conn, resolver, resolutions, mark):
+    """Release the resolutions made since mark, whose location rows a savepoint rollback undid"""
+    for resolution in resolutions[mark:]:
+        await resolver.release(conn, resolution, committed=False)
+    del resolutions[mark:]
+
+
+async def bulk_insert_crimes(conn, records, resolver, resolutions, mode="atomic", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import crime records in chunks inside one transaction on conn.
+
+    Locations are resolved with resolver (a LocationResolver); every
+    resolution is appended to resolutions, and the caller must pass each to
+    resolver.release() once the transaction has committed or rolled back.
+
+    mode="atomic": any invalid record or failed chunk rolls everything back.
+    mode="per_record": invalid records are reported and skipped; a chunk
+    that fails is retried one record at a time under savepoints so only the
+    offending records are dropped.
+
+    Returns (results, errors, stats). results holds one entry per imported
+    record with its input index and generated IDs; errors one per rejected
+    record.
+    """
+    started = time.perf_counter()
+    results, errors = [], []
+
+    valid = []
+    for index, record in enumerate(records):
+        problems = validate_record(record)
+        if problems:
+            if mode == "atomic":
+                raise BulkImportError(index, "; ".join(problems))
+            errors.append({"index": index, "error": "; ".join(problems)})
+        else:
+            valid.append((index, record))
+
+    id_step = (await conn.execute(text("SELECT @@auto_increment_increment"))).scalar()
+
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        indexes = [index for index, _ in chunk]
+        chunk_records = [record for _, record in chunk]
+        if mode == "atomic":
+            try:
+                ids = await insert_chunk(conn, chunk_records, resolver, resolutions, id_step)
+            except Exception as e:
+                raise BulkImportError(indexes[0], f"chunk starting at record {indexes[0]} failed: {e}")
+            results.extend({"index": index, **row_ids} for index, row_ids in zip(indexes, ids))
+            continue
+
+        mark = len(resolutions)
+        savepoint = await conn.begin_nested()
+        try:
+            ids = await insert_chunk(conn, chunk_records, resolver, resolutions, id_step)
+            await savepoint.commit()
+            results.extend({"index": index, **row_ids} for index, row_ids in zip(indexes, ids))
+        except Exception:
+            await savepoint.rollback()
+            await _discard_resolutions(conn, resolver, resolutions, mark)
+            # Isolate the failing records by replaying this chunk one by one
+            for index, record in chunk:
+                mark = len(resolutions)
+                savepoint = await conn.begin_nested()
+                try:
+                    ids = await insert_chunk(conn, [record], resolver, resolutions, id_step)
+                    await savepoint.commit()
+                    results.append({"index": index, **ids[0]})
+                except Exception as e:
+                    await savepoint.rollback()
+                    await _discard_resolutions(conn, resolver, resolutions, mark)
+                    errors.append({"index": index, "error": str(e)})
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "received": len(records),
+        "inserted": len(results),
+        "failed": len(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "records_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else None,
+    }
+    return results, errors, stats
@@ -0,0 +1,125 @@
+"""
+Crime status transitions, one at a time or in batches.
+
+ALLOWED_TRANSITIONS is the single source of truth for which status changes
+are permitted. apply_batch() validates a whole batch against the locked
+crime rows, then applies the accepted items with one CASE UPDATE, one
+multi-row case_status_history INSERT and one crime_stats upsert, all in the
+caller's transaction. Each item gets its own result, so one bad crime_id
+does not sink the rest of the batch.
+"""
+
+from sqlalchemy import text
+
+import change_feed
+import crime_stats
+
+STATUSES = ("reported", "pending", "under_investigation", "case_closed")
+
+ALLOWED_TRANSITIONS = {
+    "reported": {"pending", "under_investigation", "case_closed"},
+    "pending": {"under_investigation", "case_closed"},
+    "under_investigation": {"pending", "case_closed"},
+    # Reopening a closed case goes back to investigation
+    "case_closed": {"under_investigation"},
+}
+
+MAX_BATCH_SIZE = 1000
+
+
+def transition_error(old_status, new_status):
+    """Why old_status -> new_status is not allowed, or None if it is"""
+    if new_status not in STATUSES:
+        return f"Unknown status: {new_status}"
+    # Rows written before statuses were enforced (NULL or free text) may move anywhere
+    allowed = ALLOWED_TRANSITIONS.get(old_status, set(STATUSES))
+    if new_status not in allowed:
+        return f"Cannot change status from {old_status} to {new_status}"
+    return None
+
+
+def plan(items, current):
+    """
+    Validate items against the current rows.
+
+    items are (crime_id, new_status, notes); current maps crime_id to
+    (date_time, district_id, crime_type, status). Returns (results, accepted)
+    where results has one dict per item, in order, and accepted lists the
+    items to write. An item that is already in the requested status
+    succeeds without a write.
+    """
+    results, accepted, seen = [], [], set()
+    for crime_id, new_status, notes in items:
+        result = {"crime_id": crime_id, "new_status": new_status}
+        results.append(result)
+        row = current.get(crime_id)
+        if crime_id in seen:
+            result.update(success=False, error="Duplicate crime_id in batch")
+            continue
+        seen.add(crime_id)
+        if row is None:
+            result.update(success=False, error="Crime not found")
+            continue
+        old_status = row[3]
+        result["old_status"] = old_status
+        if old_status == new_status:
+            result.update(success=True, changed=False)
+            continue
+        error = transition_error(old_status, new_status)
+        if error:
+            result.update(success=False, error=error)
+            continue
+        result.update(success=True, changed=True)
+        accepted.append((crime_id, new_status, notes))
+    return results, accepted
+
+
+async def apply_batch(conn, items, changed_by, changed_at):
+    """Apply status changes inside the caller's transaction; returns per-item results"""
+    if not items:
+        return []
+    ids = sorted({crime_id for crime_id, _, _ in items})
+    id_params = {f"id{i}": crime_id for i, crime_id in enumerate(ids)}
+    # Locks the rows (in id order, so concurrent batches cannot deadlock each other)
+    rows = (await conn.execute(
+        text(f"""
+            SELECT c.crime_id, c.date_time, l.district_id, c.crime_type, c.status
+            FROM crime c
+            LEFT JOIN location l ON c.location_id = l.location_id
+            WHERE c.crime_id IN ({', '.join(f':{name}' for name in id_params)})
+            ORDER BY c.crime_id
+            FOR UPDATE
+        """),
+        id_params
+    )).fetchall()
+    current = {row[0]: tuple(row[1:]) for row in rows}
+    results, accepted = plan(items, current)
+    if not accepted:
+        return results
+
+    cases, history, params = [], [], {"changed_by": changed_by, "changed_at": changed_at}
+    for i, (crime_id, new_status, notes) in enumerate(accepted):
+        cases.append(f"WHEN :c{i} THEN :s{i}")
+        history.append(f"(:c{i}, :s{i}, :n{i}, :changed_at, :changed_by)")
+        params.update({f"c{i}": crime_id, f"s{i}": new_status, f"n{i}": notes})
+    in_list = ", ".join(f":c{i}" for i in range(len(accepted)))
+    await conn.execute(
+        text(f"UPDATE crime SET status = CASE crime_id {' '.join(cases)} END WHERE crime_id IN ({in_list})"),
+        params
+    )
+    await conn.execute(
+        text(f"""
+            INSERT INTO case_status_history (crime_id, status, notes, changed_at, changed_by)
+            VALUES {', '.join(history)}
+        """),
+        params
+    )
+
+    deltas = []
+    for crime_id, new_status, _ in accepted:
+        date_time, district_id, crime_type, old_status = current[crime_id]
+        deltas.append(((date_time, district_id, crime_type, old_status), -1))
+        deltas.append(((date_time, district_id, crime_type, new_status), 1))
+    await crime_stats.apply_deltas(conn, deltas)
+    await change_feed.record_changes(conn, "crime", [crime_id for crime_id, _, _ in accepted])
+    return results
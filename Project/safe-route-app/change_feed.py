@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Change feed for incremental dashboard sync.
+
+Every mutation of a crime, complaint or case assignment appends a row to
+change_log (migration 7) in the same transaction as the mutation, so a
+change is visible in the feed exactly when the data is. GET /api/changes
+returns what changed after a cursor (the last change_id the client saw).
+Changes to the same row are coalesced, and each changed row comes back in
+its current state, so a refresh costs O(changes) instead of O(table).
+
+AUTO_INCREMENT ids are handed out at insert time but become visible at
+commit, so a long transaction (a bulk import, an ingest batch) can commit
+a lower change_id after a reader has moved past it. Cursors are therefore
+not change_ids but feed sequence numbers (change_log.seq, migration 9),
+assigned after commit: stamp_committed() locks the unstamped rows with
+SKIP LOCKED, which passes over rows whose transaction is still open, and
+numbers the rest above everything stamped so far. A row still in flight
+gets a higher number once it commits, so no reader can have moved past it.
+
+`python change_feed.py prune --days N` deletes old entries. A client
+whose cursor predates the oldest retained entry is told to reset, meaning
+it should reload everything.
+"""
+
+import asyncio
+
+from sqlalchemy import text
+
+from serialization import rows_to_dicts
+
+STAMP_BATCH_SIZE = 5000
+
+# Current state of changed rows, per entity; {ids} is filled with bind parameters
+ENTITY_QUERIES = {
+    "crime": """
+        SELECT c.crime_id AS id, c.crime_type, c.description, c.date_time, c.status, c.created_at,
+               l.district_id, l.area_name, l.city
+        FROM crime c
+        LEFT JOIN location l ON c.location_id = l.location_id
+        WHERE c.crime_id IN ({ids})
+    """,
+    "complaint": """
+        SELECT complaint_id AS id, reported_at, reporter_contact, description, channel, status
+        FROM complaint WHERE complaint_id IN ({ids})
+    """,
+    "case_assignment": """
+        SELECT assignment_id AS id, user_id, crime_id, duty_role, assigned_at, released_at
+        FROM case_assignment WHERE assignment_id IN ({ids})
+    """,
+}
+
+
+async def record_changes(conn, entity, entity_ids, op="update"):
+    """Append one change_log row per id with a single INSERT, inside the caller's transaction"""
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return
+    params = {"entity": entity, "op": op}
+    params.update({f"e{i}": entity_id for i, entity_id in enumerate(entity_ids)})
+    await conn.execute(
+        text("INSERT INTO change_log (entity, entity_id, op) VALUES "
+             + ", ".join(f"(:entity, :e{i}, :op)" for i in range(len(entity_ids)))),
+        params
+    )
+
+
+async def record_change(conn, entity, entity_id, op="update"):
+    await record_changes(conn, entity, [entity_id], op)
+
+
+def record_changes_sync(cursor, entity, entity_ids, op="update"):
+    """record_changes for the synchronous mysql.connector / pymysql managers"""
+    entity_ids = list(entity_ids)
+    if entity_ids:
+        cursor.execute(
+            "INSERT INTO change_log (entity, entity_id, op) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(entity_ids)),
+            [value for entity_id in entity_ids for value in (entity, entity_id, op)]
+        )
+
+
+async def stamp_committed(engine):
+    """
+    Give committed, unstamped change_log rows the next feed sequence numbers.
+
+    Runs in its own READ COMMITTED connection and commits per batch. One
+    stamper at a time (GET_LOCK); if another request is already stamping,
+    this one returns 0 and its rows show up on the next poll. Returns the
+    number of rows stamped.
+    """
+    stamped = 0
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="READ COMMITTED")
+        if not (await conn.execute(text("SELECT GET_LOCK('change_log_stamp', 0)"))).scalar():
+            return 0
+        try:
+            while True:
+                ids = (await conn.execute(
+                    text("""
+                        SELECT change_id FROM change_log
+                        WHERE seq IS NULL
+                        ORDER BY change_id
+                        LIMIT :batch
+                        FOR UPDATE SKIP LOCKED
+                    """),
+                    {"batch": STAMP_BATCH_SIZE}
+                )).scalars().all()
+                if not ids:
+                    break
+                base = (await conn.execute(text("SELECT COALESCE(MAX(seq), 0) FROM change_log"))).scalar()
+                # Keeps change_id order within the batch; gaps in seq are harmless
+                params = {"offset": base - ids[0] + 1}
+                params.update({f"id{i}": change_id for i, change_id in enumerate(ids)})
+                await conn.execute(
+                    text(f"UPDATE change_log SET seq = change_id + :offset "
+                         f"WHERE change_id IN ({', '.join(f':id{i}' for i in range(len(ids)))})"),
+                    params
+                )
+                await conn.commit()
+                stamped += len(ids)
+                if len(ids) < STAMP_BATCH_SIZE:
+                    break
+        finally:
+            await conn.rollback()
+            await conn.execute(text("SELECT RELEASE_LOCK('change_log_stamp')"))
+            await conn.commit()
+    return stamped
+
+
+def parse_cursor(since):
+    """Cursor -> last seen feed sequence number; an empty cursor means from the beginning"""
+    if not since:
+        return 0
+    try:
+        change_id = int(since)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {since}") from None
+    if change_id < 0:
+        raise ValueError(f"Invalid cursor: {since}")
+    return change_id
+
+
+async def changes_since(conn, since, limit, entities=None):
+    """
+    Changes after the cursor `since`, coalesced per row, with each row's current state.
+
+    Only stamped rows are read; call stamp_committed() first.
+    Returns {"changes", "next_cursor", "has_more", "reset"}. A change whose
+    row no longer exists is reported with op "delete" and no row.
+    """
+    after = parse_cursor(since)
+    oldest = (await conn.execute(text("SELECT MIN(seq) FROM change_log"))).scalar()
+    if after and oldest is not None and after < oldest - 1:
+        return {"changes": [], "next_cursor": since, "has_more": False, "reset": True}
+
+    conditions = ["seq > :after"]
+    params = {"after": after, "limit": limit + 1}
+    if entities:
+        names = sorted(set(entities))
+        conditions.append(f"entity IN ({', '.join(f':entity{i}' for i in range(len(names)))})")
+        params.update({f"entity{i}": name for i, name in enumerate(names)})
+    rows = (await conn.execute(
+        text(f"""
+            SELECT seq, entity, entity_id, op FROM change_log
+            WHERE {' AND '.join(conditions)}
+            ORDER BY seq
+            LIMIT :limit
+        """),
+        params
+    )).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Latest op per row, in order of each row's last change
+    latest = {}
+    for seq, entity, entity_id, op in rows:
+        latest.pop((entity, entity_id), None)
+        latest[(entity, entity_id)] = op
+
+    current = {}
+    for entity, query in ENTITY_QUERIES.items():
+        ids = [entity_id for (name, entity_id) in latest if name == entity]
+        if not ids:
+            continue
+        id_params = {f"id{i}": entity_id for i, entity_id in enumerate(ids)}
+        result = await conn.execute(
+            text(query.format(ids=", ".join(f":{name}" for name in id_params))), id_params
+        )
+        for row in rows_to_dicts(list(result.keys()), result.fetchall()):
+            current[(entity, row["id"])] = row
+
+    changes = []
+    for (entity, entity_id), op in latest.items():
+        row = current.get((entity, entity_id))
+        changes.append({"entity": entity, "id": entity_id, "op": op if row is not None else "delete", "row": row})
+    return {
+        "changes": changes,
+        "next_cursor": str(rows[-1][0]) if rows else (since or "0"),
+        "has_more": has_more,
+        "reset": False,
+    }
+
+
+async def prune(conn, days):
+    """Delete change_log rows older than days; returns the number deleted"""
+    result = await conn.execute(
+        text("DELETE FROM change_log WHERE changed_at < NOW(6) - INTERVAL :days DAY"), {"days": days}
+    )
+    return result.rowcount
+
+
+async def _prune_command(days):
+    from database import engine
+
+    async with engine.begin() as conn:
+        deleted = await prune(conn, days)
+    await engine.dispose()
+    print(f"Deleted {deleted} change_log rows older than {days} days")
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if len(args) != 3 or args[0] != "prune" or args[1] != "--days" or not args[2].isdigit():
+        sys.exit("usage: python change_feed.py prune --days N")
+    asyncio.run(_prune_command(int(args[2])))
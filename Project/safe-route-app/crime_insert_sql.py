@@ -3,6 +3,10 @@ from mysql.connector import Error
 import datetime
 import json
 
+import case_status
+import change_feed
+import crime_stats
+
 class CrimeDatabaseManager:
     def __init__(self, host='localhost', database='mysafety', user='root', password=''):
         """Initialize database connection"""
@@ -39,7 +43,7 @@ class CrimeDatabaseManager:
             print(f"Location inserted with ID: {location_id}")
             
             # Step 2: Insert Crime
-            crime_id = self._insert_crime(crime_data['crime'], location_id)
+            crime_id = self._insert_crime(crime_data['crime'], location_id, crime_data['location']['district_id'])
             print(f"Crime inserted with ID: {crime_id}")
             
             # Step 3: Insert Victim (if provided)
@@ -52,12 +56,16 @@ class CrimeDatabaseManager:
                 self._insert_crime_victim(crime_id, victim_id)
                 print("Crime-Victim relationship created")
             
-            # Step 4: Insert Criminal (if provided)
+            # Step 4: Link an existing criminal by ID, or insert a new one (if provided)
             criminal_id = None
-            if crime_data.get('criminal', {}).get('full_name'):
+            if crime_data.get('criminal', {}).get('criminal_id'):
+                criminal_id = self._existing_criminal(crime_data['criminal']['criminal_id'])
+                print(f"Linking existing criminal ID: {criminal_id}")
+            elif crime_data.get('criminal', {}).get('full_name'):
                 criminal_id = self._insert_criminal(crime_data['criminal'])
                 print(f"Criminal inserted with ID: {criminal_id}")
-                
+            
+            if criminal_id is not None:
                 # Insert Crime-Criminal relationship
                 self._insert_crime_criminal(crime_id, criminal_id)
                 print("Crime-Criminal relationship created")
@@ -102,6 +110,105 @@ class CrimeDatabaseManager:
             print(f"Error inserting crime data: {e}")
             return {'success': False, 'error': str(e)}
 
+    def insert_crime_data_bulk(self, crime_records, chunk_size=500):
+        """
+        Insert many crimes in one transaction with one multi-row INSERT per table per chunk.
+
+        Generated IDs are resolved from the first ID of each INSERT, since
+        InnoDB allocates consecutive values to a single multi-row insert.
+        """
+        try:
+            self.connection.start_transaction()
+            self.cursor.execute("SELECT @@auto_increment_increment")
+            id_step = self.cursor.fetchone()[0]
+            
+            results = []
+            for start in range(0, len(crime_records), chunk_size):
+                chunk = crime_records[start:start + chunk_size]
+                now = datetime.datetime.now()
+                
+                location_ids = self._insert_many(
+                    'location',
+                    ['district_id', 'area_name', 'city', 'latitude', 'longitude', 'created_at'],
+                    [(r['location']['district_id'], r['location']['area_name'], r['location']['city'],
+                      r['location']['latitude'], r['location']['longitude'], now) for r in chunk],
+                    id_step
+                )
+                crime_ids = self._insert_many(
+                    'crime',
+                    ['crime_type', 'description', 'date_time', 'location_id', 'status', 'created_at'],
+                    [(r['crime']['crime_type'], r['crime']['description'], r['crime']['date_time'],
+                      location_id, r['crime']['status'], now) for r, location_id in zip(chunk, location_ids)],
+                    id_step
+                )
+                crime_stats.apply_deltas_sync(self.cursor, [
+                    ((r['crime']['date_time'], r['location']['district_id'], r['crime']['crime_type'],
+                      r['crime']['status']), 1) for r in chunk
+                ])
+                change_feed.record_changes_sync(self.cursor, "crime", crime_ids, "insert")
+                chunk_results = [
+                    {'crime_id': crime_id, 'location_id': location_id}
+                    for crime_id, location_id in zip(crime_ids, location_ids)
+                ]
+                
+                # Optional entities: one INSERT for the entities, one for the links
+                related = [
+                    ('victim', 'full_name', 'victim_id',
+                     ['full_name', 'dob', 'gender', 'address', 'phone_number', 'email', 'injury_details', 'created_at'],
+                     lambda v: (v['full_name'], self._parse_date(v.get('dob')), v.get('gender'), v.get('address'),
+                                v.get('phone_number'), v.get('email'), v.get('injury_details'), now),
+                     'crime_victim', ['crime_id', 'victim_id', 'injury_level'], 'minor'),
+                    ('criminal', 'full_name', 'criminal_id',
+                     ['full_name', 'alias_name', 'dob', 'gender', 'address', 'marital_status', 'previous_crimes', 'created_at'],
+                     lambda c: (c['full_name'], c.get('alias_name'), self._parse_date(c.get('dob')), c.get('gender'),
+                                c.get('address'), c.get('marital_status'), c.get('previous_crimes'), now),
+                     'crime_criminal', ['crime_id', 'criminal_id', 'notes'], 'Initial report'),
+                    ('weapon', 'weapon_name', 'weapon_id',
+                     ['weapon_name', 'weapon_type', 'description', 'serial_number', 'created_at'],
+                     lambda w: (w['weapon_name'], w.get('weapon_type'), w.get('description'), w.get('serial_number'), now),
+                     'crime_weapon', ['crime_id', 'weapon_id', 'usage_detail'], 'Used in crime'),
+                    ('witness', 'full_name', 'witness_id',
+                     ['full_name', 'phone_number', 'protection_flag'],
+                     lambda w: (w['full_name'], w.get('phone_number'), w.get('protection_flag', False)),
+                     'crime_witness', ['crime_id', 'witness_id', 'statement_status'], 'pending'),
+                ]
+                for section, name_field, id_key, columns, to_row, link_table, link_columns, link_value in related:
+                    present = [i for i, r in enumerate(chunk) if (r.get(section) or {}).get(name_field)]
+                    entity_ids = self._insert_many(section, columns, [to_row(chunk[i][section]) for i in present], id_step)
+                    self._insert_many(
+                        link_table, link_columns,
+                        [(crime_ids[i], entity_id, link_value) for i, entity_id in zip(present, entity_ids)]
+                    )
+                    for i, entity_id in zip(present, entity_ids):
+                        chunk_results[i][id_key] = entity_id
+                
+                results.extend(chunk_results)
+            
+            self.connection.commit()
+            return {'success': True, 'inserted': len(results), 'results': results}
+            
+        except (Error, KeyError) as e:
+            self.connection.rollback()
+            return {'success': False, 'error': str(e)}
+
+    def _insert_many(self, table, columns, rows, id_step=None):
+        """Insert rows with a single multi-row INSERT; returns generated IDs when id_step is given"""
+        if not rows:
+            return []
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([row_placeholder] * len(rows))
+        self.cursor.execute(sql, [value for row in rows for value in row])
+        if id_step is None:
+            return []
+        first_id = self.cursor.lastrowid
+        return list(range(first_id, first_id + len(rows) * id_step, id_step))
+
+    def _parse_date(self, value):
+        """Convert a YYYY-MM-DD string to a date (None stays None)"""
+        if not value:
+            return None
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
     def _insert_location(self, location_data):
         """Insert location data using hardcoded SQL"""
         sql = """
@@ -121,8 +228,8 @@ class CrimeDatabaseManager:
         self.cursor.execute(sql, values)
         return self.cursor.lastrowid
 
-    def _insert_crime(self, crime_data, location_id):
-        """Insert crime data using hardcoded SQL"""
+    def _insert_crime(self, crime_data, location_id, district_id):
+        """Insert crime data, plus its crime_stats and change_log rows in the same transaction"""
         sql = """
         INSERT INTO crime (crime_type, description, date_time, location_id, status, created_at)
         VALUES (%s, %s, %s, %s, %s, %s)
@@ -138,7 +245,12 @@ class CrimeDatabaseManager:
         )
         
         self.cursor.execute(sql, values)
-        return self.cursor.lastrowid
+        crime_id = self.cursor.lastrowid
+        crime_stats.apply_deltas_sync(self.cursor, [
+            ((crime_data['date_time'], district_id, crime_data['crime_type'], crime_data['status']), 1)
+        ])
+        change_feed.record_changes_sync(self.cursor, "crime", [crime_id], "insert")
+        return crime_id
 
     def _insert_victim(self, victim_data):
         """Insert victim data using hardcoded SQL"""
@@ -166,6 +278,14 @@ class CrimeDatabaseManager:
         self.cursor.execute(sql, values)
         return self.cursor.lastrowid
 
+    def _existing_criminal(self, criminal_id):
+        """Return criminal_id if that criminal exists, raising otherwise"""
+        self.cursor.execute("SELECT criminal_id FROM criminal WHERE criminal_id = %s", (criminal_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            raise Error(f"Unknown criminal_id: {criminal_id}")
+        return row[0]
+    
     def _insert_criminal(self, criminal_data):
         """Insert criminal data using hardcoded SQL"""
         sql = """
@@ -301,31 +421,69 @@ class CrimeDatabaseManager:
         return self.cursor.fetchall()
 
     def update_crime_status(self, crime_id, new_status, notes, changed_by):
-        """Update crime status and add to history using hardcoded SQL"""
+        """Update one crime's status; a one-item update_crime_statuses"""
+        result = self.update_crime_statuses([(crime_id, new_status, notes)], changed_by)
+        if not result['success']:
+            return result
+        item, = result['results']
+        if not item['success']:
+            return {'success': False, 'error': item['error']}
+        return {'success': True, 'message': 'Status updated successfully'}
+
+    def update_crime_statuses(self, updates, changed_by):
+        """
+        Apply (crime_id, new_status, notes) changes in one transaction; returns per-item results.
+
+        The synchronous twin of case_status.apply_batch: same transition
+        rules (case_status.plan), one CASE UPDATE, one multi-row history
+        INSERT, and the crime_stats and change_log bookkeeping in the same
+        transaction.
+        """
         try:
             self.connection.start_transaction()
-            
-            # Update crime status
-            update_sql = "UPDATE crime SET status = %s WHERE crime_id = %s"
-            self.cursor.execute(update_sql, (new_status, crime_id))
-            
-            # Add to status history
-            history_sql = """
-            INSERT INTO case_status_history (crime_id, status, notes, changed_at, changed_by)
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            
-            history_values = (
-                crime_id, new_status, notes, datetime.datetime.now(), changed_by
-            )
-            
-            self.cursor.execute(history_sql, history_values)
+            ids = sorted({crime_id for crime_id, _, _ in updates})
+            self.cursor.execute(f"""
+            SELECT c.crime_id, c.date_time, l.district_id, c.crime_type, c.status
+            FROM crime c
+            LEFT JOIN location l ON c.location_id = l.location_id
+            WHERE c.crime_id IN ({', '.join(['%s'] * len(ids))})
+            ORDER BY c.crime_id
+            FOR UPDATE
+            """, ids)
+            current = {row[0]: tuple(row[1:]) for row in self.cursor.fetchall()}
+            results, accepted = case_status.plan(updates, current)
+
+            if accepted:
+                cases = " ".join(["WHEN %s THEN %s"] * len(accepted))
+                case_values = [value for crime_id, new_status, _ in accepted for value in (crime_id, new_status)]
+                self.cursor.execute(
+                    f"UPDATE crime SET status = CASE crime_id {cases} END "
+                    f"WHERE crime_id IN ({', '.join(['%s'] * len(accepted))})",
+                    case_values + [crime_id for crime_id, _, _ in accepted]
+                )
+
+                changed_at = datetime.datetime.now()
+                self.cursor.execute(
+                    "INSERT INTO case_status_history (crime_id, status, notes, changed_at, changed_by) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, %s)"] * len(accepted)),
+                    [value for crime_id, new_status, notes in accepted
+                     for value in (crime_id, new_status, notes, changed_at, changed_by)]
+                )
+
+                deltas = []
+                for crime_id, new_status, _ in accepted:
+                    date_time, district_id, crime_type, old_status = current[crime_id]
+                    deltas.append(((date_time, district_id, crime_type, old_status), -1))
+                    deltas.append(((date_time, district_id, crime_type, new_status), 1))
+                crime_stats.apply_deltas_sync(self.cursor, deltas)
+                change_feed.record_changes_sync(self.cursor, "crime", [crime_id for crime_id, _, _ in accepted])
+
             self.connection.commit()
-            
-            return {'success': True, 'message': 'Status updated successfully'}
-            
+            return {'success': True, 'results': results}
+
         except Error as e:
             self.connection.rollback()
+            print(f"Error updating crime statuses: {e}")
             return {'success': False, 'error': str(e)}
 
     def assign_case(self, crime_id, user_id, duty_role):
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Daily crime counts by district, crime type and status (crime_stats_daily).
+
+Every write path that adds a crime or changes its status applies a +1/-1
+delta to this table in its own transaction, so the counts stay exact
+without scanning crime. Crimes without a district are counted under
+district_id 0, and a NULL status as ''. Crimes without a date_time have
+no stat_date and are not counted. `python crime_stats.py rebuild`
+recomputes the table from scratch, e.g. after a backfill that bypassed
+the API.
+"""
+
+import asyncio
+from collections import Counter
+
+from sqlalchemy import text
+
+# Shared by the rebuild below, the migration backfill and the ingest pipeline
+UPSERT_SUFFIX = "ON DUPLICATE KEY UPDATE crime_count = crime_count + VALUES(crime_count)"
+
+ROLLUP_SELECT = """
+    SELECT DATE(c.date_time), COALESCE(l.district_id, 0), c.crime_type, COALESCE(c.status, ''), COUNT(*)
+    FROM crime c
+    LEFT JOIN location l ON c.location_id = l.location_id
+    WHERE c.date_time IS NOT NULL
+    GROUP BY DATE(c.date_time), COALESCE(l.district_id, 0), c.crime_type, COALESCE(c.status, '')
+"""
+
+STATS_COLUMNS = "(stat_date, district_id, crime_type, status, crime_count)"
+
+# Dimensions /api/stats can break counts down by
+DIMENSIONS = {
+    "district": "district_id",
+    "crime_type": "crime_type",
+    "status": "status",
+    "day": "stat_date",
+}
+
+
+def _day(value):
+    """DATETIME or ISO string -> date part, as DATE(date_time) would give"""
+    return value.date() if hasattr(value, "date") else str(value)[:10]
+
+
+def delta_rows(deltas):
+    """
+    Net deltas per rollup key, as (stat_date, district_id, crime_type, status, change) rows.
+
+    deltas is an iterable of ((date_time, district_id, crime_type, status), change).
+    Zero-sum entries (e.g. a status changed back and forth) and crimes
+    without a date_time are dropped.
+    """
+    totals = Counter()
+    for (date_time, district_id, crime_type, status), change in deltas:
+        if date_time is None:
+            continue
+        totals[(_day(date_time), district_id or 0, crime_type, status or "")] += change
+    return [key + (change,) for key, change in totals.items() if change]
+
+
+async def apply_deltas(conn, deltas):
+    """Add deltas (see delta_rows) to the rollup with one multi-row upsert"""
+    rows = delta_rows(deltas)
+    if not rows:
+        return
+    placeholders, params = [], {}
+    for i, (day, district_id, crime_type, status, change) in enumerate(rows):
+        placeholders.append(f"(:d{i}, :district{i}, :type{i}, :status{i}, :n{i})")
+        params.update({f"d{i}": day, f"district{i}": district_id, f"type{i}": crime_type,
+                       f"status{i}": status, f"n{i}": change})
+    await conn.execute(
+        text(f"INSERT INTO crime_stats_daily {STATS_COLUMNS} VALUES {', '.join(placeholders)} {UPSERT_SUFFIX}"),
+        params
+    )
+
+
+def apply_deltas_sync(cursor, deltas):
+    """apply_deltas for the synchronous mysql.connector / pymysql managers"""
+    rows = delta_rows(deltas)
+    if rows:
+        cursor.execute(
+            f"INSERT INTO crime_stats_daily {STATS_COLUMNS} VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows)) + f" {UPSERT_SUFFIX}",
+            [value for row in rows for value in row]
+        )
+
+
+async def rebuild(conn):
+    """Recompute the whole rollup from crime inside the caller's transaction"""
+    await conn.execute(text("DELETE FROM crime_stats_daily"))
+    await conn.execute(text(f"INSERT INTO crime_stats_daily {STATS_COLUMNS} {ROLLUP_SELECT}"))
+
+
+async def summary(conn, conditions, params, dimensions):
+    """Total count plus one breakdown per requested dimension, all from the rollup"""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    total = (await conn.execute(
+        text(f"SELECT COALESCE(SUM(crime_count), 0) FROM crime_stats_daily {where}"), params
+    )).scalar()
+    result = {"total": int(total)}
+    for name in dimensions:
+        column = DIMENSIONS[name]
+        rows = (await conn.execute(
+            text(f"""
+                SELECT {column}, SUM(crime_count) FROM crime_stats_daily {where}
+                GROUP BY {column} HAVING SUM(crime_count) <> 0 ORDER BY {column}
+            """),
+            params
+        )).fetchall()
+        result[f"by_{name}"] = [{name: key, "count": int(count)} for key, count in rows]
+    return result
+
+
+async def _rebuild_command():
+    from database import engine
+
+    async with engine.begin() as conn:
+        await rebuild(conn)
+    await engine.dispose()
+    print("crime_stats_daily rebuilt")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python crime_stats.py rebuild")
+    asyncio.run(_rebuild_command())
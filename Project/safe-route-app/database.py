@@ -0,0 +1,44 @@
+"""
+Shared async database engine for the FastAPI apps.
+
+Handlers await every query, so a slow statement no longer blocks the event
+loop and concurrent requests overlap their I/O. Pool settings can be tuned
+through environment variables; the defaults suit a single uvicorn worker
+talking to a local MySQL server.
+"""
+
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+SQLALCHEMY_DATABASE_URL = os.environ.get(
+    "DATABASE_URL", "mysql+aiomysql://root:@localhost/mysafety"
+)
+
+# Keep pool_size + max_overflow below MySQL's max_connections divided by the
+# number of workers, otherwise extra workers fail to connect under load.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+
+engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"charset": "utf8mb4"},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    # MySQL drops idle connections after wait_timeout (8h by default)
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+Base = declarative_base()
+
+
+async def get_db():
+    """FastAPI dependency yielding an AsyncSession"""
+    async with SessionLocal() as db:
+        yield db
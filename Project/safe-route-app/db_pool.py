@@ -0,0 +1,160 @@
+"""
+Thread-safe MySQL connection pool for the Flask app.
+
+mysql.connector.pooling raises immediately when the pool is exhausted and
+never recycles connections, so this small pool adds blocking waits with a
+timeout, a liveness check on checkout, age-based recycling and counters that
+can be exposed on a stats endpoint.
+"""
+
+import queue
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolTimeoutError(Error):
+    """Raised when no connection became free within the wait timeout"""
+
+
+class _PooledConnection:
+    """A raw connection plus the bookkeeping the pool needs"""
+
+    __slots__ = ("connection", "created_at", "last_used_at")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+
+class ConnectionPool:
+    def __init__(self, size=10, wait_timeout=10.0, recycle_seconds=1800,
+                 health_check_idle_seconds=30, **connect_args):
+        """
+        size: maximum number of open connections
+        wait_timeout: seconds to wait for a free connection before failing
+        recycle_seconds: connections older than this are reopened on checkout
+        health_check_idle_seconds: ping connections idle for longer than this
+        connect_args: passed to mysql.connector.connect
+        """
+        self.size = size
+        self.wait_timeout = wait_timeout
+        self.recycle_seconds = recycle_seconds
+        self.health_check_idle_seconds = health_check_idle_seconds
+        self.connect_args = connect_args
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+
+        # Counters for the stats endpoint
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _open(self):
+        return _PooledConnection(mysql.connector.connect(**self.connect_args))
+
+    def _discard(self, pooled):
+        with self._lock:
+            self._opened -= 1
+        try:
+            pooled.connection.close()
+        except Error:
+            pass
+
+    def _is_healthy(self, pooled):
+        """Ping connections that have been idle a while, reconnecting if needed"""
+        if time.monotonic() - pooled.last_used_at < self.health_check_idle_seconds:
+            return True
+        try:
+            pooled.connection.ping(reconnect=True, attempts=1, delay=0)
+            return True
+        except Error:
+            with self._lock:
+                self._failed_health_checks += 1
+            return False
+
+    def acquire(self):
+        """Borrow a connection, opening a new one while under the size limit"""
+        started = time.monotonic()
+        pooled = None
+        while pooled is None:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._opened < self.size
+                    if can_open:
+                        self._opened += 1
+                if can_open:
+                    try:
+                        pooled = self._open()
+                    except Error:
+                        with self._lock:
+                            self._opened -= 1
+                        raise
+                else:
+                    remaining = self.wait_timeout - (time.monotonic() - started)
+                    try:
+                        pooled = self._idle.get(timeout=max(remaining, 0))
+                    except queue.Empty:
+                        with self._lock:
+                            self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.wait_timeout}s"
+                        )
+
+            if time.monotonic() - pooled.created_at > self.recycle_seconds:
+                self._discard(pooled)
+                with self._lock:
+                    self._recycled += 1
+                pooled = None
+            elif not self._is_healthy(pooled):
+                self._discard(pooled)
+                pooled = None
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return pooled
+
+    def release(self, pooled):
+        """Return a borrowed connection, rolling back anything left open"""
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if pooled.connection.in_transaction:
+                pooled.connection.rollback()
+        except Error:
+            self._discard(pooled)
+            return
+        pooled.last_used_at = time.monotonic()
+        self._idle.put(pooled)
+
+    def stats(self):
+        """Utilization and wait-time counters"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "idle": self._opened - self._in_use,
+                "utilization": self._in_use / self.size if self.size else 0.0,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "failed_health_checks": self._failed_health_checks,
+                "avg_wait_ms": (self._total_wait / self._checkouts * 1000) if self._checkouts else 0.0,
+                "max_wait_ms": self._max_wait * 1000,
+            }
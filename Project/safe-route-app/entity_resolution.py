@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Offline entity resolution for victim and criminal records.
+
+Years of per-report inserts have left the same person under several IDs.
+This job finds them without comparing every pair:
+
+1. Features: each name becomes a 64-value MinHash signature of its
+   trigrams (the same trigrams as name_index). Signatures are computed in
+   a process pool. DOB, gender and phone are encoded as integer arrays.
+2. Blocking: records are only compared within a block. A block is an LSH
+   band of the signature (16 bands of 4 values, so names with trigram
+   Jaccard around 0.5 and above collide), the same DOB plus initial, or
+   the same phone number. Oversized blocks are skipped.
+3. Scoring: candidate pairs are scored in vectorised batches across the
+   pool, combining estimated name similarity with DOB/phone agreement and
+   conflict penalties. A name match alone can only ever be a suggestion.
+4. Output: pairs above --merge-threshold are clustered with union-find.
+   Each cluster maps to its lowest ID in person_canonical. Pairs between
+   the thresholds go to person_merge_suggestion for review; suggestions
+   already reviewed are kept.
+
+    python entity_resolution.py --kind all --workers 8
+    python entity_resolution.py --kind victim --dry-run
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pymysql
+import pymysql.cursors
+
+from name_index import normalize, trigrams
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'mysafety'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', ''),
+}
+
+PEOPLE_QUERIES = {
+    "victim": "SELECT victim_id, full_name, dob, gender, phone_number FROM victim ORDER BY victim_id",
+    "criminal": "SELECT criminal_id, full_name, dob, gender, NULL FROM criminal ORDER BY criminal_id",
+}
+
+NUM_PERM = 64
+BANDS = 16                      # BANDS * ROWS_PER_BAND == NUM_PERM
+ROWS_PER_BAND = NUM_PERM // BANDS
+MAX_BLOCK_SIZE = 500            # larger blocks are too unspecific to be worth n^2 comparisons
+PAIR_BATCH = 200_000
+SIGNATURE_CHUNK = 20_000
+# a * h stays below 2**63 for a < 2**31 and 32-bit h, so the arithmetic fits in uint64
+MERSENNE_PRIME = (1 << 31) - 1
+EMPTY_HASH = MERSENNE_PRIME     # larger than any real hash value
+
+DEFAULT_MERGE_THRESHOLD = 0.85
+DEFAULT_SUGGEST_THRESHOLD = 0.65
+# Without a DOB or phone match, the score is capped below the merge threshold
+NAME_ONLY_CAP = 0.8
+
+_rng = np.random.default_rng(20240501)
+_PERM_A = _rng.integers(1, MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+
+
+# -------------------
+#  Features
+# -------------------
+def minhash(name):
+    """MinHash signature (uint32[NUM_PERM]) of a name's trigrams; all EMPTY_HASH when empty"""
+    grams = trigrams(name)
+    if not grams:
+        return np.full(NUM_PERM, EMPTY_HASH, dtype=np.uint32)
+    # crc32 rather than hash(): it must agree across worker processes
+    hashes = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+    product = (_PERM_A[:, None] * hashes + _PERM_B[:, None]) % np.uint64(MERSENNE_PRIME)
+    return product.min(axis=1).astype(np.uint32)
+
+
+def signatures(names):
+    """Signatures for a chunk of names; runs in a worker process"""
+    out = np.empty((len(names), NUM_PERM), dtype=np.uint32)
+    for row, name in enumerate(names):
+        out[row] = minhash(name)
+    return out
+
+
+def phone_key(phone):
+    digits = "".join(ch for ch in str(phone or "") if ch.isdigit())
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def load_people(kind):
+    """Stream one people table into column arrays"""
+    ids, names, dobs, genders, phones = [], [], [], [], []
+    connection = pymysql.connect(**DB_CONFIG, charset="utf8mb4", cursorclass=pymysql.cursors.SSCursor)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(PEOPLE_QUERIES[kind])
+            for person_id, full_name, dob, gender, phone in cursor:
+                ids.append(person_id)
+                names.append(full_name or "")
+                dobs.append(dob.toordinal() if isinstance(dob, date) else -1)
+                genders.append({"M": 1, "F": 2}.get((gender or "").upper()[:1], 0))
+                phones.append(phone_key(phone))
+    finally:
+        connection.close()
+    return {
+        "ids": np.array(ids, dtype=np.int64),
+        "names": names,
+        "dob": np.array(dobs, dtype=np.int32),
+        "gender": np.array(genders, dtype=np.int8),
+        "phones": phones,
+    }
+
+
+# -------------------
+#  Blocking
+# -------------------
+def _pairs_from_groups(order, sorted_keys):
+    """Candidate pairs (i < j) inside each run of equal keys, skipping oversized runs"""
+    if len(order) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(order)]))
+    pairs = []
+    for start, end in zip(starts, ends):
+        size = end - start
+        if size < 2 or size > MAX_BLOCK_SIZE:
+            continue
+        members = np.sort(order[start:end])
+        left, right = np.triu_indices(size, k=1)
+        pairs.append(np.stack((members[left], members[right]), axis=1))
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+
+def _pairs_for_keys(keys, valid):
+    """Pairs of records sharing an integer key, among records where valid is True"""
+    index = np.flatnonzero(valid)
+    order = index[np.argsort(keys[index], kind="stable")]
+    return _pairs_from_groups(order, keys[order])
+
+
+def candidate_pairs(people, sigs, has_name):
+    """Unique candidate pairs from LSH bands, DOB + initial and phone blocks"""
+    blocks = []
+    for band in range(BANDS):
+        # Fold the band's values into one 64-bit key (wrapping multiply-add)
+        keys = np.zeros(len(sigs), dtype=np.uint64)
+        for column in range(band * ROWS_PER_BAND, (band + 1) * ROWS_PER_BAND):
+            keys = keys * np.uint64(0x9E3779B97F4A7C15) + sigs[:, column]
+        blocks.append(_pairs_for_keys(keys.view(np.int64), has_name))
+
+    initials = np.array([ord(normalize(n)[:1] or " ") for n in people["names"]], dtype=np.int64)
+    blocks.append(_pairs_for_keys(people["dob"].astype(np.int64) * 256 + initials, people["dob"] >= 0))
+
+    phone_ids = {}
+    phone_keys = np.array([phone_ids.setdefault(p, len(phone_ids)) if p else -1 for p in people["phones"]],
+                          dtype=np.int64)
+    blocks.append(_pairs_for_keys(phone_keys, phone_keys >= 0))
+
+    pairs = np.concatenate(blocks)
+    if not len(pairs):
+        return pairs
+    n = len(people["ids"])
+    encoded = np.unique(pairs[:, 0] * n + pairs[:, 1])
+    return np.stack((encoded // n, encoded % n), axis=1)
+
+
+# -------------------
+#  Scoring (worker side)
+# -------------------
+_features = None
+
+
+def _init_worker(features):
+    global _features
+    _features = features
+
+
+def score_pairs(pairs, suggest_threshold):
+    """Score a batch of (i, j) pairs; returns the rows at or above suggest_threshold as (i, j, score)"""
+    f = _features
+    i, j = pairs[:, 0], pairs[:, 1]
+    name_sim = (f["sigs"][i] == f["sigs"][j]).mean(axis=1) * (f["has_name"][i] & f["has_name"][j])
+
+    dob_both = (f["dob"][i] >= 0) & (f["dob"][j] >= 0)
+    dob_match = dob_both & (f["dob"][i] == f["dob"][j])
+    phone_both = (f["phone"][i] >= 0) & (f["phone"][j] >= 0)
+    phone_match = phone_both & (f["phone"][i] == f["phone"][j])
+    gender_conflict = (f["gender"][i] > 0) & (f["gender"][j] > 0) & (f["gender"][i] != f["gender"][j])
+
+    # Weighted agreement over the evidence both records actually have
+    weight = 0.6 + 0.25 * dob_both + 0.15 * phone_both
+    score = (0.6 * name_sim + 0.25 * dob_match + 0.15 * phone_match) / weight
+    score = np.where(dob_match | phone_match, score, np.minimum(score, NAME_ONLY_CAP))
+    score -= 0.3 * (dob_both & ~dob_match) + 0.2 * gender_conflict
+
+    keep = score >= suggest_threshold
+    return np.column_stack((i[keep], j[keep])), score[keep]
+
+
+# -------------------
+#  Clustering and output
+# -------------------
+def canonical_ids(ids, merge_pairs):
+    """Union-find over index pairs; returns {person_id: canonical_id} for non-canonical members"""
+    parent = list(range(len(ids)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in merge_pairs:
+        ra, rb = find(int(a)), find(int(b))
+        if ra != rb:
+            # Records are in id order, so the smaller index is the older record
+            parent[max(ra, rb)] = min(ra, rb)
+    return {int(ids[x]): int(ids[find(x)]) for x in range(len(ids)) if find(x) != x}
+
+
+def _insert_many(cursor, sql_prefix, rows, columns_per_row, batch=1000):
+    placeholder = "(" + ", ".join(["%s"] * columns_per_row) + ")"
+    for start in range(0, len(rows), batch):
+        chunk = rows[start:start + batch]
+        cursor.execute(sql_prefix + ", ".join([placeholder] * len(chunk)), [v for row in chunk for v in row])
+
+
+def write_results(kind, run_id, mapping, suggestions):
+    """Replace this kind's canonical mapping and pending suggestions in one transaction"""
+    connection = pymysql.connect(**DB_CONFIG, charset="utf8mb4", autocommit=False)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM person_canonical WHERE kind = %s", (kind,))
+            _insert_many(
+                cursor, "INSERT INTO person_canonical (kind, person_id, canonical_id, run_id) VALUES ",
+                [(kind, person_id, canonical, run_id) for person_id, canonical in mapping.items()], 4
+            )
+            # Reviewed suggestions (accepted/rejected) survive re-runs; INSERT IGNORE skips them
+            cursor.execute("DELETE FROM person_merge_suggestion WHERE kind = %s AND status = 'pending'", (kind,))
+            _insert_many(
+                cursor,
+                "INSERT IGNORE INTO person_merge_suggestion (kind, person_id, candidate_id, score, run_id) VALUES ",
+                [(kind, a, b, round(score, 4), run_id) for a, b, score in suggestions], 5
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def resolve_kind(kind, workers, merge_threshold, suggest_threshold, dry_run=False, progress=print):
+    started = time.perf_counter()
+    people = load_people(kind)
+    n = len(people["ids"])
+    progress(f"{kind}: loaded {n} records")
+    if n < 2:
+        return {"kind": kind, "records": n, "pairs": 0, "merged": 0, "suggestions": 0}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = [people["names"][s:s + SIGNATURE_CHUNK] for s in range(0, n, SIGNATURE_CHUNK)]
+        sigs = np.concatenate(list(pool.map(signatures, chunks)))
+    has_name = (sigs != EMPTY_HASH).any(axis=1)
+    progress(f"{kind}: signatures in {time.perf_counter() - started:.1f}s")
+
+    pairs = candidate_pairs(people, sigs, has_name)
+    progress(f"{kind}: {len(pairs)} candidate pairs")
+
+    phone_ids = {}
+    features = {
+        "sigs": sigs,
+        "has_name": has_name,
+        "dob": people["dob"],
+        "gender": people["gender"],
+        "phone": np.array([phone_ids.setdefault(p, len(phone_ids)) if p else -1 for p in people["phones"]],
+                          dtype=np.int64),
+    }
+    # With fork the workers inherit the feature arrays copy-on-write instead of unpickling them
+    if "fork" in multiprocessing.get_all_start_methods():
+        _init_worker(features)
+        pool_args = {"mp_context": multiprocessing.get_context("fork")}
+    else:
+        pool_args = {"initializer": _init_worker, "initargs": (features,)}
+    matched, scores = [], []
+    with ProcessPoolExecutor(max_workers=workers, **pool_args) as pool:
+        batches = [pairs[s:s + PAIR_BATCH] for s in range(0, len(pairs), PAIR_BATCH)]
+        for batch_pairs, batch_scores in pool.map(score_pairs, batches, [suggest_threshold] * len(batches)):
+            matched.append(batch_pairs)
+            scores.append(batch_scores)
+    matched = np.concatenate(matched) if matched else np.empty((0, 2), dtype=np.int64)
+    scores = np.concatenate(scores) if scores else np.empty(0)
+
+    merge = scores >= merge_threshold
+    mapping = canonical_ids(people["ids"], matched[merge])
+    ids = people["ids"]
+    suggestions = [(int(ids[a]), int(ids[b]), float(s)) for (a, b), s in zip(matched[~merge], scores[~merge])]
+
+    if not dry_run:
+        write_results(kind, uuid.uuid4().hex, mapping, suggestions)
+    summary = {
+        "kind": kind,
+        "records": n,
+        "pairs": int(len(pairs)),
+        "merged": len(mapping),
+        "suggestions": len(suggestions),
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    progress(json.dumps(summary))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=["victim", "criminal", "all"], default="all")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--merge-threshold", type=float, default=DEFAULT_MERGE_THRESHOLD)
+    parser.add_argument("--suggest-threshold", type=float, default=DEFAULT_SUGGEST_THRESHOLD)
+    parser.add_argument("--dry-run", action="store_true", help="score and report without writing")
+    args = parser.parse_args()
+
+    for kind in (["victim", "criminal"] if args.kind == "all" else [args.kind]):
+        resolve_kind(kind, args.workers, args.merge_threshold, args.suggest_threshold, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
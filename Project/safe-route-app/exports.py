@@ -0,0 +1,53 @@
+"""
+Streaming table exports (NDJSON and CSV).
+
+Rows are read through an unbuffered server-side cursor and encoded one chunk
+at a time, so memory use stays flat however many rows the export covers.
+"""
+
+import csv
+import io
+from datetime import date
+
+from serialization import dumps
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+async def stream_rows(engine, statement, params, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of rows from a server-side cursor.
+
+    AsyncConnection.stream() sets stream_results, which makes aiomysql use an
+    SSCursor: the server sends rows as they are consumed instead of the
+    driver buffering the whole result set. The connection stays checked out
+    until the generator is exhausted or closed.
+    """
+    async with engine.connect() as conn:
+        result = await conn.stream(statement, params)
+        async for partition in result.partitions(chunk_size):
+            yield partition
+
+
+async def ndjson_chunks(partitions, columns):
+    """Encode each chunk of rows as newline-delimited JSON objects keyed by columns"""
+    async for rows in partitions:
+        yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _csv_value(value):
+    """Render dates as ISO 8601 like the JSON endpoints do"""
+    return value.isoformat() if isinstance(value, date) else value
+
+
+async def csv_chunks(partitions, columns):
+    """Encode a header line, then each chunk of rows as CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode("utf-8")
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
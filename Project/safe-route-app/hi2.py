@@ -1,18 +1,34 @@
 import random
 import datetime
+import functools
+from contextlib import asynccontextmanager
 from typing import List
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import math
+import numpy as np
+
+from response_compression import CompressionMiddleware
+from geo import KM_PER_DEGREE, haversine_pairwise
+from incidents import incident_arrays, mock_incidents
+from shared_arrays import SharedArrays
 
 # -------------------
 #  App Initialization
 # -------------------
+@asynccontextmanager
+async def lifespan(app):
+    # Uvicorn does not accept requests until this returns, so the first request
+    # never pays for attaching to (or building) the incident data
+    load_incidents()
+    yield
+
 app = FastAPI(
     title="Safe Route API",
     description="API for suggesting safe travel routes in Bangladesh based on crime data.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS to allow the front-end to communicate with this backend
@@ -28,6 +44,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# The heatmap array is by far the largest part of each response
+app.add_middleware(CompressionMiddleware)
 
 # -------------------
 #  Pydantic Models (Data Validation)
@@ -43,39 +61,33 @@ class RouteRequest(BaseModel):
 # -------------------
 #  Mock Database & Logic
 # -------------------
-# This data simulates what you would query from your database.
-mock_incidents = []
-crime_types = {
-    "Theft": {"severity": 2, "description": "Minor property crime."},
-    "Robbery": {"severity": 5, "description": "Theft involving force."},
-    "Assault": {"severity": 7, "description": "Physical harm or threat."},
-    "Harassment": {"severity": 4, "description": "Unwanted and intimidating behavior."}
-}
-
-for _ in range(300):
-    lat = 23.8103 + (random.random() - 0.5) * 0.2
-    lon = 90.4125 + (random.random() - 0.5) * 0.2
-    mock_incidents.append({
-        "location": [lat, lon],
-        "crime_type": random.choice(list(crime_types.keys())),
-        "victim_gender": random.choice(["Female", "Male", "Any"]),
-        "time_of_day": random.choice(["day", "night"]),
-    })
-
-def calculate_risk_score(route_points: List[List[float]], gender: str, time_of_day: str) -> int:
-    risk_score = 0
-    proximity_threshold = 0.005 # about 500 meters
-    for point in route_points:
-        for incident in mock_incidents:
-            dist = math.sqrt((point[0] - incident['location'][0])**2 + (point[1] - incident['location'][1])**2)
-            if dist < proximity_threshold:
-                incident_risk = crime_types[incident['crime_type']]['severity']
-                if incident['time_of_day'] == time_of_day:
-                    incident_risk *= 1.5
-                if incident['victim_gender'] == gender or incident['victim_gender'] == "Any":
-                    incident_risk *= 1.5
-                risk_score += incident_risk
-    return int(risk_score)
+# Published to shared memory by shared_builder.py when run through serve.py,
+# so every worker maps one copy instead of building its own
+incident_store = SharedArrays("incidents")
+
+@functools.lru_cache(maxsize=None)
+def _local_incidents():
+    """Per-process fallback when no builder has published the incidents"""
+    return incident_arrays(mock_incidents())
+
+def load_incidents():
+    """Incident columns by name: the shared, read-only mapping if published, else a local build"""
+    snapshot = incident_store.get()
+    return snapshot.arrays if snapshot is not None else _local_incidents()
+
+def calculate_risk_score(route_points: List[List[float]], gender: str, time_of_day: str, incidents) -> int:
+    # The old 0.005-degree threshold, as km along a meridian (about 556 m)
+    proximity_threshold_km = 0.005 * KM_PER_DEGREE
+    points = np.asarray(route_points, dtype=float)
+    # (route points x incidents) distance matrix, one pass instead of nested loops
+    distances = haversine_pairwise(points[:, 0], points[:, 1], incidents["lats"], incidents["lons"])
+    hits_per_incident = np.count_nonzero(distances < proximity_threshold_km, axis=0)
+
+    # A writable copy: the shared mapping is read-only
+    incident_risk = np.array(incidents["severity"])
+    incident_risk[incidents["time_of_day"] == time_of_day] *= 1.5
+    incident_risk[(incidents["victim_gender"] == gender) | (incidents["victim_gender"] == "Any")] *= 1.5
+    return int(np.dot(hits_per_incident, incident_risk))
 
 def generate_road_route(start_coords, end_coords, num_points=15):
     route = [start_coords]
@@ -106,6 +118,8 @@ async def suggest_route(request: RouteRequest):
         
     time_of_day = "night" if (request_hour >= 19 or request_hour < 6) else "day"
     start_point = [request.start_lat, request.start_lon]
+    # One snapshot for the whole request, so both routes and the heatmap see the same incidents
+    incidents = load_incidents()
 
     # 2. Define two potential routes to evaluate
     route_options = {
@@ -126,7 +140,7 @@ async def suggest_route(request: RouteRequest):
     # 3. Generate path coordinates and calculate risk for each option
     for key, route_info in route_options.items():
         route_info["coords"] = generate_road_route(start_point, route_info["end_point"])
-        route_info["risk_score"] = calculate_risk_score(route_info["coords"], request.gender, time_of_day)
+        route_info["risk_score"] = calculate_risk_score(route_info["coords"], request.gender, time_of_day, incidents)
 
     # 4. Choose the best route (lowest risk score)
     best_route_key = min(route_options, key=lambda k: route_options[k]['risk_score'])
@@ -145,14 +159,10 @@ async def suggest_route(request: RouteRequest):
         theme = {"bg": "bg-red-100 dark:bg-red-900/50", "border": "border-red-500", "text": "text-red-800"}
 
     # 6. Generate the heatmap data, weighted by the current context
-    heatmap_points = []
-    for incident in mock_incidents:
-        intensity = 0.5
-        if incident['time_of_day'] == time_of_day:
-            intensity += 0.3
-        if incident['victim_gender'] == request.gender or incident['victim_gender'] == "Any":
-            intensity += 0.3
-        heatmap_points.append([incident['location'][0], incident['location'][1], intensity])
+    intensity = np.full(len(incidents["lats"]), 0.5)
+    intensity[incidents["time_of_day"] == time_of_day] += 0.3
+    intensity[(incidents["victim_gender"] == request.gender) | (incidents["victim_gender"] == "Any")] += 0.3
+    heatmap_points = np.column_stack((incidents["lats"], incidents["lons"], intensity)).tolist()
 
     # 7. Return the final data package to the front-end
     return {
@@ -0,0 +1,52 @@
+"""
+Incident data for the route scorer (hi2.py), as records and as column arrays.
+
+The columns are what the scorer and heatmap read. They are plain fixed-width
+numpy arrays, never object arrays, so shared_builder.py can publish them to
+shared memory for every worker to map.
+
+The mock records come from a fixed seed, so every build (the builder's
+republishes and a worker's local fallback) yields the same incidents and a
+route's risk score does not change between requests.
+"""
+
+import os
+import random
+
+import numpy as np
+
+MOCK_INCIDENTS_SEED = int(os.environ.get("MOCK_INCIDENTS_SEED", 42))
+
+crime_types = {
+    "Theft": {"severity": 2, "description": "Minor property crime."},
+    "Robbery": {"severity": 5, "description": "Theft involving force."},
+    "Assault": {"severity": 7, "description": "Physical harm or threat."},
+    "Harassment": {"severity": 4, "description": "Unwanted and intimidating behavior."}
+}
+
+
+def mock_incidents(count=300, seed=MOCK_INCIDENTS_SEED):
+    """Simulates what you would query from your database; the same seed gives the same incidents"""
+    rng = random.Random(seed)
+    incidents = []
+    for _ in range(count):
+        lat = 23.8103 + (rng.random() - 0.5) * 0.2
+        lon = 90.4125 + (rng.random() - 0.5) * 0.2
+        incidents.append({
+            "location": [lat, lon],
+            "crime_type": rng.choice(list(crime_types.keys())),
+            "victim_gender": rng.choice(["Female", "Male", "Any"]),
+            "time_of_day": rng.choice(["day", "night"]),
+        })
+    return incidents
+
+
+def incident_arrays(records):
+    """Column-wise copy of the incidents so the risk scorer can work on whole arrays"""
+    return {
+        "lats": np.array([incident['location'][0] for incident in records], dtype=float),
+        "lons": np.array([incident['location'][1] for incident in records], dtype=float),
+        "severity": np.array([crime_types[incident['crime_type']]['severity'] for incident in records], dtype=float),
+        "time_of_day": np.array([incident['time_of_day'] for incident in records], dtype=str),
+        "victim_gender": np.array([incident['victim_gender'] for incident in records], dtype=str),
+    }
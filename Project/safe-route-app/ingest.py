@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Historical crime ingestion pipeline for large CSV/NDJSON station exports.
+
+The file is streamed in batches; a process pool parses and validates each
+batch while the parent loads the previous one. Locations are matched with
+the same rules as the API (location_resolver.LocationCache: district, area
+name, coordinates within LOCATION_TOLERANCE_M) against the location table
+and the batch itself, and only unmatched ones are inserted. Crimes go into
+`crime` with one multi-row INSERT per batch, which keeps their new ids
+consecutive for change_log, and the daily stats are updated from the
+parsed batch in memory.
+
+Each batch commits together with its checkpoint row in `import_job`, so an
+interrupted import resumes from the last committed row:
+
+    python ingest.py stations_2019.csv --job-id dhaka-2019
+    python ingest.py stations_2019.csv --job-id dhaka-2019   # resumes
+"""
+
+import argparse
+import csv
+import json
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import pymysql
+
+import change_feed
+import crime_stats
+from location_resolver import LocationCache
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'mysafety'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', ''),
+}
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Columns expected in each input row
+INPUT_FIELDS = [
+    "district_id", "area_name", "city", "latitude", "longitude",
+    "crime_type", "description", "date_time", "status", "station_id",
+]
+
+def ensure_tables(cursor):
+    """Create the checkpoint table if it does not exist"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS import_job (
+            job_id VARCHAR(64) PRIMARY KEY,
+            source VARCHAR(255) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'running',
+            rows_committed BIGINT NOT NULL DEFAULT 0,
+            rows_rejected BIGINT NOT NULL DEFAULT 0,
+            error TEXT,
+            started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+
+# -------------------
+#  Parsing (runs in worker processes)
+# -------------------
+def _parse_datetime(value):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return datetime.fromisoformat(value)
+
+
+def parse_row(raw):
+    """Validate and normalise one input row; raises ValueError when it is unusable"""
+    for field in ("district_id", "area_name", "city", "latitude", "longitude", "crime_type", "date_time", "status"):
+        if raw.get(field) in (None, ""):
+            raise ValueError(f"missing {field}")
+    latitude = round(float(raw["latitude"]), 8)
+    longitude = round(float(raw["longitude"]), 8)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("coordinates out of range")
+    station_id = raw.get("station_id")
+    return {
+        "district_id": int(raw["district_id"]),
+        "area_name": str(raw["area_name"]).strip(),
+        "city": str(raw["city"]).strip(),
+        "latitude": latitude,
+        "longitude": longitude,
+        "crime_type": str(raw["crime_type"]).strip(),
+        "description": raw.get("description") or None,
+        "date_time": _parse_datetime(str(raw["date_time"]).strip()),
+        "status": str(raw["status"]).strip(),
+        "station_id": int(station_id) if station_id not in (None, "") else None,
+    }
+
+
+def parse_batch(batch):
+    """Parse a (first_row_no, raw_rows) batch; returns (first_row_no, row_count, parsed, rejects)"""
+    first_row_no, raw_rows = batch
+    parsed, rejects = [], []
+    for row_no, raw in enumerate(raw_rows, start=first_row_no):
+        try:
+            parsed.append((row_no, parse_row(raw)))
+        except (ValueError, TypeError) as e:
+            rejects.append({"row_no": row_no, "error": str(e), "row": raw})
+    return first_row_no, len(raw_rows), parsed, rejects
+
+
+# -------------------
+#  Reading
+# -------------------
+def read_rows(path, file_format):
+    """Yield raw row dicts from a CSV or NDJSON file without loading it"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_batches(path, file_format, batch_size, skip_rows):
+    """Yield (first_row_no, raw_rows) batches, skipping rows already committed"""
+    rows = read_rows(path, file_format)
+    # Row numbers are 1-based positions in the file
+    for _ in islice(rows, skip_rows):
+        pass
+    row_no = skip_rows + 1
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield row_no, batch
+        row_no += len(batch)
+
+
+# -------------------
+#  Loading
+# -------------------
+class LocationDeduper:
+    """
+    location_id for each parsed row, through a LocationCache of the location table.
+
+    Rows that match nothing are matched against each other, then inserted
+    together. Unlike the API, no named lock is taken per (district, area),
+    so a crime reported for a brand new place while an import runs can
+    still produce a duplicate; `location_resolver.py compact` merges those.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.cache = LocationCache()
+        cursor.execute(
+            "SELECT location_id, district_id, area_name, latitude, longitude FROM location ORDER BY location_id"
+        )
+        for row in cursor.fetchall():
+            self.cache.add(*row)
+
+    def resolve(self, rows, id_step):
+        """
+        Assign a location_id to every parsed row, inserting unmatched locations in one statement.
+
+        Returns (location_ids, new_rows); call commit(new_rows) once the
+        surrounding transaction has committed.
+        """
+        # Unmatched rows are indexed under their position in `new` until they have ids
+        batch, new, location_ids = LocationCache(self.cache.tolerance_km * 1000), [], []
+        for _, r in rows:
+            location = (r["district_id"], r["area_name"], r["latitude"], r["longitude"])
+            location_id = self.cache.find(*location)
+            if location_id is None:
+                position = batch.find(*location)
+                if position is None:
+                    position = len(new)
+                    new.append(r)
+                    batch.add(position, *location)
+                location_ids.append(-1 - position)
+            else:
+                location_ids.append(location_id)
+
+        new_rows = []
+        if new:
+            now = datetime.utcnow()
+            self.cursor.execute(
+                "INSERT INTO location (district_id, area_name, city, latitude, longitude, created_at) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(new)),
+                [value for r in new
+                 for value in (r["district_id"], r["area_name"], r["city"], r["latitude"], r["longitude"], now)]
+            )
+            # A multi-row INSERT gets consecutive auto-increment values
+            first_id = self.cursor.lastrowid
+            new_rows = [
+                (first_id + i * id_step, r["district_id"], r["area_name"], r["latitude"], r["longitude"])
+                for i, r in enumerate(new)
+            ]
+        location_ids = [new_rows[-1 - i][0] if i < 0 else i for i in location_ids]
+        return location_ids, new_rows
+
+    def commit(self, new_rows):
+        for row in new_rows:
+            self.cache.add(*row)
+
+
+def commit_batch(connection, cursor, deduper, job_id, parsed, last_row_no, rejected, id_step):
+    """Insert, roll up and checkpoint one batch in a single transaction"""
+    new_locations = []
+    try:
+        if parsed:
+            location_ids, new_locations = deduper.resolve(parsed, id_step)
+            # A multi-row VALUES insert is a "simple insert": InnoDB gives it consecutive
+            # ids (step @@auto_increment_increment) in every innodb_autoinc_lock_mode, as
+            # in bulk_import, so the new crime ids are known without reading them back
+            now = datetime.utcnow()
+            cursor.execute(
+                "INSERT INTO crime (crime_type, description, date_time, location_id, station_id, case_status, created_at) "
+                "VALUES " + ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(parsed)),
+                [value for (_, r), location_id in zip(parsed, location_ids)
+                 for value in (r["crime_type"], r["description"], r["date_time"], location_id,
+                               r["station_id"] if r["station_id"] is not None else 1, r["status"], now)]
+            )
+            first_crime_id = cursor.lastrowid
+            change_feed.record_changes_sync(
+                cursor, "crime", [first_crime_id + i * id_step for i in range(len(parsed))], "insert"
+            )
+            crime_stats.apply_deltas_sync(cursor, [
+                ((r["date_time"], r["district_id"], r["crime_type"], r["status"]), 1) for _, r in parsed
+            ])
+        cursor.execute(
+            "UPDATE import_job SET rows_committed = %s, rows_rejected = rows_rejected + %s WHERE job_id = %s",
+            (last_row_no, rejected, job_id)
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    # Only remember new locations once they are durable
+    deduper.commit(new_locations)
+
+
+def run_import(path, job_id=None, file_format=None, batch_size=DEFAULT_BATCH_SIZE,
+               workers=None, progress=print):
+    """Run (or resume) an import job and return its summary"""
+    file_format = file_format or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    job_id = job_id or uuid.uuid4().hex
+    connection = pymysql.connect(**DB_CONFIG, charset="utf8mb4", autocommit=False)
+    rejects_path = f"{path}.{job_id}.rejects.ndjson"
+    try:
+        cursor = connection.cursor()
+        ensure_tables(cursor)
+        cursor.execute(
+            "INSERT INTO import_job (job_id, source) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE status = 'running', error = NULL",
+            (job_id, os.path.abspath(path))
+        )
+        cursor.execute("SELECT rows_committed FROM import_job WHERE job_id = %s", (job_id,))
+        skip_rows = cursor.fetchone()[0]
+        cursor.execute("SELECT @@auto_increment_increment")
+        id_step = cursor.fetchone()[0]
+        connection.commit()
+        if skip_rows:
+            progress(f"Resuming job {job_id} after row {skip_rows}")
+
+        deduper = LocationDeduper(cursor)
+        committed, rejected_total = skip_rows, 0
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool, \
+                open(rejects_path, "a", encoding="utf-8") as rejects_file:
+            in_flight = deque()
+            batches = read_batches(path, file_format, batch_size, skip_rows)
+
+            def submit_next():
+                batch = next(batches, None)
+                if batch is not None:
+                    in_flight.append(pool.submit(parse_batch, batch))
+
+            # Keep a bounded number of batches in flight so memory stays flat
+            for _ in range(workers * 2):
+                submit_next()
+            while in_flight:
+                first_row_no, count, parsed, rejects = in_flight.popleft().result()
+                submit_next()
+                for reject in rejects:
+                    rejects_file.write(json.dumps(reject, default=str) + "\n")
+                last_row_no = first_row_no + count - 1
+                commit_batch(connection, cursor, deduper, job_id, parsed, last_row_no, len(rejects), id_step)
+                committed = last_row_no
+                rejected_total += len(rejects)
+                progress(f"Committed through row {committed} ({rejected_total} rejected)")
+
+        cursor.execute("UPDATE import_job SET status = 'completed' WHERE job_id = %s", (job_id,))
+        connection.commit()
+        return {"job_id": job_id, "status": "completed", "rows_committed": committed,
+                "rows_rejected": rejected_total, "rejects_file": rejects_path}
+    except Exception as e:
+        connection.rollback()
+        cursor = connection.cursor()
+        cursor.execute("UPDATE import_job SET status = 'failed', error = %s WHERE job_id = %s", (str(e), job_id))
+        connection.commit()
+        raise
+    finally:
+        connection.close()
+
+
+def get_job(job_id):
+    """Return the checkpoint row of an import job, or None"""
+    connection = pymysql.connect(**DB_CONFIG, charset="utf8mb4", cursorclass=pymysql.cursors.DictCursor)
+    try:
+        with connection.cursor() as cursor:
+            ensure_tables(cursor)
+            cursor.execute("SELECT * FROM import_job WHERE job_id = %s", (job_id,))
+            return cursor.fetchone()
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or NDJSON file with columns: " + ", ".join(INPUT_FIELDS))
+    parser.add_argument("--job-id", help="reuse to resume an interrupted import")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    summary = run_import(
+        args.path, job_id=args.job_id, file_format=args.format, batch_size=args.batch_size,
+        workers=args.workers
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
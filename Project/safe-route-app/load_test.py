@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test for the FastAPI endpoints.
+
+Fires requests from a thread pool and reports throughput and latency so the
+numbers can be compared before and after a change, e.g.
+
+    python load_test.py --path /api/crimes --concurrency 1 8 32
+
+--compression compares response encodings instead: bytes on the wire per
+encoding as served, and the CPU time to compress each response body, e.g.
+
+    python load_test.py --compression --path /api/crimes /api/complaints
+    python load_test.py --compression --base-url http://localhost:8001 \
+        --path /suggest-route --body '{"start_lat": 23.75, "start_lon": 90.39, "gender": "Female"}'
+"""
+
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from response_compression import CODECS
+
+BASE_URL = "http://localhost:8000"
+
+
+def run_level(url, concurrency, total_requests):
+    """Send total_requests GETs with the given concurrency and collect timings"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def one_request(_):
+        started = time.perf_counter()
+        response = session.get(url)
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_request, range(total_requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "throughput": total_requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def compression_benchmark(url, body=None, repeats=20):
+    """Wire bytes and compression CPU per encoding for one endpoint"""
+    def fetch(encoding):
+        headers = {"Accept-Encoding": encoding}
+        if body is None:
+            response = requests.get(url, headers=headers, stream=True)
+        else:
+            response = requests.post(url, json=body, headers=headers, stream=True)
+        return response, response.raw.read(decode_content=False)
+
+    response, raw = fetch("identity")
+    response.raise_for_status()
+    rows = [{"encoding": "identity", "wire_bytes": len(raw), "ratio": 1.0, "cpu_ms": 0.0}]
+    for codec in CODECS:
+        response, wire = fetch(codec.name)
+        served = response.headers.get("Content-Encoding", "identity")
+        started = time.process_time()
+        for _ in range(repeats):
+            codec.compress(raw)
+        rows.append({
+            "encoding": codec.name if served == codec.name else f"{codec.name} (served {served})",
+            "wire_bytes": len(wire),
+            "ratio": len(raw) / len(wire) if wire else 0.0,
+            "cpu_ms": (time.process_time() - started) / repeats * 1000,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--path", nargs="+", default=["/test-db"])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--compression", action="store_true", help="compare response encodings instead")
+    parser.add_argument("--body", help="JSON body; sends POST instead of GET (--compression only)")
+    args = parser.parse_args()
+
+    if args.compression:
+        body = json.loads(args.body) if args.body else None
+        print(f"{'path':<24} {'encoding':<22} {'wire bytes':>12} {'ratio':>7} {'cpu ms':>8}")
+        try:
+            for path in args.path:
+                for row in compression_benchmark(args.base_url + path, body):
+                    print(f"{path:<24} {row['encoding']:<22} {row['wire_bytes']:>12} "
+                          f"{row['ratio']:>7.1f} {row['cpu_ms']:>8.2f}")
+        except requests.exceptions.ConnectionError:
+            print(f"Error: Could not connect to server. Make sure FastAPI is running on {args.base_url}")
+        return
+
+    url = args.base_url + args.path[0]
+    print(f"Load testing {url}")
+    print(f"{'conc':>6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'errors':>8}")
+    try:
+        for concurrency in args.concurrency:
+            stats = run_level(url, concurrency, args.requests)
+            print(f"{stats['concurrency']:>6} {stats['throughput']:>10.1f} {stats['p50_ms']:>10.1f} "
+                  f"{stats['p95_ms']:>10.1f} {stats['errors']:>8}")
+    except requests.exceptions.ConnectionError:
+        print(f"Error: Could not connect to server. Make sure FastAPI is running on {args.base_url}")
+
+
+if __name__ == "__main__":
+    main()
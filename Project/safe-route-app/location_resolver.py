@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Location interning: reuse an existing location row instead of inserting a
+duplicate for every crime report.
+
+Two reports share a location when they have the same district, the same
+area name (case and spacing ignored) and coordinates within
+LOCATION_TOLERANCE_M of each other. Reports without coordinates match on
+district and area alone.
+
+LocationCache indexes the location table in memory by geohash cell, so a
+lookup only looks at the query's cell and its eight neighbours, plus
+(district_id, area) for rows without coordinates. A cache hit costs no
+query at all.
+
+On a miss, resolve() takes a MySQL named lock for the (district, area)
+pair and re-checks the table with a locking read before inserting. A
+concurrent report from another worker therefore either finds the row or
+waits for it. The lock is held until release() runs after the
+surrounding transaction ends.
+
+`python location_resolver.py compact [--dry-run]` merges the duplicates
+that already exist: it repoints crime, policestation and panic_event at
+one surviving row per cluster and deletes the rest.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+
+from geo import haversine_distance
+
+logger = logging.getLogger(__name__)
+
+LOCATION_TOLERANCE_M = float(os.environ.get("LOCATION_TOLERANCE_M", 50))
+LOCK_TIMEOUT_SECONDS = 5
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+METRES_PER_DEGREE = 111_320
+# Cells shrink east-west with cos(latitude); sizing them for 60 degrees keeps
+# the coverage guarantee anywhere the app is likely to run
+COVERAGE_LATITUDE_FACTOR = 0.5
+
+# Tables with a location_id foreign key, repointed by the compaction job
+LOCATION_REFERENCES = ("crime", "policestation", "panic_event")
+
+
+def geohash(lat, lon, precision):
+    """Standard base-32 geohash of a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def _cell_size(precision):
+    """(lat degrees, lon degrees) spanned by one geohash cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def precision_for(tolerance_m):
+    """
+    Finest geohash precision whose cells are at least tolerance_m on each side.
+
+    The 3 x 3 block of such cells around a point always covers the whole
+    tolerance circle (precision 7, ~153 m cells, for the default 50 m).
+    Raises ValueError for a tolerance no precision can cover.
+    """
+    for precision in range(12, 0, -1):
+        dlat, dlon = _cell_size(precision)
+        if min(dlat, dlon * COVERAGE_LATITUDE_FACTOR) * METRES_PER_DEGREE >= tolerance_m:
+            return precision
+    raise ValueError(f"Location tolerance too large: {tolerance_m} m")
+
+
+def neighbourhood(lat, lon, precision):
+    """Geohashes of the cell containing the point and its eight neighbours"""
+    dlat, dlon = _cell_size(precision)
+    return {
+        geohash(max(-90.0, min(90.0, lat + i * dlat)), ((lon + j * dlon + 180.0) % 360.0) - 180.0, precision)
+        for i in (-1, 0, 1) for j in (-1, 0, 1)
+    }
+
+
+def area_key(area_name):
+    return " ".join((area_name or "").lower().split())
+
+
+def _district(district_id):
+    return int(district_id) if district_id is not None else None
+
+
+def _coords(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return float(latitude), float(longitude)
+
+
+class LocationCache:
+    """In-memory index of location rows by geohash cell and by (district, area)"""
+
+    def __init__(self, tolerance_m=LOCATION_TOLERANCE_M):
+        self.tolerance_km = tolerance_m / 1000.0
+        self.precision = precision_for(tolerance_m)
+        self._by_cell = {}        # geohash -> [(location_id, district_id, area, lat, lon)]
+        self._no_coords = {}      # (district_id, area) -> location_id
+        self.loaded = False
+
+    def add(self, location_id, district_id, area_name, latitude, longitude):
+        district_id = _district(district_id)
+        coords = _coords(latitude, longitude)
+        area = area_key(area_name)
+        if coords is None:
+            self._no_coords.setdefault((district_id, area), location_id)
+        else:
+            self._by_cell.setdefault(geohash(*coords, self.precision), []).append((location_id, district_id, area, *coords))
+
+    def find(self, district_id, area_name, latitude, longitude):
+        """Closest matching location_id within tolerance, or None"""
+        district_id = _district(district_id)
+        coords = _coords(latitude, longitude)
+        area = area_key(area_name)
+        if coords is None:
+            return self._no_coords.get((district_id, area))
+        return self._closest(
+            (row for cell in neighbourhood(*coords, self.precision) for row in self._by_cell.get(cell, ())
+             if row[1] == district_id and row[2] == area),
+            coords
+        )
+
+    def _closest(self, rows, coords):
+        best_id, best_km = None, self.tolerance_km
+        for location_id, _, _, lat, lon in rows:
+            km = haversine_distance(coords[0], coords[1], lat, lon)
+            # Strictly closer wins, so equal distances keep the oldest row
+            if km < best_km or (best_id is None and km == best_km):
+                best_id, best_km = location_id, km
+        return best_id
+
+    async def load(self, engine, chunk_size=10000):
+        async with engine.connect() as conn:
+            result = await conn.stream(text(
+                "SELECT location_id, district_id, area_name, latitude, longitude FROM location ORDER BY location_id"
+            ))
+            async for rows in result.partitions(chunk_size):
+                for row in rows:
+                    self.add(*row)
+        self.loaded = True
+
+
+@dataclass
+class Resolution:
+    location_id: int
+    lock_name: Optional[str] = None
+    new_row: Optional[tuple] = None    # cache entry to add once committed
+
+
+def _lock_name(district_id, area):
+    # GET_LOCK names are limited to 64 characters
+    return "location:" + hashlib.sha1(f"{district_id}|{area}".encode()).hexdigest()
+
+
+class LocationResolver:
+    """Find-or-create for location rows, backed by a LocationCache"""
+
+    def __init__(self, cache=None):
+        self.cache = cache or LocationCache()
+
+    async def resolve(self, conn, location):
+        """
+        Return a Resolution for a location dict inside the caller's transaction.
+
+        Always pass the result to release() once that transaction has
+        committed or rolled back.
+        """
+        district_id = location["district_id"]
+        latitude, longitude = location.get("latitude"), location.get("longitude")
+        location_id = self.cache.find(district_id, location["area_name"], latitude, longitude)
+        if location_id is not None:
+            return Resolution(location_id)
+
+        lock_name = _lock_name(_district(district_id), area_key(location["area_name"]))
+        locked = (await conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"), {"name": lock_name, "timeout": LOCK_TIMEOUT_SECONDS}
+        )).scalar()
+        if locked != 1:
+            raise TimeoutError(f"Timed out waiting to resolve location {location['area_name']!r}")
+        try:
+            location_id, new_row = await self._find_or_insert(conn, location)
+        except BaseException:
+            await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+            raise
+        return Resolution(location_id, lock_name, new_row)
+
+    async def _find_or_insert(self, conn, location):
+        """Under the named lock: reuse a matching row from the table, else insert one"""
+        district_id = location["district_id"]
+        latitude, longitude = location.get("latitude"), location.get("longitude")
+        # Locking read: sees rows committed by whoever held the lock before us, even
+        # if this transaction's snapshot is older. The lock is keyed on area_key(),
+        # so compare case- and space-insensitively here too; the SQL filter is a
+        # superset (all spaces dropped) and check.find() applies area_key exactly.
+        # Shared locks, so concurrent crime inserts referencing these rows go on.
+        rows = (await conn.execute(
+            text("""
+                SELECT location_id, district_id, area_name, latitude, longitude
+                FROM location
+                WHERE district_id = :district_id AND REPLACE(LOWER(area_name), ' ', '') = :area_compact
+                FOR SHARE
+            """),
+            {"district_id": district_id, "area_compact": area_key(location["area_name"]).replace(" ", "")}
+        )).fetchall()
+        check = LocationCache(self.cache.tolerance_km * 1000)
+        for row in rows:
+            check.add(*row)
+        location_id = check.find(district_id, location["area_name"], latitude, longitude)
+        if location_id is not None:
+            # Inserted by another worker since our cache was loaded
+            return location_id, tuple(next(row for row in rows if row[0] == location_id))
+
+        result = await conn.execute(
+            text("""
+                INSERT INTO location (district_id, area_name, city, latitude, longitude, created_at)
+                VALUES (:district_id, :area_name, :city, :latitude, :longitude, :created_at)
+            """),
+            {
+                "district_id": district_id,
+                "area_name": location["area_name"],
+                "city": location["city"],
+                "latitude": latitude,
+                "longitude": longitude,
+                "created_at": datetime.utcnow()
+            }
+        )
+        location_id = result.lastrowid
+        return location_id, (location_id, district_id, location["area_name"], latitude, longitude)
+
+    async def release(self, conn, resolution, committed):
+        """Release the named lock and, if the transaction committed, remember the row"""
+        if resolution is None:
+            return
+        if committed and resolution.new_row:
+            self.cache.add(*resolution.new_row)
+        if resolution.lock_name:
+            try:
+                await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": resolution.lock_name})
+            except Exception:
+                # A broken connection is discarded by the pool, which ends the session and its locks
+                logger.exception("Could not release location lock %s", resolution.lock_name)
+
+
+location_resolver = LocationResolver()
+
+
+# -------------------
+#  Compaction of existing duplicates
+# -------------------
+def plan_merges(rows, tolerance_m=LOCATION_TOLERANCE_M):
+    """Map duplicate location_id -> surviving location_id; rows must be in location_id order"""
+    cache, merges = LocationCache(tolerance_m), {}
+    for location_id, district_id, area_name, latitude, longitude in rows:
+        keep = cache.find(district_id, area_name, latitude, longitude)
+        if keep is None:
+            cache.add(location_id, district_id, area_name, latitude, longitude)
+        else:
+            merges[location_id] = keep
+    return merges
+
+
+async def compact(engine, dry_run=False, batch_size=1000):
+    """Merge duplicate locations in one transaction; returns the number of rows merged"""
+    async with engine.begin() as conn:
+        rows = (await conn.execute(text(
+            "SELECT location_id, district_id, area_name, latitude, longitude "
+            "FROM location ORDER BY location_id FOR UPDATE"
+        ))).fetchall()
+        merges = plan_merges(rows)
+        if dry_run or not merges:
+            return len(merges)
+
+        await conn.execute(text(
+            "CREATE TEMPORARY TABLE location_merge (dup_id INT PRIMARY KEY, keep_id INT NOT NULL)"
+        ))
+        pairs = list(merges.items())
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start:start + batch_size]
+            params = {}
+            for i, (dup_id, keep_id) in enumerate(chunk):
+                params[f"d{i}"], params[f"k{i}"] = dup_id, keep_id
+            await conn.execute(
+                text("INSERT INTO location_merge (dup_id, keep_id) VALUES "
+                     + ", ".join(f"(:d{i}, :k{i})" for i in range(len(chunk)))),
+                params
+            )
+        for table in LOCATION_REFERENCES:
+            await conn.execute(text(f"""
+                UPDATE {table} t JOIN location_merge m ON t.location_id = m.dup_id
+                SET t.location_id = m.keep_id
+            """))
+        await conn.execute(text("DELETE l FROM location l JOIN location_merge m ON l.location_id = m.dup_id"))
+        await conn.execute(text("DROP TEMPORARY TABLE location_merge"))
+        return len(merges)
+
+
+async def _compact_command(dry_run):
+    from database import engine
+
+    merged = await compact(engine, dry_run=dry_run)
+    await engine.dispose()
+    print(f"{'Would merge' if dry_run else 'Merged'} {merged} duplicate locations")
+    if merged and not dry_run:
+        print("Restart the API (or POST /api/locations/cache/reload) so its location cache drops the merged ids")
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if not args or args[0] != "compact" or not set(args[1:]) <= {"--dry-run"}:
+        sys.exit("usage: python location_resolver.py compact [--dry-run]")
+    asyncio.run(_compact_command("--dry-run" in args))
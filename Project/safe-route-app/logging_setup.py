@@ -0,0 +1,183 @@
+"""
+Structured, non-blocking logging for the FastAPI services.
+
+Log calls on the event loop only build a LogRecord and put it on an
+in-memory queue (QueueHandler); a QueueListener thread formats it as one
+JSON line and does the actual write. Every record carries the ID of the
+request that produced it.
+
+Configuration comes from the environment:
+
+    LOG_LEVEL=INFO                           root level
+    LOG_LEVELS=main=DEBUG,bulk_import=WARNING per-module overrides
+    LOG_DEBUG_SAMPLE_RATE=1.0                share of DEBUG records kept
+
+With DEBUG off, logger.debug() returns after a cached level check, so
+callers should pass values as arguments (logger.debug("id %s", x)) rather
+than pre-formatting them.
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+
+from serialization import dumps
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else came in through extra= and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener = None
+# Renders tracebacks in StructuredQueueHandler.prepare()
+_traceback_formatter = logging.Formatter()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID while still on the caller's context"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Keep only a share of DEBUG records; pass sample=False in extra= to always keep one"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1 or not getattr(record, "sample", True):
+            return True
+        return random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request_id, message and extra fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != "sample":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Already formatted by StructuredQueueHandler
+            entry["exc_info"] = record.exc_text
+        return _encode(entry)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps the traceback out of the message.
+
+    The stock prepare() folds the formatted traceback into msg and drops
+    exc_info. This one formats the message and the traceback separately
+    (the traceback must be rendered before the record leaves the thread),
+    so JSONFormatter can still write it as its own field.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+
+def _encode(entry):
+    """Serialize a log entry, falling back to str() for values orjson rejects"""
+    try:
+        return dumps(entry).decode("utf-8")
+    except TypeError:
+        return dumps({key: str(value) for key, value in entry.items()}).decode("utf-8")
+
+
+def _parse_levels(spec):
+    """'main=DEBUG,ingest=WARNING' -> {'main': 'DEBUG', 'ingest': 'WARNING'}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(stream=None):
+    """Install the queue handler on the root logger and start the writer thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = StructuredQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSampler(float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 1.0))))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    for name, level in _parse_levels(os.environ.get("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware binding a request ID to every log record of a request.
+
+    Reuses the caller's X-Request-ID when present and echoes it back on the
+    response. Written as plain ASGI rather than BaseHTTPMiddleware so it does
+    not add a task and a body-streaming wrapper to every request.
+    """
+
+    def __init__(self, app, header="x-request-id"):
+        self.app = app
+        self.header = header.encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
@@ -1,15 +1,132 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, BackgroundTasks, Header, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
-from sqlalchemy import create_engine, text
-import hashlib
-from datetime import datetime
+from fastapi.responses import HTMLResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import text
+from contextlib import asynccontextmanager
+from datetime import date, datetime
 from typing import Optional, List
+import asyncio
 import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from operator import itemgetter
 
-app = FastAPI()
+import auth
+import case_status
+import change_feed
+# assignment, name_index and location_resolver pull in numpy (via geo); they stay
+# eager imports because warm_up builds all three right after startup anyway
+from assignment import AssignmentError, assignment_engine
+import crime_stats
+import search
+from name_index import name_index
+from location_resolver import LocationCache, location_resolver
+from response_compression import CompressionMiddleware
+from bulk_import import DEFAULT_CHUNK_SIZE, BulkImportError, bulk_insert_crimes
+from database import engine
+from exports import csv_chunks, ndjson_chunks, stream_rows
+from logging_setup import RequestIdMiddleware, configure_logging
+from rate_limit import RateLimitMiddleware
+from serialization import FastJSONResponse, rows_to_dicts
+from reference_cache import reference_cache
+from page_cache import page_cache
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, build_where, decode_cursor, encode_cursor, keyset_condition, split_page
+)
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Caches the API cannot serve without; /ready stays 503 until these have loaded
+REQUIRED_CACHES = ("reference_data", "location_cache")
+WARM_UP_RETRY_SECONDS = float(os.environ.get("WARM_UP_RETRY_SECONDS", "5"))
+
+async def _load_pages():
+    """Read and compress pages and static files once, off the event loop"""
+    count = await run_in_threadpool(page_cache.load)
+    logger.info("Page cache loaded: %s files", count)
+
+async def _load_reference_data():
+    """Warm the reference-data cache so the first requests skip the database"""
+    await reference_cache.load(engine)
+
+async def _load_name_index():
+    seconds = await name_index.load(engine)
+    logger.info("Name index loaded: %s names in %.1fs", len(name_index), seconds)
+
+async def _load_location_cache():
+    await location_resolver.cache.load(engine)
+    logger.info("Location cache loaded")
+
+async def _load_assignment_engine():
+    await assignment_engine.ensure_loaded(engine)
+
+# name -> loader; a failed optional cache is not fatal (pages are read on first
+# request, the name index and assignment engine load on first use)
+WARM_UP_LOADERS = {
+    "pages": _load_pages,
+    "reference_data": _load_reference_data,
+    "location_cache": _load_location_cache,
+    "name_index": _load_name_index,
+    "assignment_engine": _load_assignment_engine,
+}
+
+async def _warm(app, name):
+    app.state.caches[name] = "loading"
+    try:
+        await WARM_UP_LOADERS[name]()
+    except Exception:
+        logger.exception("Warm-up of %s failed", name)
+        app.state.caches[name] = "failed"
+        return False
+    app.state.caches[name] = "ready"
+    return True
+
+async def warm_up(app):
+    """Fill every cache once, then retry the required ones until they load"""
+    started = time.perf_counter()
+    await asyncio.gather(*(_warm(app, name) for name in WARM_UP_LOADERS))
+    logger.info("Warm-up finished in %.1fs: %s", time.perf_counter() - started, app.state.caches)
+    while True:
+        pending = [name for name in REQUIRED_CACHES if app.state.caches[name] != "ready"]
+        if not pending:
+            break
+        await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+        await asyncio.gather(*(_warm(app, name) for name in pending))
+    app.state.ready = True
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Startup does no I/O of its own: the caches warm in the background and
+    /ready reports 503 until the required ones have loaded, so a worker is up
+    in milliseconds and the load balancer only routes to it once it is warm.
+    The schema is the migration tool's job (migrations.py), never the app's.
+    """
+    app.state.ready = False
+    app.state.caches = {name: "pending" for name in WARM_UP_LOADERS}
+    app.state.warm_up_task = asyncio.create_task(warm_up(app))
+    yield
+    app.state.warm_up_task.cancel()
+    await engine.dispose()
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
+def _rate_limit_user(token):
+    """User id behind a bearer token for the per-user buckets, from the session cache only"""
+    session = auth.cached_session(token)
+    return session["user_id"] if session else None
+
+# Innermost, so 429s still get CORS headers and a request ID but no route code runs
+app.add_middleware(RateLimitMiddleware, resolve_user=_rate_limit_user)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,11 +136,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SQLALCHEMY_DATABASE_URL = "mysql+pymysql://root:@localhost/mysafety"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"charset": "utf8mb4"})
+# Pages and static files are served from memory, precompressed (see page_cache.py)
+page_cache.add_file("/admin", "admin_dashboard.html")
+page_cache.add_file("/test-crime", "test_crime.html")
+page_cache.add_directory("/static", "static")
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+def serve_page(url_path, request, missing_message):
+    asset = page_cache.get(url_path)
+    if asset is None:
+        return HTMLResponse(content=missing_message, status_code=404)
+    return asset.response(
+        request.headers.get("accept-encoding"),
+        request.headers.get("if-none-match"),
+        head=request.method == "HEAD"
+    )
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the required caches have loaded; reports every cache's state"""
+    ready = getattr(app.state, "ready", False)
+    content = {"ready": ready, "caches": getattr(app.state, "caches", {})}
+    if not ready:
+        return FastJSONResponse(status_code=503, content=content)
+    return content
 
 # Pydantic Models
 class UserCreate(BaseModel):
@@ -43,6 +178,11 @@ class CrimeData(BaseModel):
     weapon: Optional[dict] = None
     witness: Optional[dict] = None
 
+class BulkCrimeImport(BaseModel):
+    crimes: List[CrimeData]
+    mode: str = Field("atomic", pattern="^(atomic|per_record)$")
+    chunk_size: int = Field(DEFAULT_CHUNK_SIZE, ge=1, le=2000)
+
 class ComplaintVerification(BaseModel):
     complaint_id: int
     status: str
@@ -52,30 +192,84 @@ class CaseAssignment(BaseModel):
     crime_id: int
     duty_role: str
 
+class AutoAssignment(BaseModel):
+    crime_id: int
+    duty_role: str = "investigating_officer"
+
 class StatusUpdate(BaseModel):
     crime_id: int
     new_status: str
     notes: str
     changed_by: int
 
-def hash_password(password: str):
-    return hashlib.sha256(password.encode()).hexdigest()
+class StatusChange(BaseModel):
+    crime_id: int
+    new_status: str
+    notes: str = ""
+
+class BatchStatusUpdate(BaseModel):
+    updates: List[StatusChange] = Field(..., min_length=1, max_length=case_status.MAX_BATCH_SIZE)
+    changed_by: int
+
+async def current_user(authorization: Optional[str] = Header(None)):
+    """Resolve 'Authorization: Bearer <token>' to the session, usually without a DB query"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    session = await auth.get_session(engine, token)
+    if session is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session", headers={"WWW-Authenticate": "Bearer"})
+    return session
+
+def apply_cursor(cursor, timestamp_column, id_column, conditions, params):
+    """Add the keyset condition for a page cursor, rejecting malformed cursors with 400"""
+    if not cursor:
+        return
+    try:
+        params["cursor_ts"], params["cursor_id"] = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    conditions.append(keyset_condition(timestamp_column, id_column, params["cursor_ts"]))
+
+def add_date_range(column, date_from, date_to, conditions, params):
+    """Add an inclusive-start, exclusive-end date range on column"""
+    if date_from:
+        conditions.append(f"{column} >= :date_from")
+        params["date_from"] = date_from
+    if date_to:
+        conditions.append(f"{column} < :date_to")
+        params["date_to"] = date_to
+
+def crime_filters(district_id, crime_type, status, date_from, date_to):
+    """WHERE conditions and parameters shared by the crime list queries"""
+    conditions, params = [], {}
+    if district_id is not None:
+        conditions.append("l.district_id = :district_id")
+        params["district_id"] = district_id
+    if crime_type:
+        conditions.append("c.crime_type = :crime_type")
+        params["crime_type"] = crime_type
+    if status:
+        conditions.append("c.status = :status")
+        params["status"] = status
+    add_date_range("c.created_at", date_from, date_to, conditions, params)
+    return conditions, params
 
 # ==================== EXISTING USER ENDPOINTS ====================
 
 @app.post("/register")
 async def register_user(user: UserCreate):
-    hashed_password = hash_password(user.password)
-    with engine.connect() as conn:
+    hashed_password = await auth.hash_password_async(user.password)
+    async with engine.connect() as conn:
         # Check if email exists
-        result = conn.execute(
+        result = (await conn.execute(
             text("SELECT user_id FROM appuser WHERE email = :email"),
             {"email": user.email}
-        ).fetchone()
+        )).fetchone()
         if result:
             raise HTTPException(status_code=400, detail="Email already registered")
         # Insert new user
-        conn.execute(
+        await conn.execute(
             text("""
                 INSERT INTO appuser (email, username, password_hash, role_hint, status, created_at)
                 VALUES (:email, :username, :password_hash, :role_hint, :status, :created_at)
@@ -89,79 +283,95 @@ async def register_user(user: UserCreate):
                 "created_at": datetime.utcnow()
             }
         )
-        conn.commit()
-        print(f"Registered new user: {user.email}")
+        await conn.commit()
+        logger.info("Registered new user %s", user.email)
     return {"message": "User registered successfully"}
 
 @app.post("/login")
 async def login_user(user: UserLogin):
-    with engine.connect() as conn:
-        result = conn.execute(
+    async with engine.connect() as conn:
+        result = (await conn.execute(
             text("SELECT * FROM appuser WHERE email = :email"),
             {"email": user.email}
-        ).mappings().fetchone()
-        if not result:
-            raise HTTPException(status_code=400, detail="Email not registered")
-        stored_password = result["password_hash"]
-        if stored_password != hash_password(user.password):
-            raise HTTPException(status_code=400, detail="Incorrect password")
-        return {
-            "message": "Login successful",
-            "user": {
-                "email": result["email"],
-                "username": result["username"],
-                "role_hint": result["role_hint"],
-                "station_id": result["station_id"],
-                "status": result["status"],
-                "created_at": result["created_at"]
-            }
+        )).mappings().fetchone()
+    if not result:
+        raise HTTPException(status_code=400, detail="Email not registered")
+    # The KDF runs on the hashing pool with no connection checked out
+    matches, needs_rehash = await auth.verify_password_async(user.password, result["password_hash"])
+    if not matches:
+        raise HTTPException(status_code=400, detail="Incorrect password")
+    new_hash = await auth.hash_password_async(user.password) if needs_rehash else None
+    async with engine.connect() as conn:
+        if new_hash:
+            # Upgrade legacy SHA-256 (or weaker scrypt) hashes now that we know the password
+            await conn.execute(
+                text("UPDATE appuser SET password_hash = :password_hash WHERE user_id = :user_id"),
+                {"password_hash": new_hash, "user_id": result["user_id"]}
+            )
+        token, session = await auth.create_session(conn, result)
+        await conn.commit()
+    auth.remember_session(token, session)
+    logger.info("Login success for %s", user.email)
+    return {
+        "message": "Login successful",
+        "token": token,
+        "expires_at": session["expires_at"],
+        "user": {
+            "email": result["email"],
+            "username": result["username"],
+            "role_hint": result["role_hint"],
+            "station_id": result["station_id"],
+            "status": result["status"],
+            "created_at": result["created_at"]
         }
-        print(f"Login success for {user.email}")
+    }
+
+@app.post("/logout")
+async def logout_user(authorization: Optional[str] = Header(None), session: dict = Depends(current_user)):
+    """Revoke the bearer token used for this request"""
+    async with engine.connect() as conn:
+        await auth.delete_session(conn, authorization.partition(" ")[2])
+        await conn.commit()
+    return {"message": "Logged out"}
+
+@app.get("/api/me")
+async def get_me(session: dict = Depends(current_user)):
+    """Return the signed-in user from the session cache"""
+    return {"success": True, "user": session}
 
 # ==================== ADMIN DASHBOARD ENDPOINTS ====================
 
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_dashboard():
-    """Serve the admin dashboard HTML"""
-    try:
-        with open("admin_dashboard.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="Admin dashboard not found", status_code=404)
+async def admin_dashboard(request: Request):
+    """Serve the admin dashboard HTML from the page cache"""
+    return serve_page("/admin", request, "Admin dashboard not found")
 
 @app.post("/api/crimes")
 async def create_crime(crime_data: CrimeData):
     """Create a new crime with all related information using hardcoded SQL"""
+    await reference_cache.ensure_loaded(engine)
+    if not reference_cache.has_district(crime_data.location.get("district_id")):
+        raise HTTPException(status_code=400, detail=f"Unknown district_id: {crime_data.location.get('district_id')}")
+    station_id = crime_data.crime.get("station_id", 1)  # Default to station 1
+    if not reference_cache.has_station(station_id):
+        raise HTTPException(status_code=400, detail=f"Unknown station_id: {station_id}")
     try:
-        print(f"Received crime data: {crime_data}")
+        if logger.isEnabledFor(logging.DEBUG):  # skip dumping the payload unless it will be logged
+            logger.debug("Received crime data", extra={"payload": crime_data.model_dump()})
         
-        with engine.connect() as conn:
+        async with engine.connect() as conn:
             # Start transaction
-            trans = conn.begin()
+            trans = await conn.begin()
+            resolution = None
             
             try:
-                # Step 1: Insert Location
-                print("Inserting location...")
-                location_result = conn.execute(
-                    text("""
-                        INSERT INTO location (district_id, area_name, city, latitude, longitude, created_at)
-                        VALUES (:district_id, :area_name, :city, :latitude, :longitude, :created_at)
-                    """),
-                    {
-                        "district_id": crime_data.location["district_id"],
-                        "area_name": crime_data.location["area_name"],
-                        "city": crime_data.location["city"],
-                        "latitude": crime_data.location["latitude"],
-                        "longitude": crime_data.location["longitude"],
-                        "created_at": datetime.utcnow()
-                    }
-                )
-                location_id = location_result.lastrowid
-                print(f"Location inserted with ID: {location_id}")
+                # Step 1: Reuse a matching location or insert it
+                resolution = await location_resolver.resolve(conn, crime_data.location)
+                location_id = resolution.location_id
+                logger.debug("Using location ID %s", location_id)
                 
                 # Step 2: Insert Crime
-                print("Inserting crime...")
-                crime_result = conn.execute(
+                crime_result = await conn.execute(
                     text("""
                         INSERT INTO crime (crime_type, description, date_time, location_id, station_id, case_status, created_at)
                         VALUES (:crime_type, :description, :date_time, :location_id, :station_id, :case_status, :created_at)
@@ -171,19 +381,23 @@ async def create_crime(crime_data: CrimeData):
                         "description": crime_data.crime["description"],
                         "date_time": crime_data.crime["date_time"],
                         "location_id": location_id,
-                        "station_id": crime_data.crime.get("station_id", 1),  # Default to station 1
+                        "station_id": station_id,
                         "case_status": crime_data.crime["status"],  # Map status to case_status
                         "created_at": datetime.utcnow()
                     }
                 )
                 crime_id = crime_result.lastrowid
-                print(f"Crime inserted with ID: {crime_id}")
+                logger.debug("Crime inserted with ID %s", crime_id)
+                await change_feed.record_change(conn, "crime", crime_id, "insert")
+                await crime_stats.apply_deltas(conn, [(
+                    (crime_data.crime["date_time"], crime_data.location["district_id"],
+                     crime_data.crime["crime_type"], crime_data.crime["status"]), 1
+                )])
                 
                 # Step 3: Insert Victim (if provided)
                 victim_id = None
                 if crime_data.victim and crime_data.victim.get("full_name"):
-                    print("Inserting victim...")
-                    victim_result = conn.execute(
+                    victim_result = await conn.execute(
                         text("""
                             INSERT INTO victim (full_name, dob, gender, address, phone_number, injury_details, created_at)
                             VALUES (:full_name, :dob, :gender, :address, :phone_number, :injury_details, :created_at)
@@ -199,10 +413,10 @@ async def create_crime(crime_data: CrimeData):
                         }
                     )
                     victim_id = victim_result.lastrowid
-                    print(f"Victim inserted with ID: {victim_id}")
+                    logger.debug("Victim inserted with ID %s", victim_id)
                     
                     # Insert Crime-Victim relationship
-                    conn.execute(
+                    await conn.execute(
                         text("""
                             INSERT INTO crime_victim (crime_id, victim_id, harm_level)
                             VALUES (:crime_id, :victim_id, :harm_level)
@@ -214,11 +428,23 @@ async def create_crime(crime_data: CrimeData):
                         }
                     )
                 
-                # Step 4: Insert Criminal (if provided)
+                # Step 4: Link an existing criminal by ID, or insert a new one (if provided)
                 criminal_id = None
-                if crime_data.criminal and crime_data.criminal.get("full_name"):
-                    print("Inserting criminal...")
-                    criminal_result = conn.execute(
+                possible_matches = []
+                if crime_data.criminal and crime_data.criminal.get("criminal_id"):
+                    criminal_id = (await conn.execute(
+                        text("SELECT criminal_id FROM criminal WHERE criminal_id = :criminal_id"),
+                        {"criminal_id": crime_data.criminal["criminal_id"]}
+                    )).scalar()
+                    if criminal_id is None:
+                        raise ValueError(f"Unknown criminal_id: {crime_data.criminal['criminal_id']}")
+                elif crime_data.criminal and crime_data.criminal.get("full_name"):
+                    # Existing people this suspect may duplicate, for the client to review and merge
+                    possible_matches = name_index.search(
+                        " ".join(filter(None, (crime_data.criminal["full_name"], crime_data.criminal.get("alias_name")))),
+                        kind="criminal", limit=5
+                    )
+                    criminal_result = await conn.execute(
                         text("""
                             INSERT INTO criminal (full_name, alias_name, dob, gender, address, marital_status, past_record, created_at)
                             VALUES (:full_name, :alias_name, :dob, :gender, :address, :marital_status, :past_record, :created_at)
@@ -235,10 +461,11 @@ async def create_crime(crime_data: CrimeData):
                         }
                     )
                     criminal_id = criminal_result.lastrowid
-                    print(f"Criminal inserted with ID: {criminal_id}")
-                    
+                    logger.debug("Criminal inserted with ID %s", criminal_id)
+
+                if criminal_id is not None:
                     # Insert Crime-Criminal relationship
-                    conn.execute(
+                    await conn.execute(
                         text("""
                             INSERT INTO crime_criminal (crime_id, criminal_id, role)
                             VALUES (:crime_id, :criminal_id, :role)
@@ -253,8 +480,7 @@ async def create_crime(crime_data: CrimeData):
                 # Step 5: Insert Weapon (if provided)
                 weapon_id = None
                 if crime_data.weapon and crime_data.weapon.get("weapon_name"):
-                    print("Inserting weapon...")
-                    weapon_result = conn.execute(
+                    weapon_result = await conn.execute(
                         text("""
                             INSERT INTO weapon (weapon_name, weapon_type, description, serial_number, created_at)
                             VALUES (:weapon_name, :weapon_type, :description, :serial_number, :created_at)
@@ -268,10 +494,10 @@ async def create_crime(crime_data: CrimeData):
                         }
                     )
                     weapon_id = weapon_result.lastrowid
-                    print(f"Weapon inserted with ID: {weapon_id}")
+                    logger.debug("Weapon inserted with ID %s", weapon_id)
                     
                     # Insert Crime-Weapon relationship
-                    conn.execute(
+                    await conn.execute(
                         text("""
                             INSERT INTO crime_weapon (crime_id, weapon_id, usage_desc)
                             VALUES (:crime_id, :weapon_id, :usage_desc)
@@ -286,8 +512,7 @@ async def create_crime(crime_data: CrimeData):
                 # Step 6: Insert Witness (if provided)
                 witness_id = None
                 if crime_data.witness and crime_data.witness.get("full_name"):
-                    print("Inserting witness...")
-                    witness_result = conn.execute(
+                    witness_result = await conn.execute(
                         text("""
                             INSERT INTO witness (full_name, phone_number, protection_flag)
                             VALUES (:full_name, :phone_number, :protection_flag)
@@ -299,10 +524,10 @@ async def create_crime(crime_data: CrimeData):
                         }
                     )
                     witness_id = witness_result.lastrowid
-                    print(f"Witness inserted with ID: {witness_id}")
+                    logger.debug("Witness inserted with ID %s", witness_id)
                     
                     # Insert Crime-Witness relationship
-                    conn.execute(
+                    await conn.execute(
                         text("""
                             INSERT INTO crime_witness (crime_id, witness_id, statement_status)
                             VALUES (:crime_id, :witness_id, :statement_status)
@@ -315,8 +540,17 @@ async def create_crime(crime_data: CrimeData):
                     )
                 
                 # Commit transaction
-                trans.commit()
-                print("Transaction committed successfully")
+                await trans.commit()
+                await location_resolver.release(conn, resolution, committed=True)
+                logger.info("Crime %s created", crime_id)
+
+                # Index new people only once they are committed
+                if criminal_id and not crime_data.criminal.get("criminal_id"):
+                    name_index.add("criminal", criminal_id, crime_data.criminal["full_name"], crime_data.criminal.get("alias_name"))
+                if victim_id:
+                    name_index.add("victim", victim_id, crime_data.victim["full_name"])
+                if witness_id:
+                    name_index.add("witness", witness_id, crime_data.witness["full_name"])
                 
                 return {
                     "success": True,
@@ -328,87 +562,198 @@ async def create_crime(crime_data: CrimeData):
                         "criminal_id": criminal_id,
                         "weapon_id": weapon_id,
                         "witness_id": witness_id
-                    }
+                    },
+                    "possible_matches": possible_matches
                 }
                 
             except Exception as e:
-                print(f"Error in transaction: {str(e)}")
-                trans.rollback()
+                logger.warning("Rolling back crime transaction: %s", e)
+                await trans.rollback()
+                await location_resolver.release(conn, resolution, committed=False)
                 raise e
                 
     except Exception as e:
-        print(f"Error creating crime: {str(e)}")
+        logger.exception("Error creating crime")
         return {
             "success": False,
             "error": str(e),
             "message": "Failed to create crime"
         }
 
+CRIME_LIST_SQL = """
+    SELECT c.crime_id, c.crime_type, c.description, c.date_time, c.status, c.created_at,
+           l.area_name, l.city, l.latitude, l.longitude,
+           d.district_name
+    FROM crime c
+    JOIN location l ON c.location_id = l.location_id
+    JOIN district d ON l.district_id = d.district_id
+    {where}
+    ORDER BY c.created_at DESC, c.crime_id DESC
+"""
+
+@app.post("/api/crimes/bulk")
+async def bulk_create_crimes(payload: BulkCrimeImport):
+    """Import many crimes with one multi-row INSERT per table per chunk"""
+    records = [crime.model_dump() for crime in payload.crimes]
+    resolutions = []
+    try:
+        async with engine.connect() as conn:
+            committed = False
+            try:
+                async with conn.begin():
+                    results, errors, stats = await bulk_insert_crimes(
+                        conn, records, location_resolver, resolutions,
+                        mode=payload.mode, chunk_size=payload.chunk_size
+                    )
+                committed = True
+            finally:
+                for resolution in resolutions:
+                    await location_resolver.release(conn, resolution, committed)
+    except BulkImportError as e:
+        return {
+            "success": False,
+            "mode": payload.mode,
+            "message": "Bulk import rolled back",
+            "errors": [{"index": e.index, "error": str(e)}]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for result in results:
+        record = records[result["index"]]
+        for kind in ("victim", "criminal", "witness"):
+            if result[f"{kind}_id"]:
+                person = record[kind]
+                name_index.add(kind, result[f"{kind}_id"], person["full_name"], person.get("alias_name"))
+
+    return {
+        "success": not errors,
+        "mode": payload.mode,
+        "stats": stats,
+        "results": results,
+        "errors": errors
+    }
+
+IMPORT_DIR = os.environ.get("IMPORT_DIR", "imports")
+JOB_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def save_upload(source, path):
+    """Copy an uploaded file to disk in chunks"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(source, out, length=1024 * 1024)
+
+@app.post("/api/imports")
+async def start_import(background_tasks: BackgroundTasks, file: UploadFile = File(...), job_id: Optional[str] = None):
+    """Upload a CSV/NDJSON file of historical crimes and ingest it in the background"""
+    # job_id becomes a file name and an import_job.job_id VARCHAR(64)
+    if job_id is not None and not JOB_ID_PATTERN.fullmatch(job_id):
+        raise HTTPException(status_code=400, detail="job_id must be 1-64 letters, digits, '_' or '-'")
+    job_id = job_id or uuid.uuid4().hex
+    extension = ".ndjson" if (file.filename or "").endswith((".ndjson", ".jsonl")) else ".csv"
+    path = os.path.join(IMPORT_DIR, job_id + extension)
+    await run_in_threadpool(save_upload, file.file, path)
+    # Sync background tasks run in the threadpool, off the event loop
+    import ingest  # pymysql and multiprocessing, only needed by the import endpoints
+    background_tasks.add_task(ingest.run_import, path, job_id=job_id, progress=lambda message: None)
+    return {"success": True, "job_id": job_id, "status_url": f"/api/imports/{job_id}"}
+
+@app.get("/api/imports/{job_id}")
+async def get_import(job_id: str):
+    """Progress of an ingestion job from its checkpoint row"""
+    import ingest
+    job = await run_in_threadpool(ingest.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return {"success": True, "job": job}
+
+# Column order of CRIME_LIST_SQL, used for export headers and NDJSON keys
+CRIME_COLUMNS = [
+    "crime_id", "crime_type", "description", "date_time", "status", "created_at",
+    "area_name", "city", "latitude", "longitude", "district_name",
+]
+
 @app.get("/api/crimes")
-async def get_crimes():
-    """Get all crimes using hardcoded SQL"""
+async def get_crimes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    district_id: Optional[int] = None,
+    crime_type: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Get crimes newest first, one keyset page at a time, using hardcoded SQL"""
+    conditions, params = crime_filters(district_id, crime_type, status, date_from, date_to)
+    apply_cursor(cursor, "c.created_at", "c.crime_id", conditions, params)
+    params["limit"] = limit + 1
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("""
-                    SELECT c.crime_id, c.crime_type, c.description, c.date_time, c.status, c.created_at,
-                           l.area_name, l.city, l.latitude, l.longitude,
-                           d.district_name
-                    FROM crime c
-                    JOIN location l ON c.location_id = l.location_id
-                    JOIN district d ON l.district_id = d.district_id
-                    ORDER BY c.created_at DESC
-                """)
-            ).fetchall()
-            
-            crimes = []
-            for row in result:
-                crime_dict = {
-                    "crime_id": row[0],
-                    "crime_type": row[1],
-                    "description": row[2],
-                    "date_time": row[3].isoformat() if row[3] else None,
-                    "status": row[4],
-                    "created_at": row[5].isoformat() if row[5] else None,
-                    "area_name": row[6],
-                    "city": row[7],
-                    "latitude": float(row[8]) if row[8] else None,
-                    "longitude": float(row[9]) if row[9] else None,
-                    "district_name": row[10]
-                }
-                crimes.append(crime_dict)
-            
-            return {"success": True, "crimes": crimes}
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(CRIME_LIST_SQL.format(where=build_where(conditions)) + " LIMIT :limit"),
+                params
+            )
+            rows, next_cursor = split_page(result.fetchall(), limit, itemgetter(5, 0))
+            crimes = rows_to_dicts(result.keys(), rows)
+            return FastJSONResponse({"success": True, "crimes": crimes, "next_cursor": next_cursor})
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/crimes/export")
+async def export_crimes(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    district_id: Optional[int] = None,
+    crime_type: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Stream every matching crime as NDJSON or CSV through a server-side cursor"""
+    conditions, params = crime_filters(district_id, crime_type, status, date_from, date_to)
+    statement = text(CRIME_LIST_SQL.format(where=build_where(conditions)))
+    partitions = stream_rows(engine, statement, params)
+    if format == "csv":
+        body, media_type = csv_chunks(partitions, CRIME_COLUMNS), "text/csv"
+    else:
+        body, media_type = ndjson_chunks(partitions, CRIME_COLUMNS), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="crimes.{format}"'}
+    )
+
 @app.get("/api/complaints")
-async def get_complaints():
-    """Get all complaints using hardcoded SQL"""
+async def get_complaints(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Get complaints newest first, one keyset page at a time, using hardcoded SQL"""
+    conditions, params = [], {}
+    if status:
+        conditions.append("status = :status")
+        params["status"] = status
+    add_date_range("reported_at", date_from, date_to, conditions, params)
+    apply_cursor(cursor, "reported_at", "complaint_id", conditions, params)
+    params["limit"] = limit + 1
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("""
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(f"""
                     SELECT complaint_id, reported_at, reporter_contact, description, channel, status
                     FROM complaint
-                    ORDER BY reported_at DESC
-                """)
-            ).fetchall()
-            
-            complaints = []
-            for row in result:
-                complaint_dict = {
-                    "complaint_id": row[0],
-                    "reported_at": row[1].isoformat() if row[1] else None,
-                    "reporter_contact": row[2],
-                    "description": row[3],
-                    "channel": row[4],
-                    "status": row[5]
-                }
-                complaints.append(complaint_dict)
-            
-            return {"success": True, "complaints": complaints}
+                    {build_where(conditions)}
+                    ORDER BY reported_at DESC, complaint_id DESC
+                    LIMIT :limit
+                """),
+                params
+            )
+            rows, next_cursor = split_page(result.fetchall(), limit, itemgetter(1, 0))
+            complaints = rows_to_dicts(result.keys(), rows)
+            return FastJSONResponse({"success": True, "complaints": complaints, "next_cursor": next_cursor})
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -417,14 +762,15 @@ async def get_complaints():
 async def verify_complaint(complaint_id: int):
     """Verify a complaint using hardcoded SQL"""
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
+        async with engine.connect() as conn:
+            result = await conn.execute(
                 text("UPDATE complaint SET status = 'verified' WHERE complaint_id = :complaint_id"),
                 {"complaint_id": complaint_id}
             )
             
             if result.rowcount > 0:
-                conn.commit()
+                await change_feed.record_change(conn, "complaint", complaint_id)
+                await conn.commit()
                 return {"success": True, "message": "Complaint verified successfully"}
             else:
                 raise HTTPException(status_code=404, detail="Complaint not found")
@@ -436,14 +782,15 @@ async def verify_complaint(complaint_id: int):
 async def reject_complaint(complaint_id: int):
     """Reject a complaint using hardcoded SQL"""
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
+        async with engine.connect() as conn:
+            result = await conn.execute(
                 text("UPDATE complaint SET status = 'rejected' WHERE complaint_id = :complaint_id"),
                 {"complaint_id": complaint_id}
             )
             
             if result.rowcount > 0:
-                conn.commit()
+                await change_feed.record_change(conn, "complaint", complaint_id)
+                await conn.commit()
                 return {"success": True, "message": "Complaint rejected successfully"}
             else:
                 raise HTTPException(status_code=404, detail="Complaint not found")
@@ -455,8 +802,8 @@ async def reject_complaint(complaint_id: int):
 async def assign_case(assignment: CaseAssignment):
     """Assign case to officer using hardcoded SQL"""
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
+        async with engine.connect() as conn:
+            result = await conn.execute(
                 text("""
                     INSERT INTO case_assignment (user_id, crime_id, duty_role, assigned_at)
                     VALUES (:user_id, :crime_id, :duty_role, :assigned_at)
@@ -468,8 +815,10 @@ async def assign_case(assignment: CaseAssignment):
                     "assigned_at": datetime.utcnow()
                 }
             )
+            await change_feed.record_change(conn, "case_assignment", result.lastrowid, "insert")
             
-            conn.commit()
+            await conn.commit()
+            assignment_engine.adjust(assignment.user_id, 1)
             return {
                 "success": True,
                 "message": "Case assigned successfully",
@@ -479,137 +828,339 @@ async def assign_case(assignment: CaseAssignment):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/case-assignments/auto")
+async def auto_assign_case(auto: AutoAssignment):
+    """Assign a crime to the least-loaded officer at or near its police station"""
+    try:
+        assignment = await assignment_engine.assign(engine, auto.crime_id, auto.duty_role)
+    except AssignmentError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "assignment": assignment}
+
+@app.post("/api/case-assignments/{assignment_id}/release")
+async def release_case_assignment(assignment_id: int):
+    """Mark an assignment finished so it stops counting towards the officer's workload"""
+    try:
+        async with engine.connect() as conn:
+            user_id = (await conn.execute(
+                text("SELECT user_id FROM case_assignment WHERE assignment_id = :id AND released_at IS NULL FOR UPDATE"),
+                {"id": assignment_id}
+            )).scalar()
+            if user_id is not None:
+                await conn.execute(
+                    text("UPDATE case_assignment SET released_at = :now WHERE assignment_id = :id"),
+                    {"id": assignment_id, "now": datetime.utcnow()}
+                )
+                await change_feed.record_change(conn, "case_assignment", assignment_id)
+            await conn.commit()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Open assignment not found")
+    assignment_engine.adjust(user_id, -1)
+    return {"success": True, "message": "Assignment released"}
+
+@app.get("/api/officers/workload")
+async def officer_workload(station_id: Optional[int] = None):
+    """Open assignments per officer from the in-memory index, least loaded first"""
+    try:
+        await assignment_engine.ensure_loaded(engine)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return FastJSONResponse({"success": True, "officers": assignment_engine.workload(station_id)})
+
 @app.post("/api/crimes/{crime_id}/status")
 async def update_crime_status(crime_id: int, status_update: StatusUpdate):
     """Update crime status and add to history using hardcoded SQL"""
     try:
-        with engine.connect() as conn:
-            trans = conn.begin()
+        async with engine.connect() as conn:
+            trans = await conn.begin()
             
             try:
-                # Update crime status
-                conn.execute(
-                    text("UPDATE crime SET status = :new_status WHERE crime_id = :crime_id"),
-                    {
-                        "new_status": status_update.new_status,
-                        "crime_id": crime_id
-                    }
+                # Locks the crime row, checks the transition, updates crime, history and stats
+                result, = await case_status.apply_batch(
+                    conn, [(crime_id, status_update.new_status, status_update.notes)],
+                    status_update.changed_by, datetime.utcnow()
                 )
+                await trans.commit()
                 
-                # Add to status history
-                conn.execute(
-                    text("""
-                        INSERT INTO case_status_history (crime_id, status, notes, changed_at, changed_by)
-                        VALUES (:crime_id, :status, :notes, :changed_at, :changed_by)
-                    """),
-                    {
-                        "crime_id": crime_id,
-                        "status": status_update.new_status,
-                        "notes": status_update.notes,
-                        "changed_at": datetime.utcnow(),
-                        "changed_by": status_update.changed_by
-                    }
-                )
+            except Exception as e:
+                await trans.rollback()
+                raise e
                 
-                trans.commit()
-                return {"success": True, "message": "Status updated successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not result["success"]:
+        raise HTTPException(status_code=404 if result["error"] == "Crime not found" else 409, detail=result["error"])
+    return {"success": True, "message": "Status updated successfully"}
+
+@app.post("/api/crimes/status/batch")
+async def update_crime_statuses(batch: BatchStatusUpdate):
+    """Apply many status changes in one transaction; invalid items are reported, not fatal"""
+    items = [(update.crime_id, update.new_status, update.notes) for update in batch.updates]
+    try:
+        async with engine.connect() as conn:
+            trans = await conn.begin()
+            
+            try:
+                results = await case_status.apply_batch(conn, items, batch.changed_by, datetime.utcnow())
+                await trans.commit()
                 
             except Exception as e:
-                trans.rollback()
+                await trans.rollback()
                 raise e
                 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {
+        "success": True,
+        "updated": sum(1 for r in results if r.get("changed")),
+        "failed": sum(1 for r in results if not r["success"]),
+        "results": results
+    }
+
 @app.get("/api/case-assignments")
-async def get_case_assignments():
-    """Get all case assignments using hardcoded SQL"""
+async def get_case_assignments(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    user_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Get case assignments newest first, one keyset page at a time, using hardcoded SQL"""
+    conditions, params = [], {}
+    if status:
+        conditions.append("c.status = :status")
+        params["status"] = status
+    if user_id is not None:
+        conditions.append("ca.user_id = :user_id")
+        params["user_id"] = user_id
+    add_date_range("ca.assigned_at", date_from, date_to, conditions, params)
+    apply_cursor(cursor, "ca.assigned_at", "ca.assignment_id", conditions, params)
+    params["limit"] = limit + 1
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("""
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(f"""
                     SELECT ca.assignment_id, ca.crime_id, ca.user_id, ca.duty_role, ca.assigned_at, ca.released_at,
                            c.crime_type, c.status,
                            u.username, u.full_name
                     FROM case_assignment ca
                     JOIN crime c ON ca.crime_id = c.crime_id
                     LEFT JOIN appuser u ON ca.user_id = u.user_id
-                    ORDER BY ca.assigned_at DESC
-                """)
-            ).fetchall()
-            
-            assignments = []
-            for row in result:
-                assignment_dict = {
-                    "assignment_id": row[0],
-                    "crime_id": row[1],
-                    "user_id": row[2],
-                    "duty_role": row[3],
-                    "assigned_at": row[4].isoformat() if row[4] else None,
-                    "released_at": row[5].isoformat() if row[5] else None,
-                    "crime_type": row[6],
-                    "status": row[7],
-                    "username": row[8],
-                    "full_name": row[9]
-                }
-                assignments.append(assignment_dict)
-            
-            return {"success": True, "assignments": assignments}
+                    {build_where(conditions)}
+                    ORDER BY ca.assigned_at DESC, ca.assignment_id DESC
+                    LIMIT :limit
+                """),
+                params
+            )
+            rows, next_cursor = split_page(result.fetchall(), limit, itemgetter(4, 0))
+            assignments = rows_to_dicts(result.keys(), rows)
+            return FastJSONResponse({"success": True, "assignments": assignments, "next_cursor": next_cursor})
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/search")
+async def search_descriptions(
+    q: str = Query(..., min_length=1, max_length=200),
+    source: str = Query("crimes", pattern="^(crimes|complaints)$"),
+    sort: str = Query("relevance", pattern="^(relevance|newest)$"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    district_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Full-text search over crime or complaint descriptions with highlighted snippets"""
+    try:
+        sql, params = search.build_search(
+            source, q, sort, status, district_id, date_from, date_to, cursor, limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(text(sql), params)
+            rows = result.fetchall()
+            keys = list(result.keys())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    page, next_cursor = rows[:limit], None
+    if len(rows) > limit:
+        last = dict(zip(keys, page[-1]))
+        if sort == "relevance":
+            next_cursor = search.encode_score_cursor(last["score"], last["id"])
+        else:
+            next_cursor = encode_cursor(last["created_at" if source == "crimes" else "reported_at"], last["id"])
+    results = []
+    for item in rows_to_dicts(keys, page):
+        item["snippet"] = search.snippet(item.pop("description"), q)
+        results.append(item)
+    return FastJSONResponse({"success": True, "results": results, "next_cursor": next_cursor})
+
+@app.post("/api/locations/cache/reload")
+async def reload_location_cache():
+    """Rebuild the location cache, e.g. after running the compaction job"""
+    cache = LocationCache()
+    try:
+        await cache.load(engine)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    location_resolver.cache = cache
+    return {"success": True}
+
+@app.post("/api/people/index/reload")
+async def reload_name_index():
+    """Rebuild the name index, e.g. after people were written by the admin API or the Flask app"""
+    try:
+        seconds = await name_index.reload(engine)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    logger.info("Name index reloaded: %s names in %.1fs", len(name_index), seconds)
+    return {"success": True, "names": len(name_index)}
+
+@app.get("/api/people/search")
+async def search_people(
+    q: str = Query(..., min_length=2, max_length=100),
+    kind: Optional[str] = Query(None, pattern="^(criminal|victim|witness)$"),
+    limit: int = Query(10, ge=1, le=100),
+    min_score: float = Query(0.3, ge=0.05, le=1.0),
+):
+    """Fuzzy name lookup over criminals (incl. aliases), victims and witnesses"""
+    matches = name_index.search(q, kind=kind, limit=limit, min_score=min_score)
+    return FastJSONResponse({"success": True, "results": matches, "complete": name_index.loaded})
+
+@app.get("/api/stats")
+async def get_stats(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    district_id: Optional[int] = None,
+    crime_type: Optional[str] = None,
+    status: Optional[str] = None,
+    group_by: str = Query("district,crime_type,status", description="Comma-separated: district, crime_type, status, day"),
+):
+    """Crime counts for dashboard KPIs, read from the crime_stats_daily rollup"""
+    dimensions = [name.strip() for name in group_by.split(",") if name.strip()]
+    unknown = [name for name in dimensions if name not in crime_stats.DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by: {', '.join(unknown)}")
+    conditions, params = [], {}
+    for column, value in (("district_id", district_id), ("crime_type", crime_type), ("status", status)):
+        if value is not None:
+            conditions.append(f"{column} = :{column}")
+            params[column] = value
+    add_date_range("stat_date", date_from, date_to, conditions, params)
+    try:
+        async with engine.connect() as conn:
+            stats = await crime_stats.summary(conn, conditions, params, dimensions)
+            return FastJSONResponse({"success": True, **stats})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/changes")
+async def get_changes(
+    since: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    entity: Optional[str] = Query(None, description="Comma-separated: crime, complaint, case_assignment"),
+):
+    """Crimes, complaints and assignments changed after the cursor, for incremental dashboard refresh"""
+    entities = [name.strip() for name in entity.split(",") if name.strip()] if entity else None
+    unknown = [name for name in entities or () if name not in change_feed.ENTITY_QUERIES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown entity: {', '.join(unknown)}")
+    try:
+        change_feed.parse_cursor(since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        await change_feed.stamp_committed(engine)
+        async with engine.connect() as conn:
+            feed = await change_feed.changes_since(conn, since, limit, entities)
+            return FastJSONResponse({"success": True, **feed})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/districts")
-async def get_districts():
-    """Get all districts using hardcoded SQL"""
+async def get_districts(if_none_match: Optional[str] = Header(None)):
+    """Get all districts from the reference-data cache"""
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("SELECT district_id, district_name, state FROM district ORDER BY district_name")
-            ).fetchall()
-            
-            districts = []
-            for row in result:
-                district_dict = {
-                    "district_id": row[0],
-                    "district_name": row[1],
-                    "state": row[2]
-                }
-                districts.append(district_dict)
-            
-            return {"success": True, "districts": districts}
-            
+        return await reference_cache.response(engine, "districts", if_none_match)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/police-stations")
+async def get_police_stations(if_none_match: Optional[str] = Header(None)):
+    """Get all police stations from the reference-data cache"""
+    try:
+        return await reference_cache.response(engine, "stations", if_none_match)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/police-stations/{station_id}/staff")
+async def get_station_staff(station_id: int, if_none_match: Optional[str] = Header(None)):
+    """Get staff for a specific police station from the reference-data cache"""
+    try:
+        response = await reference_cache.staff_response(engine, station_id, if_none_match)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if response is None:
+        raise HTTPException(status_code=404, detail="Police station not found")
+    return response
+
+@app.post("/api/reference/refresh")
+async def refresh_reference_data():
+    """Reload districts, stations and staff after they were changed in the database"""
+    try:
+        await reference_cache.refresh(engine)
+        return {"success": True, "version": reference_cache.version}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/users")
-async def get_users():
-    """Get all users using hardcoded SQL"""
+async def get_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    station_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Get users newest first, one keyset page at a time, using hardcoded SQL"""
+    conditions, params = [], {}
+    if status:
+        conditions.append("status = :status")
+        params["status"] = status
+    if station_id is not None:
+        conditions.append("station_id = :station_id")
+        params["station_id"] = station_id
+    add_date_range("created_at", date_from, date_to, conditions, params)
+    apply_cursor(cursor, "created_at", "user_id", conditions, params)
+    params["limit"] = limit + 1
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("""
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(f"""
                     SELECT user_id, username, email, full_name, role_hint, station_id, status, created_at
                     FROM appuser
-                    ORDER BY created_at DESC
-                """)
-            ).fetchall()
-            
-            users = []
-            for row in result:
-                user_dict = {
-                    "user_id": row[0],
-                    "username": row[1],
-                    "email": row[2],
-                    "full_name": row[3],
-                    "role_hint": row[4],
-                    "station_id": row[5],
-                    "status": row[6],
-                    "created_at": row[7].isoformat() if row[7] else None
-                }
-                users.append(user_dict)
-            
-            return {"success": True, "users": users}
+                    {build_where(conditions)}
+                    ORDER BY created_at DESC, user_id DESC
+                    LIMIT :limit
+                """),
+                params
+            )
+            rows, next_cursor = split_page(result.fetchall(), limit, itemgetter(7, 0))
+            users = rows_to_dicts(result.keys(), rows)
+            return FastJSONResponse({"success": True, "users": users, "next_cursor": next_cursor})
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -618,21 +1169,23 @@ async def get_users():
 async def test_database():
     """Test database connection"""
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT 1 as test")).fetchone()
+        async with engine.connect() as conn:
+            result = (await conn.execute(text("SELECT 1 as test"))).fetchone()
             return {"success": True, "message": "Database connection successful", "test": result[0]}
     except Exception as e:
         return {"success": False, "error": str(e), "message": "Database connection failed"}
 
 @app.get("/test-crime", response_class=HTMLResponse)
-async def test_crime_page():
-    """Serve the test crime page"""
-    try:
-        with open("test_crime.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="Test page not found", status_code=404)
+async def test_crime_page(request: Request):
+    """Serve the test crime page from the page cache"""
+    return serve_page("/test-crime", request, "Test page not found")
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to Safe Route App API", "admin_dashboard": "/admin"}
\ No newline at end of file
+    return {"message": "Welcome to Safe Route App API", "admin_dashboard": "/admin"}
+
+# Last, so no API route is ever shadowed by a static path
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_file(path: str, request: Request):
+    """Static files from the page cache"""
+    return serve_page(f"/static/{path}", request, "Not found")
@@ -35,7 +35,7 @@ class User(Base):
     status = Column(String(20), default="Active")
     created_at = Column(DateTime, default=datetime.utcnow)
 
-Base.metadata.create_all(bind=engine)
+# Tables are managed by migrations.py, not created at import time
 
 class UserCreate(BaseModel):
     email: str
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the mysafety database.
+
+Each migration has a version number, a description and a list of steps
+(SQL strings or functions taking a cursor). Applied versions are recorded in
+`schema_migrations`. MySQL commits DDL implicitly, so every step is written
+to be safe to re-run if a migration is interrupted halfway.
+
+    python migrations.py status     # list applied / pending versions
+    python migrations.py upgrade    # apply pending migrations
+    python migrations.py check      # EXPLAIN the hot queries and verify index use
+"""
+
+import os
+import sys
+
+import mysql.connector
+from mysql.connector import Error
+
+from crime_stats import ROLLUP_SELECT, STATS_COLUMNS
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'mysafety'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', ''),
+}
+
+
+# -------------------
+#  Idempotent building blocks
+# -------------------
+def index_exists(cursor, table, index_name):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, index_name))
+    return cursor.fetchone() is not None
+
+
+def column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def create_index(table, index_name, columns, kind=""):
+    """Step creating an index unless it already exists; kind is '', UNIQUE, SPATIAL or FULLTEXT"""
+    def step(cursor):
+        if not index_exists(cursor, table, index_name):
+            cursor.execute(f"CREATE {kind} INDEX {index_name} ON {table} ({columns})")
+    step.__doc__ = f"index {index_name} on {table}({columns})"
+    return step
+
+
+def add_column(table, column, definition):
+    """Step adding a column unless it already exists"""
+    def step(cursor):
+        if not column_exists(cursor, table, column):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    step.__doc__ = f"column {table}.{column}"
+    return step
+
+
+# -------------------
+#  Migrations
+# -------------------
+MIGRATIONS = [
+    (1, "Composite indexes for keyset-paginated list endpoints", [
+        create_index("crime", "idx_crime_created", "created_at, crime_id"),
+        create_index("crime", "idx_crime_status_created", "status, created_at, crime_id"),
+        create_index("crime", "idx_crime_type_created", "crime_type, created_at, crime_id"),
+        create_index("complaint", "idx_complaint_reported", "reported_at, complaint_id"),
+        create_index("complaint", "idx_complaint_status_reported", "status, reported_at, complaint_id"),
+        create_index("appuser", "idx_appuser_created", "created_at, user_id"),
+        create_index("case_assignment", "idx_case_assignment_assigned", "assigned_at, assignment_id"),
+    ]),
+    (2, "Login lookup and spatial location indexes", [
+        # main.py registers and logs in by email, which setup_database never created
+        add_column("appuser", "email", "VARCHAR(150) NULL AFTER username"),
+        create_index("appuser", "idx_appuser_email", "email"),
+        # Stored generated POINT kept in sync with latitude/longitude, so inserts stay unchanged.
+        # SRID 0 (planar lon/lat) keeps MBR lookups cheap; a SPATIAL index needs NOT NULL.
+        add_column(
+            "location", "geo_point",
+            "POINT GENERATED ALWAYS AS (POINT(COALESCE(longitude, 0), COALESCE(latitude, 0))) STORED NOT NULL SRID 0"
+        ),
+        create_index("location", "idx_location_geo", "geo_point", kind="SPATIAL"),
+        create_index("location", "idx_location_district_area", "district_id, area_name"),
+    ]),
+    (3, "Login sessions", [
+        """
+        CREATE TABLE IF NOT EXISTS user_session (
+            token_hash CHAR(64) PRIMARY KEY,
+            user_id INT NOT NULL,
+            created_at DATETIME NOT NULL,
+            expires_at DATETIME NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES appuser(user_id)
+        )
+        """,
+        create_index("user_session", "idx_user_session_expires", "expires_at"),
+    ]),
+    (4, "Daily crime rollup for /api/stats", [
+        """
+        CREATE TABLE IF NOT EXISTS crime_stats_daily (
+            stat_date DATE NOT NULL,
+            district_id INT NOT NULL,
+            crime_type VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            crime_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, district_id, crime_type, status)
+        )
+        """,
+        create_index("crime_stats_daily", "idx_crime_stats_district", "district_id, stat_date"),
+        # Backfill; re-running after a partial failure starts from an empty table again
+        "DELETE FROM crime_stats_daily",
+        f"INSERT INTO crime_stats_daily {STATS_COLUMNS} {ROLLUP_SELECT}",
+    ]),
+    (5, "Full-text indexes for /api/search", [
+        # InnoDB builds the first FULLTEXT index of a table with a table rebuild
+        create_index("crime", "ft_crime_description", "description", kind="FULLTEXT"),
+        create_index("complaint", "ft_complaint_description", "description", kind="FULLTEXT"),
+    ]),
+    (6, "Entity-resolution output (entity_resolution.py)", [
+        # Only merged records get a row; a person without one is its own canonical id
+        """
+        CREATE TABLE IF NOT EXISTS person_canonical (
+            kind VARCHAR(10) NOT NULL,
+            person_id INT NOT NULL,
+            canonical_id INT NOT NULL,
+            run_id CHAR(32) NOT NULL,
+            PRIMARY KEY (kind, person_id)
+        )
+        """,
+        create_index("person_canonical", "idx_person_canonical_target", "kind, canonical_id"),
+        """
+        CREATE TABLE IF NOT EXISTS person_merge_suggestion (
+            kind VARCHAR(10) NOT NULL,
+            person_id INT NOT NULL,
+            candidate_id INT NOT NULL,
+            score DECIMAL(5,4) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            run_id CHAR(32) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, person_id, candidate_id)
+        )
+        """,
+        create_index("person_merge_suggestion", "idx_person_merge_status", "status, score"),
+    ]),
+    (7, "Change feed for /api/changes", [
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            entity VARCHAR(30) NOT NULL,
+            entity_id INT NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            changed_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        )
+        """,
+        create_index("change_log", "idx_change_log_changed_at", "changed_at"),
+    ]),
+    # Previously added by Base.metadata.create_all when main2.py / prev_main.py were
+    # imported (their User model). prac/hi.py's create_all is gone too, but its
+    # tables (users, friendships, panic_alerts, notifications) get no migration
+    # until the models module it imports exists to define them.
+    (8, "appuser.role_hint, formerly created at app import", [
+        add_column("appuser", "role_hint", "VARCHAR(50) DEFAULT 'User'"),
+    ]),
+    # Commit-ordered feed cursor, stamped after commit by change_feed.stamp_committed();
+    # existing rows keep their change_id so cursors already handed out stay valid
+    (9, "Commit-ordered sequence for change_log", [
+        add_column("change_log", "seq", "BIGINT NULL"),
+        "UPDATE change_log SET seq = change_id WHERE seq IS NULL",
+        create_index("change_log", "idx_change_log_seq", "seq", "UNIQUE"),
+    ]),
+]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def upgrade(cursor, target=None):
+    """Apply every pending migration up to target (all by default)"""
+    done = applied_versions(cursor)
+    for version, description, steps in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        print(f"Applying migration {version}: {description}")
+        for step in steps:
+            if callable(step):
+                step(cursor)
+            else:
+                cursor.execute(step)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+            (version, description)
+        )
+        cursor.execute("COMMIT")
+    print("Schema is up to date")
+
+
+def status(cursor):
+    done = applied_versions(cursor)
+    for version, description, _ in MIGRATIONS:
+        print(f"{'applied' if version in done else 'pending':>8}  {version:>3}  {description}")
+
+
+# -------------------
+#  EXPLAIN-based index check
+# -------------------
+# (name, driving table alias, SQL) for the queries main.py runs most often
+HOT_QUERIES = [
+    ("crimes newest page", "c", """
+        SELECT c.crime_id FROM crime c
+        JOIN location l ON c.location_id = l.location_id
+        JOIN district d ON l.district_id = d.district_id
+        ORDER BY c.created_at DESC, c.crime_id DESC LIMIT 51
+    """),
+    ("crimes by status", "c", """
+        SELECT c.crime_id FROM crime c
+        WHERE c.status = 'reported'
+        ORDER BY c.created_at DESC, c.crime_id DESC LIMIT 51
+    """),
+    ("complaints newest page", "complaint", """
+        SELECT complaint_id FROM complaint
+        ORDER BY reported_at DESC, complaint_id DESC LIMIT 51
+    """),
+    ("case assignments newest page", "ca", """
+        SELECT ca.assignment_id FROM case_assignment ca
+        ORDER BY ca.assigned_at DESC, ca.assignment_id DESC LIMIT 51
+    """),
+    ("users newest page", "appuser", """
+        SELECT user_id FROM appuser
+        ORDER BY created_at DESC, user_id DESC LIMIT 51
+    """),
+    ("login by email", "appuser", """
+        SELECT * FROM appuser WHERE email = 'someone@example.com'
+    """),
+    ("locations in bounding box", "location", """
+        SELECT location_id FROM location
+        WHERE MBRContains(ST_GeomFromText('POLYGON((90.3 23.7, 90.5 23.7, 90.5 23.9, 90.3 23.9, 90.3 23.7))'), geo_point)
+    """),
+]
+
+
+def check_indexes(cursor):
+    """EXPLAIN each hot query and report whether its driving table uses an index"""
+    failures = 0
+    for name, table, sql in HOT_QUERIES:
+        cursor.execute("EXPLAIN " + sql)
+        columns = [d[0] for d in cursor.description]
+        plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        row = next((r for r in plan if r["table"] == table), plan[0])
+        # A full scan (type ALL) or a filesort on the driving table defeats the index
+        uses_index = row["key"] is not None and row["type"] != "ALL" and "filesort" not in (row["Extra"] or "")
+        failures += not uses_index
+        print(f"{'OK ' if uses_index else 'BAD'}  {name:<30} type={row['type']} key={row['key']} extra={row['Extra']}")
+    return failures == 0
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    try:
+        connection = mysql.connector.connect(**DB_CONFIG)
+        cursor = connection.cursor()
+        if command == "upgrade":
+            upgrade(cursor)
+        elif command == "check":
+            if not check_indexes(cursor):
+                sys.exit(1)
+        else:
+            status(cursor)
+        cursor.close()
+        connection.close()
+    except Error as e:
+        print(f"Migration error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Fuzzy name search over criminals, victims and witnesses.
+
+An in-memory trigram inverted index: every name (criminal full_name and
+alias_name, victim and witness full_name) is split into character
+trigrams in the pg_trgm style (lowercased, accents stripped, each word
+padded as "  word "), and each trigram maps to a compact int32 posting list
+of document numbers.
+
+Ranking uses trigram Jaccard similarity, shared / (query grams + name
+grams - shared). When a query has rare trigrams, candidates come only from
+its rarest posting lists (prefix filtering: a name that reaches min_score
+must share one of them). Shared counts then come from vectorised binary
+searches in the other sorted lists. When every trigram is common, one
+numpy bincount over all its postings counts hits instead. Either way,
+top-k over millions of names is vectorised work, not a Python loop.
+
+The index is loaded from the database at startup. main.py keeps it current
+for its own writes by calling add() after each committed insert (single and
+bulk crime creates); updated or deleted people would be tombstoned with
+remove() and re-added. Every other writer runs in another process (the admin
+API, the Flask app, ingest.py) and cannot reach this copy, so their people
+only show up after a rebuild: reload() loads a fresh index and swaps it in,
+exposed as POST /api/people/index/reload. Entity resolution never changes
+names, only person_canonical, so it needs no reload.
+"""
+
+import math
+import re
+import time
+import unicodedata
+from array import array
+
+import numpy as np
+from sqlalchemy import text
+
+KINDS = ("criminal", "victim", "witness")
+DEFAULT_MIN_SCORE = 0.3
+
+LOAD_QUERIES = {
+    "criminal": "SELECT criminal_id, full_name, alias_name FROM criminal",
+    "victim": "SELECT victim_id, full_name, NULL FROM victim",
+    "witness": "SELECT witness_id, full_name, NULL FROM witness",
+}
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+def normalize(name):
+    """Lowercase, strip accents and collapse everything but letters and digits to spaces"""
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    ascii_name = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", ascii_name.lower()).strip()
+
+
+def trigrams(name):
+    """Set of trigrams of a name, each word padded with two leading and one trailing space"""
+    grams = set()
+    for word in normalize(name).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """Trigram inverted index over people's names, addressed by (kind, person_id)"""
+
+    def __init__(self):
+        self._postings = {}                  # trigram -> array('i') of doc numbers
+        self._doc_kind = array("b")          # index into KINDS
+        self._doc_person = array("i")        # person id within its table
+        self._doc_grams = array("H")         # distinct trigrams in the name
+        self._doc_alive = bytearray()        # 0 once tombstoned
+        self._doc_name = []                  # name as stored, for display
+        self._docs_by_person = {}            # (kind, person_id) -> [doc numbers]
+        self._pending = None                 # adds made while reload() runs, replayed into the new index
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._doc_name)
+
+    def add(self, kind, person_id, *names):
+        """Index a person's names (None and blanks are skipped)"""
+        if self._pending is not None:
+            self._pending.append((kind, person_id, names))
+        kind_code = KINDS.index(kind)
+        docs = self._docs_by_person.setdefault((kind, person_id), [])
+        for name in names:
+            grams = trigrams(name)
+            if not grams:
+                continue
+            doc = len(self._doc_name)
+            self._doc_kind.append(kind_code)
+            self._doc_person.append(person_id)
+            self._doc_grams.append(min(len(grams), 65535))
+            self._doc_alive.append(1)
+            self._doc_name.append(name)
+            docs.append(doc)
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = array("i")
+                postings.append(doc)
+
+    def remove(self, kind, person_id):
+        """Tombstone every name of a person, e.g. before re-adding it after an update"""
+        for doc in self._docs_by_person.pop((kind, person_id), []):
+            self._doc_alive[doc] = 0
+
+    def search(self, query, kind=None, limit=10, min_score=DEFAULT_MIN_SCORE):
+        """
+        Return up to limit best matches as dicts (kind, person_id, name, score).
+
+        Each person appears once, under their best-matching name.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        # Prefix filtering: Jaccard >= min_score needs shared >= ceil(min_score * len(grams)),
+        # so a match must appear in at least one of the len(grams) - needed + 1 rarest lists.
+        needed = max(1, math.ceil(min_score * len(grams) - 1e-9))
+        lists = sorted(
+            (np.frombuffer(self._postings[g], dtype=np.int32) if g in self._postings else _EMPTY for g in grams),
+            key=len
+        )
+        prefix = lists[:len(grams) - needed + 1]
+        pool = sum(len(postings) for postings in prefix)
+        if pool * len(lists) < sum(len(postings) for postings in lists):
+            # Few candidates: take them from the rare lists and binary-search the rest
+            # (posting lists are sorted because doc numbers only grow)
+            candidates = np.unique(np.concatenate(prefix))
+            shared = np.zeros(len(candidates), dtype=np.int64)
+            for postings in lists:
+                if len(postings):
+                    positions = np.searchsorted(postings, candidates)
+                    shared += postings[np.minimum(positions, len(postings) - 1)] == candidates
+        else:
+            # Every list is common anyway: one pass counting hits per document
+            shared = np.bincount(np.concatenate(lists))
+            candidates = np.flatnonzero(shared >= needed)
+            shared = shared[candidates]
+        if not len(candidates):
+            return []
+        sizes = np.frombuffer(self._doc_grams, dtype=np.uint16)[candidates]
+        scores = shared / (len(grams) + sizes - shared)
+
+        keep = (np.frombuffer(self._doc_alive, dtype=np.uint8)[candidates] == 1) & (scores >= min_score)
+        if kind is not None:
+            keep &= np.frombuffer(self._doc_kind, dtype=np.int8)[candidates] == KINDS.index(kind)
+        candidates, scores = candidates[keep], scores[keep]
+
+        # A person can own several names (alias); over-fetch so dedup still fills the page
+        fetch = min(len(candidates), limit * 3)
+        if fetch < len(candidates):
+            top = np.argpartition(-scores, fetch - 1)[:fetch]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+
+        results, seen = [], set()
+        for i in order:
+            doc = int(candidates[i])
+            person = (KINDS[self._doc_kind[doc]], self._doc_person[doc])
+            if person in seen:
+                continue
+            seen.add(person)
+            results.append({
+                "kind": person[0],
+                "person_id": person[1],
+                "name": self._doc_name[doc],
+                "score": round(float(scores[i]), 4),
+            })
+            if len(results) == limit:
+                break
+        return results
+
+    async def load(self, engine, chunk_size=5000):
+        """Fill the index from the people tables through a server-side cursor"""
+        started = time.perf_counter()
+        async with engine.connect() as conn:
+            for kind, sql in LOAD_QUERIES.items():
+                result = await conn.stream(text(sql))
+                async for rows in result.partitions(chunk_size):
+                    for person_id, full_name, alias_name in rows:
+                        self.add(kind, person_id, full_name, alias_name)
+        self.loaded = True
+        return time.perf_counter() - started
+
+    async def reload(self, engine):
+        """
+        Rebuild from the database and swap the new index in place.
+
+        Searches keep using the old index meanwhile. A person added during
+        the rebuild may have committed after its table was read, so every
+        add() made meanwhile is replayed into the new index before the swap.
+        """
+        if self._pending is not None:
+            raise RuntimeError("Name index reload already running")
+        self._pending = []
+        try:
+            fresh = NameIndex()
+            seconds = await fresh.load(engine)
+            for kind, person_id, names in self._pending:
+                fresh.remove(kind, person_id)
+                fresh.add(kind, person_id, *names)
+        finally:
+            self._pending = None
+        self.__dict__.update(fresh.__dict__)
+        return seconds
+
+
+name_index = NameIndex()
@@ -0,0 +1,182 @@
+"""
+In-memory, precompressed serving of HTML pages and static files.
+
+Every registered file is read once at startup. Compressible types are
+encoded with gzip, and with brotli too when the optional `brotli` package
+is installed, so a request costs a dict lookup instead of a disk read and a
+compression pass. Each encoding has its own strong ETag (the content hash
+plus an encoding suffix), and If-None-Match is answered with 304.
+
+Files whose name carries a content hash (app.3f2a9c1d.js) never change
+under the same URL and are cached for a year as immutable. Everything else
+is served with no-cache, so browsers revalidate cheaply against the ETag.
+
+With PAGE_CACHE_RELOAD=1 (for development) a file's mtime is checked on
+each request and the entry is rebuilt when it changed on disk.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGE_CACHE_RELOAD = os.environ.get("PAGE_CACHE_RELOAD", "0") == "1"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Not worth compressing below this; images and fonts are already compressed
+MIN_COMPRESS_BYTES = 512
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# name.<8+ hex digits>.ext, as written by asset bundlers
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[a-z0-9]+$")
+
+
+def accepted_encodings(accept_encoding):
+    """Encodings from an Accept-Encoding header with q > 0, e.g. {"br", "gzip"}"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    if "*" in accepted:
+        accepted.update(("br", "gzip"))
+    return accepted
+
+
+def _etag_matches(if_none_match, digest):
+    """Any representation of this content counts: the client already has the bytes"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"').split("-")[0] == digest:
+            return True
+    return False
+
+
+class Asset:
+    """One file's bytes in every encoding worth keeping, with headers precomputed"""
+
+    def __init__(self, path, body, mtime):
+        self.path = path
+        self.mtime = mtime
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL if _HASHED_NAME.search(os.path.basename(path)) else REVALIDATE_CACHE_CONTROL
+        )
+
+        # (encoding, body, etag), best first; identity is always last
+        self.variants = []
+        if len(body) >= MIN_COMPRESS_BYTES and content_type.startswith(COMPRESSIBLE_TYPES):
+            if brotli is not None:
+                self._add_variant("br", brotli.compress(body, quality=11), len(body))
+            self._add_variant("gzip", gzip.compress(body, compresslevel=9, mtime=0), len(body))
+        self.variants.append((None, body, f'"{self.digest}"'))
+
+    def _add_variant(self, encoding, compressed, original_size):
+        if len(compressed) < original_size:
+            self.variants.append((encoding, compressed, f'"{self.digest}-{encoding}"'))
+
+    def response(self, accept_encoding=None, if_none_match=None, head=False):
+        accepted = accepted_encodings(accept_encoding)
+        encoding, body, etag = next(v for v in self.variants if v[0] is None or v[0] in accepted)
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if len(self.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if _etag_matches(if_none_match, self.digest):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if head:
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=self.content_type)
+        return Response(content=body, headers=headers, media_type=self.content_type)
+
+
+class PageCache:
+    """URL path -> Asset for individual pages and whole directories"""
+
+    def __init__(self, reload=PAGE_CACHE_RELOAD):
+        self.reload = reload
+        self._files = {}     # url path -> file path
+        self._assets = {}    # url path -> Asset
+
+    def add_file(self, url_path, file_path):
+        self._files[url_path] = file_path
+
+    def add_directory(self, url_prefix, directory):
+        """Register every file under directory as url_prefix/<relative path>"""
+        for root, _, names in os.walk(directory):
+            for name in names:
+                file_path = os.path.join(root, name)
+                relative = os.path.relpath(file_path, directory).replace(os.sep, "/")
+                self._files[f"{url_prefix.rstrip('/')}/{relative}"] = file_path
+
+    def _load(self, url_path):
+        file_path = self._files[url_path]
+        try:
+            mtime = os.stat(file_path).st_mtime_ns
+            with open(file_path, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            self._assets.pop(url_path, None)
+            return None
+        asset = self._assets[url_path] = Asset(file_path, body, mtime)
+        return asset
+
+    def load(self):
+        """Read and precompress everything registered; blocking, so run it off the event loop"""
+        for url_path in list(self._files):
+            self._load(url_path)
+        return len(self._assets)
+
+    def get(self, url_path):
+        if url_path not in self._files:
+            return None
+        asset = self._assets.get(url_path)
+        if asset is None:
+            return self._load(url_path)
+        if self.reload:
+            try:
+                changed = os.stat(asset.path).st_mtime_ns != asset.mtime
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                return self._load(url_path)
+        return asset
+
+    def stats(self):
+        return {
+            "files": len(self._assets),
+            "bytes": sum(len(body) for asset in self._assets.values() for _, body, _ in asset.variants),
+            "brotli": brotli is not None,
+        }
+
+
+page_cache = PageCache()
@@ -0,0 +1,88 @@
+"""
+Keyset (seek) pagination helpers for the list endpoints.
+
+Pages are ordered newest first on (timestamp, id). Instead of OFFSET, the
+client sends back an opaque cursor holding the last row's (timestamp, id)
+and the next page starts strictly after it, so every page is an index range
+scan no matter how deep into the table it is.
+
+Rows with a NULL timestamp are not dropped: MySQL sorts NULL lowest, so in
+descending order they come last, by id, and the cursor carries an empty
+timestamp once the pages reach them.
+"""
+
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(timestamp, row_id):
+    """Opaque, URL-safe cursor for the row a page ended on (timestamp may be None)"""
+    raw = f"{timestamp.isoformat() if timestamp is not None else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (timestamp or None, id) from a cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp) if timestamp else None, int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_condition(timestamp_column, id_column, cursor_ts):
+    """
+    WHERE fragment selecting rows after the cursor in descending order.
+
+    Written as an OR instead of a row constructor, because MySQL only uses a
+    composite index for the expanded form. cursor_ts is the decoded cursor
+    timestamp; past a non-NULL one, the NULL-timestamp rows still follow.
+    """
+    if cursor_ts is None:
+        return f"({timestamp_column} IS NULL AND {id_column} < :cursor_id)"
+    return (
+        f"({timestamp_column} < :cursor_ts OR "
+        f"({timestamp_column} = :cursor_ts AND {id_column} < :cursor_id) OR "
+        f"{timestamp_column} IS NULL)"
+    )
+
+
+def build_where(conditions):
+    """Join SQL conditions into a WHERE clause (empty string if none)"""
+    return "WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def split_page(rows, limit, cursor_key):
+    """
+    Trim a limit + 1 fetch to one page and compute the next cursor.
+
+    cursor_key maps a row to its (timestamp, id), e.g. operator.itemgetter
+    for result rows or operator.attrgetter for ORM objects. The extra row
+    only signals that another page exists; the cursor points at the last
+    row actually returned.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(*cursor_key(page[-1]))
+
+
+def keyset_select(stmt, timestamp_column, id_column, cursor, limit):
+    """Apply the keyset condition, ordering and limit + 1 to an ORM select()"""
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        if cursor_ts is None:
+            stmt = stmt.where(timestamp_column.is_(None), id_column < cursor_id)
+        else:
+            stmt = stmt.where(or_(
+                timestamp_column < cursor_ts,
+                and_(timestamp_column == cursor_ts, id_column < cursor_id),
+                timestamp_column.is_(None),
+            ))
+    return stmt.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of the app modules.
+
+Imports each module in a fresh interpreter with -X importtime and reports
+the total cold-import time and the most expensive modules, so a new
+top-level import or import-time side effect shows up before it reaches a
+deploy, e.g.
+
+    python profile_startup.py main hi2
+    python profile_startup.py main --top 25 --runs 5
+
+Nothing here touches the database: importing an app must not either.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# import time:      self [us] |    cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_once(module):
+    """(module's (self_us, cumulative_us), {direct import: (self_us, cumulative_us)}) for one cold import"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    # Children are printed before their parent; interpreter startup (site and
+    # its .pth imports) comes first as its own top-level entries
+    children = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        timing = (int(self_us), int(cumulative_us))
+        depth = (len(indent) - 1) // 2
+        if depth == 0:
+            if name == module:
+                return timing, children
+            children = {}
+        elif depth == 1:
+            children[name] = timing
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def report(module, runs, top):
+    samples = [profile_once(module) for _ in range(runs)]
+    # Report the median run, by the module's own cumulative time
+    samples.sort(key=lambda sample: sample[0][1])
+    (self_us, _), children = samples[len(samples) // 2]
+    total_ms = [sample[0][1] / 1000 for sample in samples]
+
+    print(f"\n{module}: {statistics.median(total_ms):.0f} ms cold import "
+          f"(min {min(total_ms):.0f}, max {max(total_ms):.0f}, {runs} runs)")
+    print(f"  {'cumulative ms':>13}  {'self ms':>8}  direct import")
+    for name, (child_self_us, cumulative_us) in sorted(children.items(), key=lambda item: -item[1][1])[:top]:
+        print(f"  {cumulative_us / 1000:>13.1f}  {child_self_us / 1000:>8.1f}  {name}")
+    print(f"  {'':>13}  {self_us / 1000:>8.1f}  {module} (own module body)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["main", "hi2"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        report(module, args.runs, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Token-bucket rate limiting as plain ASGI middleware.
+
+Limits are set per method and path prefix: "POST /api/crimes" also covers
+/api/crimes/bulk and /api/crimes/12/status, unless a longer configured
+prefix matches first. Each request takes one token from a per-IP bucket
+and, when its bearer token belongs to a cached session, from a per-user
+bucket too. Buckets refill lazily: the token count and last-seen time are
+stored and topped up only when the bucket is next touched, so idle clients
+cost nothing. A rejected request gets a 429 with Retry-After before any
+route code (and so any database access) runs.
+
+Two backends:
+
+    MemoryBuckets   per process; an LRU dict capped at max_entries
+    SharedBuckets   a fixed-size table in an mmap'd file (default under
+                    /dev/shm) shared by every worker on the host, guarded by
+                    flock; when a key's probe window is full the stalest
+                    bucket in it is evicted
+
+Configuration:
+
+    RATE_LIMITS="POST /login=10/min,POST /api/crimes=120/min,POST /api/crimes/bulk=10/min"
+    RATE_LIMIT_BACKEND=memory|shared
+    RATE_LIMIT_SHM_PATH=/dev/shm/safe-route-ratelimit
+    RATE_LIMIT_TRUST_PROXY=1     take the client IP from X-Forwarded-For
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from serialization import dumps
+
+UNITS = {"s": 1, "sec": 1, "second": 1, "min": 60, "minute": 60, "h": 3600, "hour": 3600}
+
+DEFAULT_LIMITS = (
+    "POST /register=5/min,POST /login=10/min,POST /api/crimes=120/min,"
+    "POST /api/crimes/bulk=10/min,POST /api/imports=10/min"
+)
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    rate: float   # tokens added per second
+    burst: int    # bucket capacity
+
+
+def parse_limits(spec):
+    """'POST /login=10/min' -> {('POST', '/login'): RouteLimit(10/60, 10)}; burst defaults to the count"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, limit = item.partition("=")
+        method, _, path = route.strip().partition(" ")
+        count, _, unit = limit.strip().partition("/")
+        count, _, burst = count.partition(":")
+        limits[(method.upper(), path.strip())] = RouteLimit(
+            int(count) / UNITS[unit.strip() or "s"], int(burst or count)
+        )
+    return limits
+
+
+def match_limit(limits, method, path):
+    """(configured path, RouteLimit) for the longest prefix of path limited for method, or None"""
+    best = None
+    for (limit_method, prefix), limit in limits.items():
+        if limit_method != method or not (path == prefix or path.startswith(prefix.rstrip("/") + "/")):
+            continue
+        if best is None or len(prefix) > len(best[0]):
+            best = (prefix, limit)
+    return best
+
+
+def _refill(tokens, last, now, limit):
+    """Lazily top up a bucket; returns the current token count"""
+    return min(limit.burst, tokens + max(0.0, now - last) * limit.rate)
+
+
+def _decide(tokens, limit):
+    """Return (allowed, tokens_after, retry_after_seconds)"""
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / limit.rate
+
+
+class MemoryBuckets:
+    """Per-process buckets: key -> (tokens, last) in an LRU capped at max_entries"""
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+
+    def take(self, key, limit, now=None):
+        now = time.time() if now is None else now
+        tokens, last = self._buckets.get(key, (limit.burst, now))
+        allowed, tokens, retry_after = _decide(_refill(tokens, last, now, limit), limit)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class SharedBuckets:
+    """
+    Buckets in a shared mmap'd table: slots of (key hash u64, tokens f64, last f64).
+
+    Keys are hashed to 64 bits and placed by open addressing within a small
+    probe window. The whole table is guarded by an exclusive flock for the
+    few microseconds a take() needs.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+    PROBES = 8
+
+    def __init__(self, path, slots=65536):
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size != size:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                # Resize under the lock so concurrent workers agree on the layout
+                if os.fstat(self._fd).st_size != size:
+                    os.ftruncate(self._fd, size)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    def take(self, key, limit, now=None):
+        now = time.time() if now is None else now
+        key_hash = self._hash(key)
+        start = key_hash % self.slots
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            victim, victim_last = None, None
+            for probe in range(self.PROBES):
+                offset = ((start + probe) % self.slots) * self.SLOT.size
+                slot_hash, tokens, last = self.SLOT.unpack_from(self._map, offset)
+                if slot_hash == key_hash:
+                    tokens = _refill(tokens, last, now, limit)
+                    break
+                if slot_hash == 0:
+                    tokens = limit.burst
+                    break
+                if victim is None or last < victim_last:
+                    victim, victim_last = offset, last
+            else:
+                # Window full: evict the bucket that was touched longest ago
+                offset, tokens = victim, limit.burst
+            allowed, tokens, retry_after = _decide(tokens, limit)
+            self.SLOT.pack_into(self._map, offset, key_hash, tokens, now)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return allowed, retry_after
+
+
+def make_backend():
+    if os.environ.get("RATE_LIMIT_BACKEND", "memory") == "shared":
+        return SharedBuckets(os.environ.get("RATE_LIMIT_SHM_PATH", "/dev/shm/safe-route-ratelimit"))
+    return MemoryBuckets()
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying per-route token buckets per client IP and per user.
+
+    resolve_user maps a bearer token to its user id, or None. It must not
+    touch the database: pass a session-cache lookup. The per-user bucket is
+    keyed by that id, so logging in again does not buy a fresh bucket. It is
+    only called once the IP bucket has let the request through. Without it,
+    only the IP bucket applies.
+    """
+
+    def __init__(self, app, limits=None, backend=None, trust_proxy=None, resolve_user=None):
+        self.app = app
+        self.limits = parse_limits(os.environ.get("RATE_LIMITS", DEFAULT_LIMITS)) if limits is None else limits
+        self.backend = backend or make_backend()
+        if trust_proxy is None:
+            trust_proxy = os.environ.get("RATE_LIMIT_TRUST_PROXY") == "1"
+        self.trust_proxy = trust_proxy
+        self.resolve_user = resolve_user
+
+    def _client(self, scope):
+        """(client IP, bearer token or None)"""
+        ip, token = scope["client"][0] if scope.get("client") else "-", None
+        for name, value in scope["headers"]:
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                token = value[7:].decode("latin-1")
+            elif name == b"x-forwarded-for" and self.trust_proxy:
+                ip = value.split(b",")[0].strip().decode("latin-1")
+        return ip, token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        matched = match_limit(self.limits, scope["method"], scope["path"])
+        if matched is None:
+            return await self.app(scope, receive, send)
+
+        now = time.time()
+        prefix, limit = matched
+        # Every path under a prefix shares its buckets
+        route = f"{scope['method']} {prefix}"
+        ip, token = self._client(scope)
+        allowed, retry_after = self.backend.take(f"{route}|ip:{ip}", limit, now)
+        if allowed and token and self.resolve_user is not None:
+            user_id = self.resolve_user(token)
+            if user_id is not None:
+                allowed, retry_after = self.backend.take(f"{route}|user:{user_id}", limit, now)
+        if not allowed:
+            return await self._reject(send, retry_after)
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, retry_after):
+        body = dumps({"success": False, "detail": "Too many requests"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
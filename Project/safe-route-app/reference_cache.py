@@ -0,0 +1,179 @@
+"""
+In-process cache for reference data: districts, police stations and staff.
+
+These tables change a few times a year but are read on every dashboard load
+and on every crime insert. They are loaded once at startup, kept as
+pre-encoded JSON bodies with a strong ETag each. Nothing in the API writes
+them (they are seeded by setup_database.py and edited in the database), so
+a snapshot is reloaded by the next reader once it is REFERENCE_TTL seconds
+old. The ETag is a hash of the body, so clients still get 304 across a
+reload that found nothing new. To pick up a change sooner, call the refresh
+endpoint; the cache is per process, so call it on every worker.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+from fastapi import Response
+from sqlalchemy import text
+
+from serialization import dumps, rows_to_dicts
+
+# Clients may reuse a response this long before revalidating with If-None-Match
+REFERENCE_MAX_AGE = int(os.environ.get("REFERENCE_MAX_AGE", 300))
+# A snapshot older than this is reloaded by the next reader; 0 keeps it until invalidated
+REFERENCE_TTL = float(os.environ.get("REFERENCE_TTL", 600))
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_QUERIES = {
+    "districts": "SELECT district_id, district_name, state FROM district ORDER BY district_name",
+    "stations": """
+        SELECT station_id, station_name, address, location_id, established_date
+        FROM policestation ORDER BY station_name
+    """,
+    "staff": """
+        SELECT staff_id, user_id, station_id, position, start_date, end_date
+        FROM station_staff ORDER BY station_id, staff_id
+    """,
+}
+
+
+class _Entry:
+    """One encoded response body and its strong ETag"""
+
+    def __init__(self, payload):
+        self.body = dumps(payload)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match, etag):
+    """RFC 9110 If-None-Match: '*' or any listed tag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def _as_id(value):
+    """Accept IDs sent as numeric strings, as the database would"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ReferenceCache:
+    """Reference tables held in memory, reloaded once stale or after invalidate()"""
+
+    def __init__(self, ttl=REFERENCE_TTL):
+        self._lock = asyncio.Lock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self.ttl = ttl
+        self.district_ids = frozenset()
+        self.station_ids = frozenset()
+        self.version = 0
+        self._entries = {}
+        self._staff_by_station = {}
+
+    async def load(self, engine):
+        """Query all reference tables and swap in the new snapshot"""
+        async with engine.connect() as conn:
+            data = {}
+            for name, sql in REFERENCE_QUERIES.items():
+                result = await conn.execute(text(sql))
+                data[name] = rows_to_dicts(result.keys(), result.fetchall())
+
+        staff_by_station = {}
+        for member in data["staff"]:
+            staff_by_station.setdefault(member["station_id"], []).append(member)
+
+        # No awaits from here on, so readers never see a half-built snapshot
+        self._entries = {
+            "districts": _Entry({"success": True, "districts": data["districts"]}),
+            "stations": _Entry({"success": True, "stations": [
+                {**station, "staff_count": len(staff_by_station.get(station["station_id"], []))}
+                for station in data["stations"]
+            ]}),
+        }
+        self._staff_by_station = {
+            station_id: _Entry({"success": True, "staff": members})
+            for station_id, members in staff_by_station.items()
+        }
+        self.district_ids = frozenset(d["district_id"] for d in data["districts"])
+        self.station_ids = frozenset(s["station_id"] for s in data["stations"])
+        self.version += 1
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+
+    def _fresh(self):
+        return self._loaded and (not self.ttl or time.monotonic() - self._loaded_at < self.ttl)
+
+    async def ensure_loaded(self, engine):
+        """
+        Load on first use, after invalidate() or once the TTL has passed;
+        concurrent callers share one reload.
+
+        A failed reload of an expired snapshot keeps serving the old one and
+        tries again after another TTL, so a database blip does not turn the
+        cached endpoints into errors.
+        """
+        if self._fresh():
+            return
+        async with self._lock:
+            if self._fresh():
+                return
+            if not self._loaded:
+                await self.load(engine)
+                return
+            try:
+                await self.load(engine)
+            except Exception:
+                logger.exception("Reference data reload failed; serving the previous snapshot")
+                self._loaded_at = time.monotonic()
+
+    def has_district(self, district_id):
+        return _as_id(district_id) in self.district_ids
+
+    def has_station(self, station_id):
+        return _as_id(station_id) in self.station_ids
+
+    def invalidate(self):
+        """Mark the snapshot stale; the next reader reloads it"""
+        self._loaded = False
+
+    async def refresh(self, engine):
+        """Reload immediately, e.g. right after writing reference data"""
+        async with self._lock:
+            await self.load(engine)
+
+    def _respond(self, entry, if_none_match):
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f"public, max-age={REFERENCE_MAX_AGE}, must-revalidate",
+        }
+        if _etag_matches(if_none_match, entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    async def response(self, engine, name, if_none_match=None):
+        """Serve a cached table ('districts' or 'stations'), honouring If-None-Match"""
+        await self.ensure_loaded(engine)
+        return self._respond(self._entries[name], if_none_match)
+
+    async def staff_response(self, engine, station_id, if_none_match=None):
+        """Serve one station's staff list, or None when the station is unknown"""
+        await self.ensure_loaded(engine)
+        if station_id not in self.station_ids:
+            return None
+        entry = self._staff_by_station.get(station_id) or _Entry({"success": True, "staff": []})
+        return self._respond(entry, if_none_match)
+
+
+reference_cache = ReferenceCache()
@@ -0,0 +1,270 @@
+"""
+Content-negotiated response compression (zstd, brotli, gzip).
+
+CompressionMiddleware is plain ASGI, like RequestIdMiddleware, so a
+response is only ever buffered when it arrives in a single body message.
+
+- Complete bodies of a compressible type (JSON, text, JavaScript, SVG) at
+  least COMPRESS_MIN_BYTES long are compressed with the best encoding the
+  client accepts. zstd comes first because it compresses JSON about as
+  well as brotli at a fraction of the CPU cost, then brotli, then gzip. The
+  zstd and brotli codecs need the optional `zstandard` and `brotli`
+  packages.
+- Streaming bodies (StreamingResponse exports) are compressed chunk by
+  chunk, with a flush after each chunk so the client still receives rows
+  as they are produced.
+- Responses carrying an ETag keep their compressed bodies in an LRU cache
+  keyed by (ETag, encoding), so repeated reference-data responses are
+  compressed once. Each encoding gets its own ETag ("<tag>-<encoding>"),
+  and incoming If-None-Match values have that suffix stripped again, so
+  the endpoints' own 304 logic keeps working.
+- Responses that already have a Content-Encoding (the page cache) pass
+  through untouched.
+"""
+
+import os
+import zlib
+from collections import OrderedDict
+
+from page_cache import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_CACHE_BYTES = int(os.environ.get("COMPRESS_CACHE_BYTES", 32 * 1024 * 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/", b"application/javascript", b"application/x-ndjson",
+                      b"image/svg+xml")
+
+
+class _Gzip:
+    name = "gzip"
+
+    @staticmethod
+    def compress(data):
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    name = "br"
+
+    @staticmethod
+    def compress(data):
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def chunk(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _Zstd:
+    name = "zstd"
+
+    @staticmethod
+    def compress(data):
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def chunk(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+# Server preference, best first; only codecs whose package is installed
+CODECS = [codec for codec, available in ((_Zstd, zstandard), (_Brotli, brotli), (_Gzip, True)) if available]
+_SUFFIXES = tuple(f'-{codec.name}"' for codec in CODECS)
+
+
+def choose_codec(accept_encoding):
+    accepted = accepted_encodings(accept_encoding)
+    return next((codec for codec in CODECS if codec.name in accepted), None)
+
+
+def _strip_encoding_suffix(if_none_match):
+    tags = []
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        for suffix in _SUFFIXES:
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+                break
+        tags.append(tag)
+    return ", ".join(tags)
+
+
+def _with_encoding(etag, encoding):
+    """'"abc"' -> '"abc-gzip"', keeping a W/ prefix"""
+    return etag[:-1] + f'-{encoding}"' if etag.endswith('"') else etag
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (ETag, encoding), bounded by total bytes"""
+
+    def __init__(self, max_bytes=COMPRESS_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = body
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses per Accept-Encoding; see the module docstring"""
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES, cache=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache if cache is not None else CompressedBodyCache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept_encoding = None
+        headers = []
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+            elif name == b"if-none-match":
+                value = _strip_encoding_suffix(value.decode("latin-1")).encode("latin-1")
+            headers.append((name, value))
+        scope = {**scope, "headers": headers}
+        codec = choose_codec(accept_encoding)
+        if codec is None:
+            return await self.app(scope, receive, send)
+        await _CompressingResponder(self, codec)(self.app, scope, receive, send)
+
+
+class _CompressingResponder:
+    """Per-request state: holds the response start until the first body message decides the path"""
+
+    def __init__(self, middleware, codec):
+        self.middleware = middleware
+        self.codec = codec
+        self.start = None
+        self.streamer = None
+        self.passthrough = False
+
+    async def __call__(self, app, scope, receive, send):
+        self.send = send
+        await app(scope, receive, self.on_send)
+
+    def _eligible(self, start):
+        if start["status"] < 200 or start["status"] in (204, 206, 304):
+            return False
+        content_type, content_length = b"", None
+        for name, value in start.get("headers", []):
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+            elif name == b"content-length":
+                content_length = int(value)
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return content_length is None or content_length >= self.middleware.minimum_size
+
+    def _headers(self, content_length=None):
+        """Start headers rewritten for the chosen encoding"""
+        headers = []
+        for name, value in self.start.get("headers", []):
+            lower = name.lower()
+            if lower in (b"content-length", b"vary"):
+                continue
+            if lower == b"etag":
+                value = _with_encoding(value.decode("latin-1"), self.codec.name).encode("latin-1")
+            headers.append((name, value))
+        vary = [value for name, value in self.start.get("headers", []) if name.lower() == b"vary"]
+        vary = b", ".join(vary + [b"Accept-Encoding"])
+        headers += [(b"content-encoding", self.codec.name.encode()), (b"vary", vary)]
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        return headers
+
+    async def on_send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = not self._eligible(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            return await self.send(message)
+
+        body, more = message.get("body", b""), message.get("more_body", False)
+        if self.streamer is None and not more:
+            # Whole body in one message: compress (or fetch from cache) in one go
+            if len(body) < self.middleware.minimum_size:
+                await self.send(self.start)
+                return await self.send(message)
+            etag = next((v for n, v in self.start.get("headers", []) if n.lower() == b"etag"), None)
+            key = (etag, self.codec.name) if etag else None
+            compressed = self.middleware.cache.get(key) if key else None
+            if compressed is None:
+                compressed = self.codec.compress(body)
+                if key:
+                    self.middleware.cache.put(key, compressed)
+            headers = self._headers(len(compressed))
+            await self.send({**self.start, "headers": headers})
+            return await self.send({"type": "http.response.body", "body": compressed})
+
+        if self.streamer is None:
+            self.streamer = self.codec()
+            headers = self._headers()
+            await self.send({**self.start, "headers": headers})
+        data = self.streamer.chunk(body) if body else b""
+        if not more:
+            data += self.streamer.finish()
+        if data or not more:
+            await self.send({"type": "http.response.body", "body": data, "more_body": more})
@@ -0,0 +1,183 @@
+"""
+Keyword search over crime and complaint descriptions.
+
+Matching and ranking use the InnoDB FULLTEXT indexes from migration 5
+(MATCH ... AGAINST in BOOLEAN MODE), so a search is an index lookup rather
+than a LIKE scan. Results come ranked by relevance or newest first, in
+keyset pages, with a short HTML-escaped snippet around the first hit.
+
+Query syntax for users: words must all appear, "quoted phrases" must appear
+as written, a leading - excludes a word, a trailing * matches a prefix.
+InnoDB ignores stopwords and words shorter than innodb_ft_min_token_size
+(3 by default).
+"""
+
+import base64
+import html
+import re
+from decimal import Decimal, InvalidOperation
+
+from pagination import build_where, decode_cursor, keyset_condition
+
+SNIPPET_CHARS = 160
+# Must match the server's innodb_ft_min_token_size: a required term shorter
+# than this is never indexed, so "+ab" would make every search come back empty
+FT_MIN_TOKEN_SIZE = 3
+# Relevance is ranked and paged on the score cast to this many decimals, so
+# the cursor can carry it exactly instead of comparing floats for equality
+SCORE_DECIMALS = 6
+
+# Per source: FROM clause, selected columns, text, timestamp and id columns, and filter columns
+SOURCES = {
+    "crimes": {
+        "from": "crime c JOIN location l ON c.location_id = l.location_id",
+        "columns": "c.crime_id AS id, c.crime_type, c.status, c.date_time, c.created_at, "
+                   "l.district_id, l.area_name, c.description",
+        "text": "c.description",
+        "timestamp": "c.created_at",
+        "id": "c.crime_id",
+        "status": "c.status",
+        "district": "l.district_id",
+    },
+    "complaints": {
+        "from": "complaint",
+        "columns": "complaint_id AS id, channel, status, reported_at, description",
+        "text": "description",
+        "timestamp": "reported_at",
+        "id": "complaint_id",
+        "status": "status",
+        "district": None,
+    },
+}
+
+_TOKEN = re.compile(r'(-?)"([^"]+)"|(-?)([^\s"]+)')
+# Characters with a meaning in boolean mode; stripped from plain words
+_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+def parse_query(q):
+    """Split user input into (phrases, words, excluded, prefixes) of plain text"""
+    phrases, words, excluded, prefixes = [], [], [], []
+    for phrase_neg, phrase, word_neg, word in _TOKEN.findall(q):
+        if phrase:
+            cleaned = " ".join(_OPERATORS.sub(" ", phrase).split())
+            if cleaned:
+                (excluded if phrase_neg else phrases).append(cleaned)
+            continue
+        pieces = _OPERATORS.sub(" ", word).split()
+        if not pieces:
+            continue
+        if word_neg:
+            excluded.extend(pieces)
+            continue
+        if word.endswith("*"):
+            prefixes.append(pieces.pop())
+        words.extend(pieces)
+    words = [w for w in words if len(w) >= FT_MIN_TOKEN_SIZE]
+    prefixes = [p for p in prefixes if len(p) >= FT_MIN_TOKEN_SIZE]
+    return phrases, words, excluded, prefixes
+
+
+def to_boolean_query(q):
+    """Build a MySQL boolean-mode expression; raises ValueError when nothing searchable is left"""
+    phrases, words, excluded, prefixes = parse_query(q)
+    if not (phrases or words or prefixes):
+        raise ValueError("Search query needs at least one word or phrase")
+    parts = [f'+"{p}"' for p in phrases] + [f"+{w}" for w in words] + [f"+{p}*" for p in prefixes]
+    parts += [f'-"{e}"' if " " in e else f"-{e}" for e in excluded]
+    return " ".join(parts)
+
+
+def snippet(text, q, width=SNIPPET_CHARS):
+    """HTML-escaped excerpt around the first matching term, with hits wrapped in <mark>"""
+    if not text:
+        return ""
+    phrases, words, _, prefixes = parse_query(q)
+    patterns = [re.escape(p).replace(r"\ ", r"\s+") for p in phrases]
+    patterns += [rf"\b{re.escape(w)}\b" for w in words] + [rf"\b{re.escape(p)}\w*" for p in prefixes]
+    matcher = re.compile("|".join(patterns), re.IGNORECASE)
+
+    first = matcher.search(text)
+    start = max(0, (first.start() if first else 0) - width // 4)
+    end = min(len(text), start + width)
+    excerpt = text[start:end]
+
+    pieces, last = [], 0
+    for match in matcher.finditer(excerpt):
+        pieces.append(html.escape(excerpt[last:match.start()]))
+        pieces.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    pieces.append(html.escape(excerpt[last:]))
+    return ("…" if start > 0 else "") + "".join(pieces) + ("…" if end < len(text) else "")
+
+
+def encode_score_cursor(score, row_id):
+    """Cursor for relevance-ordered pages; the score is the fixed-precision DECIMAL from build_search"""
+    raw = f"{Decimal(score):.{SCORE_DECIMALS}f}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_score_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        score = Decimal(score)
+        if not score.is_finite():
+            raise ValueError(score)
+        return score.quantize(Decimal(1).scaleb(-SCORE_DECIMALS)), int(row_id)
+    except (ValueError, UnicodeDecodeError, InvalidOperation) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def build_search(source, q, sort="relevance", status=None, district_id=None,
+                 date_from=None, date_to=None, cursor=None, limit=50):
+    """
+    Return (sql, params) for one page (limit + 1 rows) of a search.
+
+    Rows carry a `score` column, the relevance as a DECIMAL with
+    SCORE_DECIMALS places; with sort="relevance" they are ordered by
+    (score, id) descending, otherwise by (timestamp, id). Raises ValueError
+    for bad input.
+    """
+    spec = SOURCES[source]
+    match = f"MATCH({spec['text']}) AGAINST(:q IN BOOLEAN MODE)"
+    score = f"CAST({match} AS DECIMAL(20, {SCORE_DECIMALS}))"
+    params = {"q": to_boolean_query(q), "limit": limit + 1}
+    conditions = [match]
+
+    if status:
+        conditions.append(f"{spec['status']} = :status")
+        params["status"] = status
+    if district_id is not None:
+        if spec["district"] is None:
+            raise ValueError(f"{source} cannot be filtered by district")
+        conditions.append(f"{spec['district']} = :district_id")
+        params["district_id"] = district_id
+    if date_from:
+        conditions.append(f"{spec['timestamp']} >= :date_from")
+        params["date_from"] = date_from
+    if date_to:
+        conditions.append(f"{spec['timestamp']} < :date_to")
+        params["date_to"] = date_to
+
+    if sort == "relevance":
+        order = f"score DESC, {spec['id']} DESC"
+        if cursor:
+            params["cursor_score"], params["cursor_id"] = decode_score_cursor(cursor)
+            conditions.append(
+                f"({score} < :cursor_score OR ({score} = :cursor_score AND {spec['id']} < :cursor_id))"
+            )
+    else:
+        order = f"{spec['timestamp']} DESC, {spec['id']} DESC"
+        if cursor:
+            params["cursor_ts"], params["cursor_id"] = decode_cursor(cursor)
+            conditions.append(keyset_condition(spec["timestamp"], spec["id"], params["cursor_ts"]))
+
+    sql = f"""
+        SELECT {spec['columns']}, {score} AS score
+        FROM {spec['from']}
+        {build_where(conditions)}
+        ORDER BY {order}
+        LIMIT :limit
+    """
+    return sql, params
@@ -0,0 +1,41 @@
+"""
+Fast JSON encoding for API responses.
+
+orjson serializes datetime/date natively (ISO 8601, same as isoformat()) and
+Decimal through the default hook, so result rows can be encoded as they come
+from the driver instead of being converted field by field first.
+"""
+
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(obj):
+    """Types orjson does not handle natively"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Encode content to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson.
+
+    Returning an instance directly from an endpoint also skips FastAPI's
+    jsonable_encoder pass, which otherwise walks the whole payload first.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def rows_to_dicts(keys, rows):
+    """Pair each result row with the column names, leaving values as-is"""
+    return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Run a FastAPI app with several uvicorn workers sharing one copy of the
+read-mostly arrays.
+
+Before any worker starts, the shared array sets the app reads
+(shared_builder.APP_SETS) are published once. Each worker then maps them at
+startup instead of building its own. An app that reads none, like main.py,
+gets no publish and no builder. With --refresh, a single builder process
+keeps republishing those sets in the background, and workers move to each
+new version within SHARED_ARRAYS_CHECK_SECONDS, e.g.
+
+    python serve.py hi2:app --workers 4 --port 8001
+    python serve.py main:app --workers 4
+
+The builder and the workers find the arrays through SHARED_ARRAYS_DIR
+(default /dev/shm/safe-route-arrays), which they inherit from this process.
+Each worker still opens its own database pool: keep workers x
+(DB_POOL_SIZE + DB_MAX_OVERFLOW) below MySQL's max_connections.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+import uvicorn
+
+import shared_builder
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", nargs="?", default="main:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--refresh", type=float, default=0, help="republish shared arrays every N seconds")
+    args = parser.parse_args()
+
+    names = shared_builder.sets_for(args.app)
+    if names:
+        shared_builder.publish_all(names)
+
+    builder = None
+    if names and args.refresh > 0:
+        builder = subprocess.Popen([
+            sys.executable, os.path.join(HERE, "shared_builder.py"),
+            "--every", str(args.refresh), "--wait", "--only", *names,
+        ])
+    try:
+        uvicorn.run(args.app, host=args.host, port=args.port, workers=args.workers, app_dir=HERE)
+    finally:
+        if builder is not None:
+            builder.terminate()
+            builder.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ import mysql.connector
 from mysql.connector import Error
 import os
 
+import migrations
+
 def create_database():
     """Create the mysafety database if it doesn't exist"""
     try:
@@ -30,6 +32,8 @@ def create_database():
             
             # Create tables based on your schema
             create_tables(cursor)
+            # Indexes and later schema changes are versioned in migrations.py
+            migrations.upgrade(cursor)
             
             cursor.close()
             connection.close()
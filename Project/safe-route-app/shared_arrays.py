@@ -0,0 +1,185 @@
+"""
+Read-mostly numpy arrays shared by every worker on the host.
+
+A builder process publishes a version of a named set of arrays: each array
+is written as an .npy file into a fresh version directory, and then the
+set's manifest.json is swapped in with os.replace. A reader therefore sees
+either the whole old version or the whole new one, never a mix.
+
+Workers attach with np.load(mmap_mode="r"). The file pages are held once,
+in the page cache, and every worker maps the same physical memory
+read-only, so N workers cost one copy and attaching costs no parse or
+rebuild. A reader re-checks the manifest at most every
+SHARED_ARRAYS_CHECK_SECONDS and moves to a new version on its next get().
+
+The builder keeps the newest few versions and deletes the rest. On Linux,
+deleting a mapped file is safe: a worker still on an old version keeps its
+mapping until it moves on.
+
+Layout under SHARED_ARRAYS_DIR (default /dev/shm/safe-route-arrays, which
+is RAM-backed):
+
+    incidents/manifest.json
+    incidents/1718000000000000000-4242/lats.npy
+    incidents/1718000000000000000-4242/...
+"""
+
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+SHARED_ARRAYS_DIR = os.environ.get("SHARED_ARRAYS_DIR", "/dev/shm/safe-route-arrays")
+SHARED_ARRAYS_CHECK_SECONDS = float(os.environ.get("SHARED_ARRAYS_CHECK_SECONDS", "5"))
+
+MANIFEST = "manifest.json"
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def publish(name, arrays, meta=None, root=SHARED_ARRAYS_DIR, keep=2):
+    """
+    Write arrays ({key: ndarray}) as a new version of `name` and make it current.
+
+    Object arrays are rejected: they cannot be memory-mapped. Returns the
+    new version string.
+    """
+    set_dir = os.path.join(root, name)
+    os.makedirs(set_dir, exist_ok=True)
+    version = f"{time.time_ns()}-{os.getpid()}"
+    staging = os.path.join(set_dir, f".staging-{version}")
+    os.makedirs(staging)
+
+    entries = {}
+    try:
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            if array.dtype.hasobject:
+                raise ValueError(f"{name}.{key}: object arrays cannot be shared")
+            with open(os.path.join(staging, f"{key}.npy"), "wb") as f:
+                np.save(f, array, allow_pickle=False)
+                f.flush()
+                os.fsync(f.fileno())
+            entries[key] = {"file": f"{key}.npy", "dtype": array.dtype.str, "shape": list(array.shape)}
+        # Rename the finished directory into place, then point the manifest at it
+        os.rename(staging, os.path.join(set_dir, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    manifest = {"version": version, "published_at": time.time(), "arrays": entries, "meta": meta or {}}
+    tmp_path = os.path.join(set_dir, f".{MANIFEST}.{version}")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(set_dir, MANIFEST))
+    _fsync_dir(set_dir)
+
+    _prune(set_dir, keep)
+    return version
+
+
+def _prune(set_dir, keep, stale_after=3600):
+    """Delete all but the newest `keep` versions, plus staging left behind by a crashed builder"""
+    versions, stale = [], []
+    cutoff = time.time_ns() - int(stale_after * 1e9)
+    for entry in os.listdir(set_dir):
+        if entry.startswith(".staging-"):
+            if int(entry[len(".staging-"):].split("-")[0]) < cutoff:
+                stale.append(entry)
+        elif not entry.startswith(".") and entry != MANIFEST:
+            versions.append(entry)
+    # Versions start with a nanosecond timestamp, so they sort by age
+    versions.sort(key=lambda v: int(v.split("-")[0]))
+    for entry in versions[:-keep] + stale:
+        shutil.rmtree(os.path.join(set_dir, entry), ignore_errors=True)
+
+
+class Snapshot:
+    """One published version: read-only mmap'd arrays by key, plus the builder's metadata"""
+
+    def __init__(self, version, arrays, meta, published_at):
+        self.version = version
+        self.arrays = arrays
+        self.meta = meta
+        self.published_at = published_at
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+
+def attach(name, root=SHARED_ARRAYS_DIR):
+    """Map the current version of `name`; None if nothing has been published"""
+    set_dir = os.path.join(root, name)
+    try:
+        with open(os.path.join(set_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    version_dir = os.path.join(set_dir, manifest["version"])
+    arrays = {
+        key: np.load(os.path.join(version_dir, entry["file"]), mmap_mode="r", allow_pickle=False)
+        for key, entry in manifest["arrays"].items()
+    }
+    return Snapshot(manifest["version"], arrays, manifest["meta"], manifest["published_at"])
+
+
+class SharedArrays:
+    """A worker's handle on one named set; get() follows new versions as they are published"""
+
+    def __init__(self, name, root=SHARED_ARRAYS_DIR, check_interval=SHARED_ARRAYS_CHECK_SECONDS):
+        self.name = name
+        self.root = root
+        self.check_interval = check_interval
+        self._manifest_path = os.path.join(root, name, MANIFEST)
+        self._snapshot = None
+        self._manifest_id = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """The current Snapshot, or None while nothing has been published"""
+        now = time.monotonic()
+        if self._snapshot is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._refresh()
+        return self._snapshot
+
+    def _refresh(self):
+        try:
+            st = os.stat(self._manifest_path)
+        except FileNotFoundError:
+            return
+        # os.replace gives every published manifest a new inode
+        manifest_id = (st.st_ino, st.st_mtime_ns)
+        if manifest_id == self._manifest_id:
+            return
+        try:
+            snapshot = attach(self.name, self.root)
+        except (FileNotFoundError, ValueError):
+            # The version was pruned between reading the manifest and mapping
+            # it, or the manifest is unreadable; keep the old one and retry
+            return
+        if snapshot is not None:
+            self._snapshot = snapshot
+            self._manifest_id = manifest_id
+
+    def stats(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"name": self.name, "attached": False}
+        return {
+            "name": self.name,
+            "attached": True,
+            "version": snapshot.version,
+            "age_seconds": round(time.time() - snapshot.published_at, 1),
+            "bytes": sum(array.nbytes for array in snapshot.arrays.values()),
+        }
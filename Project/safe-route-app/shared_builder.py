@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Builder process for the shared-memory array sets (see shared_arrays.py).
+
+Builds each registered set and publishes it as a new version, once or
+every --every seconds. Workers pick a new version up within
+SHARED_ARRAYS_CHECK_SECONDS. Only this process writes, so workers never
+rebuild anything on start, e.g.
+
+    python shared_builder.py                  # publish every set once
+    python shared_builder.py --every 300      # and keep republishing
+    python shared_builder.py --only incidents
+
+serve.py starts it alongside the uvicorn workers, for the sets the served
+app reads (APP_SETS). The incidents are a seeded mock, so republishing them
+gives the same data; --every pays off once a set is built from the database.
+"""
+
+import argparse
+import logging
+import time
+
+import shared_arrays
+from incidents import MOCK_INCIDENTS_SEED, incident_arrays, mock_incidents
+
+logger = logging.getLogger("shared_builder")
+
+
+def build_incidents():
+    records = mock_incidents()
+    return incident_arrays(records), {"count": len(records), "seed": MOCK_INCIDENTS_SEED}
+
+
+# name -> function returning (arrays, meta)
+BUILDERS = {
+    "incidents": build_incidents,
+}
+
+# app module -> the sets it maps; apps not listed read none
+APP_SETS = {
+    "hi2": ("incidents",),
+}
+
+
+def sets_for(app):
+    """Names of the sets an app ("module:attribute") reads"""
+    return APP_SETS.get(app.partition(":")[0], ())
+
+
+def publish_all(names=None):
+    """Build and publish the given sets (all by default); one failing set does not stop the others"""
+    published = {}
+    for name in names or BUILDERS:
+        started = time.perf_counter()
+        try:
+            arrays, meta = BUILDERS[name]()
+            published[name] = shared_arrays.publish(name, arrays, meta)
+        except Exception:
+            logger.exception("Could not publish %s", name)
+            continue
+        logger.info("Published %s version %s in %.0f ms",
+                    name, published[name], (time.perf_counter() - started) * 1000)
+    return published
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--every", type=float, default=0, help="republish every N seconds (0: once)")
+    parser.add_argument("--wait", action="store_true", help="sleep --every seconds before the first publish")
+    parser.add_argument("--only", nargs="+", choices=sorted(BUILDERS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    if args.wait:
+        time.sleep(args.every)
+    while True:
+        publish_all(args.only)
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()